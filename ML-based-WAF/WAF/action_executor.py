@@ -5,6 +5,7 @@ Each action has a specific handler that modifies or controls the request flow.
 '''
 
 from rl_agent import Action
+from token_bucket import TokenBucketTable
 import re
 import time
 
@@ -17,7 +18,7 @@ class ActionExecutor:
     - LOG_ONLY: Forward but mark for logging
     - SANITIZE: Remove SQL keywords/quotes before forwarding
     - CHALLENGE: Mark for CAPTCHA/re-auth (implementation-specific)
-    - THROTTLE: Add delay or mark for rate limiting
+    - THROTTLE: Rate limit the origin (per-origin token bucket, never sleeps)
     - BLOCK: Mark request as blocked (actual blocking done by caller)
     """
     
@@ -27,21 +28,86 @@ class ActionExecutor:
         'create', 'alter', 'exec', 'execute', 'script', 'javascript'
     ]
     
-    def __init__(self, throttle_delay_ms=1000):
+    # Every token the sanitizer rewrites, as a single alternation: quote runs
+    # (groups 1 and 2 keep one quote), keywords longest first ('javascript'
+    # before 'script') and SQL comment markers / statement separators. The
+    # lookahead lets the engine skip positions that cannot start a token.
+    _SANITIZE_REGEX = (
+        '(?=[' + re.escape(''.join(sorted({k[0] for k in SQL_KEYWORDS})) + '\'";/*-') + '])'
+        + """(?:(')'+|(")"+|"""
+        + '|'.join(re.escape(k) for k in sorted(SQL_KEYWORDS, key=len, reverse=True))
+        + r'|--|/\*|\*/|;)'
+    )
+    # Matched against lower-cased ASCII text, or case-insensitively otherwise
+    _SANITIZE_PATTERN = re.compile(_SANITIZE_REGEX)
+    _SANITIZE_PATTERN_CASELESS = re.compile(_SANITIZE_REGEX, re.IGNORECASE)
+    # Longest fixed-length token (quote runs are handled separately)
+    _MAX_TOKEN_LENGTH = max(len(k) for k in SQL_KEYWORDS)
+    # Proper prefixes of the fixed-length tokens: text ending in one of these
+    # (or in a quote) can still become a token when more text follows
+    _TOKEN_PREFIXES = frozenset(
+        token[:i] for token in SQL_KEYWORDS + ['--', '/*', '*/'] for i in range(1, len(token))
+    )
+    # Sanitized text sanitize_stream() holds back at most, waiting for a
+    # point after which no token can form
+    _MAX_STREAM_CARRY = 4096
+    
+    def __init__(self, throttle_delay_ms=1000, throttle_burst=1.0,
+                 max_throttle_delay_ms=None, max_throttled_origins=100000,
+                 rate_limiter=None, rate_limit=None, challenge_tokens=None,
+                 block_backend=None):
         """Initialize the action executor.
         
         Args:
-            throttle_delay_ms: Delay in milliseconds for THROTTLE action
+            throttle_delay_ms: Minimum spacing in milliseconds between
+                throttled requests of one origin (0 disables throttling delays)
+            throttle_burst: Throttled requests an origin may send back to back
+            max_throttle_delay_ms: Reject (HTTP 429) throttled requests that
+                would be deferred longer than this (None: always defer)
+            max_throttled_origins: Maximum number of origin buckets kept
+            rate_limiter: Optional SharedRateLimiter counting every request
+                across worker processes
+            rate_limit: Requests per rate_limiter window above which THROTTLE
+                rejects an origin outright (HTTP 429)
+            challenge_tokens: Optional ChallengeTokens; CHALLENGE then issues a
+                signed token for the client to present once it passes
+            block_backend: Optional NftablesBackend (or DryRunBackend); BLOCK
+                then also queues the origin for kernel-level blocking (unless
+                execute() is called with kernel_block=False)
         """
         self.throttle_delay_ms = throttle_delay_ms
         self.execution_count = {action: 0 for action in Action}
+        
+        # Per-origin token buckets: throttled requests are deferred, not slept on
+        self.throttle_buckets = None
+        if throttle_delay_ms > 0:
+            self.throttle_buckets = TokenBucketTable(
+                rate=1000.0 / throttle_delay_ms,
+                burst=throttle_burst,
+                max_origins=max_throttled_origins,
+                max_delay_s=(max_throttle_delay_ms / 1000.0
+                             if max_throttle_delay_ms is not None else None)
+            )
+        
+        # Request counts shared by all worker processes
+        self.rate_limiter = rate_limiter
+        self.rate_limit = rate_limit
+        
+        # Stateless HMAC tokens for clients that pass a challenge
+        self.challenge_tokens = challenge_tokens
+        
+        # Firewall enforcement of BLOCK (batched off the packet path)
+        self.block_backend = block_backend
     
-    def execute(self, action, request_data):
+    def execute(self, action, request_data, kernel_block=True):
         """Execute the given action on request data.
         
         Args:
             action: Action to execute
             request_data: dict with request fields (request, body, headers)
+            kernel_block: Whether a BLOCK may also be pushed to block_backend.
+                Pass False for exploratory decisions: one random BLOCK
+                should reject the request, not the origin for block_timeout
             
         Returns:
             dict: Result with keys:
@@ -64,10 +130,10 @@ class ActionExecutor:
         elif action == Action.THROTTLE:
             return self._execute_throttle(request_data)
         elif action == Action.BLOCK:
-            return self._execute_block(request_data)
+            return self._execute_block(request_data, kernel_block)
         else:
             # Unknown action - default to BLOCK for safety
-            return self._execute_block(request_data)
+            return self._execute_block(request_data, kernel_block)
     
     def _execute_allow(self, request_data):
         """Allow request to proceed unchanged."""
@@ -127,6 +193,12 @@ class ActionExecutor:
     def _sanitize_text(self, text):
         """Remove SQL keywords and dangerous characters from text.
         
+        Removes SQL keywords (case-insensitive), comment markers and
+        semicolons, and collapses runs of quotes to a single quote (single
+        quotes are kept for legitimate use). The precompiled alternation is
+        applied until the text stops changing, so removing one token cannot
+        leave another behind ('-drop-' becomes '', not '--').
+        
         Args:
             text: Text to sanitize
             
@@ -136,54 +208,216 @@ class ActionExecutor:
         if not text:
             return text
         
-        sanitized = text
+        # A removal can only create a new token where text was cut out, so
+        # after the first pass only the text around those junctions is
+        # checked and sanitized again
+        text, junctions = self._sanitize_pass(text)
+        while True:
+            spans = []
+            for pos in junctions:
+                if self._token_at(text, pos):
+                    start, end = max(0, pos - self._MAX_TOKEN_LENGTH), pos + self._MAX_TOKEN_LENGTH
+                    if spans and start <= spans[-1][1]:
+                        spans[-1][1] = end
+                    else:
+                        spans.append([start, end])
+            if not spans:
+                return text
+            
+            pieces = []
+            junctions = []
+            prev = 0
+            length = 0
+            for start, end in spans:
+                pieces.append(text[prev:start])
+                length += start - prev
+                junctions.append(length)
+                window, inner = self._sanitize_pass(text[start:end])
+                pieces.append(window)
+                junctions.extend(length + pos for pos in inner)
+                length += len(window)
+                junctions.append(length)
+                prev = end
+            pieces.append(text[prev:])
+            text = ''.join(pieces)
+    
+    def _sanitize_pass(self, text):
+        """One pass of the sanitizing alternation over text.
         
-        # Remove SQL keywords (case-insensitive)
-        for keyword in self.SQL_KEYWORDS:
-            pattern = re.compile(re.escape(keyword), re.IGNORECASE)
-            sanitized = pattern.sub('', sanitized)
+        Returns:
+            tuple: (sanitized text, positions in it where text was removed)
+        """
+        # Matching the lower-cased copy is faster than a caseless pattern
+        if text.isascii():
+            matches = self._SANITIZE_PATTERN.finditer(text.lower())
+        else:
+            matches = self._SANITIZE_PATTERN_CASELESS.finditer(text)
         
-        # Remove SQL comment patterns
-        sanitized = sanitized.replace('--', '')
-        sanitized = sanitized.replace('/*', '')
-        sanitized = sanitized.replace('*/', '')
+        pieces = []
+        junctions = []
+        pos = 0
+        length = 0
+        for match in matches:
+            kept = match.group(1) or match.group(2) or ''
+            pieces.append(text[pos:match.start()])
+            pieces.append(kept)
+            length += match.start() - pos + len(kept)
+            junctions.append(length)
+            pos = match.end()
+        if not pieces:
+            return text, junctions
+        pieces.append(text[pos:])
+        return ''.join(pieces), junctions
+    
+    def _token_at(self, text, pos):
+        """Whether a token spans position pos of text."""
+        start = max(0, pos - self._MAX_TOKEN_LENGTH)
+        window = text[start:pos + self._MAX_TOKEN_LENGTH]
+        if window.isascii():
+            matches = self._SANITIZE_PATTERN.finditer(window.lower())
+        else:
+            matches = self._SANITIZE_PATTERN_CASELESS.finditer(window)
+        return any(match.start() < pos - start < match.end() for match in matches)
+    
+    def _is_stream_boundary(self, text, pos):
+        """Whether no token can span text[:pos] and whatever follows it."""
+        if pos == 0:
+            return True
+        if text[pos - 1] in '\'"':
+            return False
+        tail = text[max(0, pos - self._MAX_TOKEN_LENGTH + 1):pos].casefold()
+        return not any(tail[i:] in self._TOKEN_PREFIXES for i in range(len(tail)))
+    
+    def _last_stream_boundary(self, text):
+        """Last stream boundary within _MAX_STREAM_CARRY of the end, or None."""
+        for pos in range(len(text), max(0, len(text) - self._MAX_STREAM_CARRY) - 1, -1):
+            if self._is_stream_boundary(text, pos):
+                return pos
+        return None
+    
+    def _drop_spanning_tokens(self, emitted_tail, text):
+        """Remove the start of a token that completes one already emitted.
         
-        # Remove excessive quotes (keep single quotes for legitimate use)
-        # Only remove if there are multiple consecutive quotes
-        sanitized = re.sub(r"'{2,}", "'", sanitized)
-        sanitized = re.sub(r'"{2,}', '"', sanitized)
+        Only needed after a forced boundary: the emitted part cannot be
+        changed, so its continuation is dropped instead.
+        """
+        while text:
+            window = emitted_tail + text[:self._MAX_TOKEN_LENGTH]
+            if window.isascii():
+                matches = self._SANITIZE_PATTERN.finditer(window.lower())
+            else:
+                matches = self._SANITIZE_PATTERN_CASELESS.finditer(window)
+            spanning = None
+            for match in matches:
+                if match.start() < len(emitted_tail) < match.end():
+                    spanning = match
+                    break
+            if spanning is None:
+                break
+            text = self._sanitize_text(text[spanning.end() - len(emitted_tail):])
+        return text
+    
+    def sanitize_stream(self, chunks):
+        """Sanitize text arriving in chunks (e.g. a large streamed body).
         
-        # Remove semicolons (often used to chain SQL commands)
-        sanitized = sanitized.replace(';', '')
+        Produces the same text as _sanitize_text on the concatenated input
+        while only holding one chunk plus a short carry-over in memory. The
+        carry-over is sanitized text that could still form a token with the
+        next chunk (a keyword prefix, a quote); it is released at the last
+        point where no token can span the cut. If no such point appears
+        within _MAX_STREAM_CARRY characters the text is cut anyway, and a
+        token completed across that cut loses its second half.
         
-        return sanitized
+        Args:
+            chunks: Iterable of str chunks
+            
+        Yields:
+            str: Sanitized output pieces
+        """
+        carry = ''
+        emitted_tail = ''
+        for chunk in chunks:
+            data = carry + chunk
+            # Raw text after the last boundary may still be part of a token
+            cut = self._last_stream_boundary(data)
+            if cut is None:
+                cut = len(data) - self._MAX_TOKEN_LENGTH
+            text = self._sanitize_text(data[:cut])
+            if emitted_tail:
+                text = self._drop_spanning_tokens(emitted_tail, text)
+            
+            # Sanitized text can still form a token with what follows
+            boundary = self._last_stream_boundary(text)
+            if boundary is None:
+                # Forced cut: later text that would complete a token with
+                # the emitted tail is dropped by _drop_spanning_tokens
+                boundary = len(text) - self._MAX_TOKEN_LENGTH
+                emitted_tail = (emitted_tail + text[:boundary])[-self._MAX_TOKEN_LENGTH:]
+            elif boundary > 0:
+                emitted_tail = ''
+            carry = text[boundary:] + data[cut:]
+            if boundary > 0:
+                yield text[:boundary]
+        if carry:
+            yield self._drop_spanning_tokens(emitted_tail, self._sanitize_text(carry))
     
     def _execute_challenge(self, request_data):
         """Mark request for CAPTCHA or re-authentication.
         
         Note: Actual CAPTCHA implementation is application-specific.
-        This just marks the request for challenge.
+        With challenge_tokens configured, the result carries a signed token
+        (and its Set-Cookie header) for the challenge page to hand out once
+        the client passes; requests presenting it are then trusted for the
+        token's lifetime without any server-side session.
         """
+        metadata = {
+            'reason': 'Request requires additional verification',
+            'challenge_required': True,
+            'challenge_type': 'captcha'  # or 're-auth'
+        }
+        origin = request_data.get('origin')
+        if self.challenge_tokens is not None and origin is not None:
+            token = self.challenge_tokens.issue(origin, request_data.get('request') or '/')
+            metadata['challenge_token'] = token
+            metadata['set_cookie'] = self.challenge_tokens.set_cookie_header(token)
+        
         return {
             'action': Action.CHALLENGE,
             'allowed': False,  # Don't proceed until challenge is completed
             'modified': False,
             'request_data': request_data,
-            'metadata': {
-                'reason': 'Request requires additional verification',
-                'challenge_required': True,
-                'challenge_type': 'captcha'  # or 're-auth'
-            }
+            'metadata': metadata
         }
     
     def _execute_throttle(self, request_data):
-        """Add delay to slow down potential attacker.
+        """Rate limit the request's origin without blocking the caller.
         
-        Note: Actual rate limiting is application-specific.
-        This adds a simple delay.
+        The origin's token bucket decides how long the request must be
+        deferred ('delay_ms' / 'defer_until' in the metadata); the caller
+        schedules it instead of this method sleeping, so requests from other
+        clients are never held up. Requests without an origin get the fixed
+        throttle delay.
         """
-        # Add delay
-        time.sleep(self.throttle_delay_ms / 1000.0)
+        origin = request_data.get('origin')
+        if (origin is not None and self.rate_limiter is not None
+                and self.rate_limit is not None
+                and self.rate_limiter.is_limited(origin, self.rate_limit)):
+            return self._reject_throttled(
+                request_data, 'Request rejected: origin exceeded the shared rate limit'
+            )
+        
+        if self.throttle_buckets is None:
+            delay_ms = 0.0
+        elif origin is None:
+            delay_ms = float(self.throttle_delay_ms)
+        else:
+            delay = self.throttle_buckets.acquire(origin)
+            if delay is None:
+                # Origin's queue is already too long: reject instead of deferring
+                return self._reject_throttled(
+                    request_data, 'Request rejected: origin exceeded its rate limit'
+                )
+            delay_ms = delay * 1000.0
         
         return {
             'action': Action.THROTTLE,
@@ -192,24 +426,48 @@ class ActionExecutor:
             'request_data': request_data,
             'metadata': {
                 'reason': 'Request throttled due to suspicious activity',
-                'delay_ms': self.throttle_delay_ms,
+                'delay_ms': delay_ms,
+                'defer_until': time.monotonic() + delay_ms / 1000.0,
                 'rate_limit_applied': True
             }
         }
     
-    def _execute_block(self, request_data):
-        """Block the request entirely."""
+    def _reject_throttled(self, request_data, reason):
+        """Reject a throttled request whose origin is over its limit."""
         return {
-            'action': Action.BLOCK,
+            'action': Action.THROTTLE,
             'allowed': False,
             'modified': False,
             'request_data': request_data,
             'metadata': {
-                'reason': 'Request blocked by security policy',
-                'http_status': 403  # Forbidden
+                'reason': reason,
+                'rate_limit_applied': True,
+                'http_status': 429  # Too Many Requests
             }
         }
     
+    def _execute_block(self, request_data, kernel_block=True):
+        """Block the request entirely.
+        
+        With a block_backend (and kernel_block), the origin is also queued
+        for the firewall so that its later packets are dropped by the kernel.
+        """
+        metadata = {
+            'reason': 'Request blocked by security policy',
+            'http_status': 403  # Forbidden
+        }
+        origin = request_data.get('origin')
+        if self.block_backend is not None and kernel_block and origin is not None:
+            metadata['kernel_block'] = self.block_backend.block(origin)
+        
+        return {
+            'action': Action.BLOCK,
+            'allowed': False,
+            'modified': False,
+            'request_data': request_data,
+            'metadata': metadata
+        }
+    
     def get_statistics(self):
         """Get execution statistics.
         
@@ -225,6 +483,11 @@ class ActionExecutor:
             }
         }
         
+        if self.throttle_buckets is not None:
+            stats['throttle'] = self.throttle_buckets.get_statistics()
+        if self.block_backend is not None:
+            stats['block_backend'] = self.block_backend.get_statistics()
+        
         # Add percentages
         if total > 0:
             stats['action_percentages'] = {
@@ -0,0 +1,186 @@
+'''Stateless signed tokens for the CHALLENGE action.
+
+A client that passes a challenge receives a cookie holding
+
+    <expiry>.<mac>      mac = HMAC-SHA256(secret, origin | route | expiry)
+
+truncated to 128 bits and base64url-encoded. A returning request is
+verified by recomputing the MAC from its own origin and route and comparing
+in constant time, so no session table is kept on the server and memory does
+not grow with traffic. A token is bound to the client address and to a
+route cluster (see hierarchical_agent.route_cluster), and it stops working
+at its expiry.
+
+Worker processes that must accept each other's tokens need the same secret
+(for example from a file); otherwise a random per-process secret is used and
+tokens do not survive a restart.
+'''
+
+import base64
+import hashlib
+import hmac
+import os
+import secrets
+import time
+
+from hierarchical_agent import route_cluster
+
+
+MAC_BYTES = 16
+
+
+def load_secret(filepath):
+    """Read an HMAC secret from a file, creating a random one if missing.
+
+    Args:
+        filepath: Path of the secret file
+
+    Returns:
+        bytes: Secret key
+    """
+    if not os.path.exists(filepath):
+        fd = os.open(filepath, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(secrets.token_bytes(32))
+    with open(filepath, 'rb') as f:
+        secret = f.read()
+    if len(secret) < 16:
+        raise ValueError(f"{filepath}: secret must be at least 16 bytes")
+    return secret
+
+
+class ChallengeTokens:
+    """Issues and verifies HMAC challenge tokens."""
+
+    def __init__(self, secret=None, ttl_s=900, cookie_name='waf_challenge', route_depth=2):
+        """Initialize the token signer.
+
+        Args:
+            secret: HMAC key (bytes); random if None
+            ttl_s: Token lifetime in seconds
+            cookie_name: Name of the cookie carrying the token
+            route_depth: Path segments of the route a token is bound to
+        """
+        self._secret = secret or secrets.token_bytes(32)
+        self.ttl_s = ttl_s
+        self.cookie_name = cookie_name
+        self.route_depth = route_depth
+        self._cookie_prefix = cookie_name + '='
+
+        # Statistics for monitoring
+        self.issued = 0
+        self.accepted = 0
+        self.rejected = 0
+        self.expired = 0
+
+    def _mac(self, origin, route, expiry):
+        message = f"{origin}|{route}|{expiry}".encode('utf-8')
+        digest = hmac.new(self._secret, message, hashlib.sha256).digest()[:MAC_BYTES]
+        return base64.urlsafe_b64encode(digest).rstrip(b'=').decode('ascii')
+
+    def issue(self, origin, path, now=None):
+        """Create a token for an origin on a path's route cluster.
+
+        Args:
+            origin: Client address
+            path: Request path
+            now: Current time in seconds (default: time.time())
+
+        Returns:
+            str: Token
+        """
+        if now is None:
+            now = time.time()
+        expiry = int(now) + self.ttl_s
+        self.issued += 1
+        return f"{expiry}.{self._mac(origin, route_cluster(path, self.route_depth), expiry)}"
+
+    def verify(self, token, origin, path, now=None):
+        """Check a token against the request it came with.
+
+        Args:
+            token: Token string from the client
+            origin: Client address of the request
+            path: Request path
+            now: Current time in seconds (default: time.time())
+
+        Returns:
+            bool: True if the token is authentic, unexpired and was issued
+                for this origin and route
+        """
+        expiry, _, mac = (token or '').partition('.')
+        if not (expiry.isascii() and expiry.isdigit()) or not mac:
+            self.rejected += 1
+            return False
+        if int(expiry) <= (time.time() if now is None else now):
+            self.expired += 1
+            return False
+        expected = self._mac(origin, route_cluster(path, self.route_depth), int(expiry))
+        if hmac.compare_digest(expected.encode('ascii'), mac.encode('ascii', 'replace')):
+            self.accepted += 1
+            return True
+        self.rejected += 1
+        return False
+
+    def token_from_headers(self, headers):
+        """Extract the token from a request's Cookie header.
+
+        Args:
+            headers: dict of request headers (scapy field names or HTTP names)
+
+        Returns:
+            str: Token, or None if the cookie is absent
+        """
+        if not headers:
+            return None
+        cookies = headers.get('Cookie') or headers.get('cookie')
+        if not cookies or self._cookie_prefix not in cookies:
+            return None
+        for cookie in cookies.split(';'):
+            cookie = cookie.strip()
+            if cookie.startswith(self._cookie_prefix):
+                return cookie[len(self._cookie_prefix):]
+        return None
+
+    def verify_request(self, headers, origin, path, now=None):
+        """Check whether a request carries a valid challenge cookie.
+
+        Args:
+            headers: dict of request headers
+            origin: Client address
+            path: Request path
+            now: Current time in seconds (default: time.time())
+
+        Returns:
+            bool: True if the client passed a challenge for this route
+        """
+        token = self.token_from_headers(headers)
+        if token is None:
+            return False
+        return self.verify(token, origin, path, now)
+
+    def set_cookie_header(self, token):
+        """Build the Set-Cookie header value delivering a token.
+
+        Args:
+            token: Token from issue()
+
+        Returns:
+            str: Set-Cookie header value
+        """
+        return (f"{self.cookie_name}={token}; Max-Age={self.ttl_s}; Path=/; "
+                f"HttpOnly; Secure; SameSite=Lax")
+
+    def get_statistics(self):
+        """Get token statistics for monitoring.
+
+        Returns:
+            dict: Issued / accepted / rejected / expired counts
+        """
+        return {
+            'issued': self.issued,
+            'accepted': self.accepted,
+            'rejected': self.rejected,
+            'expired': self.expired,
+            'ttl_s': self.ttl_s
+        }
@@ -0,0 +1,265 @@
+'''Background incremental checkpointing for RL policies.
+
+Saving the whole Q-table from the packet callback blocks capture and can leave
+a torn file behind if the process dies mid-write. This module moves
+checkpointing to a background thread and makes it incremental:
+
+- Delta log: every checkpoint appends only the entries changed since the
+  previous one to '<checkpoint>.delta'. Each record is framed with its length
+  and CRC32, so a record torn by a crash is detected and ignored on replay.
+- Compaction: every N deltas the full table is written as a new base
+  checkpoint and published with an atomic rename, then the delta log is
+  reset the same way.
+- Replay: PolicyAgent.load_checkpoint reads the base and applies the deltas
+  whose sequence number is newer than the base.
+'''
+
+import os
+import pickle
+import struct
+import threading
+import zlib
+
+
+# Record header: payload length and CRC32 of the payload
+_RECORD_HEADER = struct.Struct('<II')
+
+
+def delta_log_path(filepath):
+    """Get the delta log path that belongs to a base checkpoint.
+
+    Args:
+        filepath: Base checkpoint path
+
+    Returns:
+        str: Path of the append-only delta log
+    """
+    return filepath + '.delta'
+
+
+def atomic_write_bytes(filepath, data):
+    """Write data to filepath so readers see either the old or new file.
+
+    The data is written and fsynced to a temporary file in the same directory
+    and then renamed over the target.
+
+    Args:
+        filepath: Destination path
+        data: bytes to write
+    """
+    tmp_path = filepath + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, filepath)
+
+
+def append_delta_record(filepath, record):
+    """Append one framed record to a delta log and fsync it.
+
+    Args:
+        filepath: Delta log path
+        record: Picklable dict to append
+    """
+    payload = pickle.dumps(record, protocol=pickle.HIGHEST_PROTOCOL)
+    header = _RECORD_HEADER.pack(len(payload), zlib.crc32(payload))
+    with open(filepath, 'ab') as f:
+        f.write(header + payload)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def read_delta_log(filepath):
+    """Read all intact records from a delta log.
+
+    Reading stops at the first truncated or corrupted record, which can only
+    be the tail written while the process was dying.
+
+    Args:
+        filepath: Delta log path
+
+    Returns:
+        list[dict]: Records in append order (empty if the log does not exist)
+    """
+    if not os.path.exists(filepath):
+        return []
+
+    with open(filepath, 'rb') as f:
+        data = f.read()
+
+    records = []
+    offset = 0
+    header_size = _RECORD_HEADER.size
+    while offset + header_size <= len(data):
+        length, crc = _RECORD_HEADER.unpack_from(data, offset)
+        start = offset + header_size
+        payload = data[start:start + length]
+        if len(payload) != length or zlib.crc32(payload) != crc:
+            break
+        records.append(pickle.loads(payload))
+        offset = start + length
+    return records
+
+
+class BackgroundCheckpointer:
+    """Writes agent checkpoints from a background thread.
+
+    Agents that expose pop_dirty_entries/get_checkpoint_stats/
+    get_full_checkpoint (PolicyAgent) are checkpointed incrementally. Other
+    agents fall back to a full save_checkpoint published with an atomic
+    rename.
+
+    Usage:
+        checkpointer = BackgroundCheckpointer(agent, 'policy.pkl')
+        checkpointer.start()
+        checkpointer.request_checkpoint()   # cheap, from the packet callback
+        checkpointer.stop()                 # final flush + compaction
+    """
+
+    def __init__(self, agent, filepath, interval_s=30.0, compact_every=20):
+        """Initialize the checkpointer.
+
+        Args:
+            agent: Agent to checkpoint
+            filepath: Base checkpoint path
+            interval_s: Maximum time between checkpoints
+            compact_every: Number of deltas after which the log is compacted
+        """
+        self.agent = agent
+        self.filepath = filepath
+        self.delta_path = delta_log_path(filepath)
+        self.interval_s = interval_s
+        self.compact_every = compact_every
+
+        self.incremental = hasattr(agent, 'pop_dirty_entries')
+
+        # Sequence number of the last record written (base or delta)
+        self._seq = 0
+        self._deltas_since_compaction = 0
+
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._io_lock = threading.Lock()
+        self._thread = None
+
+        # Statistics for monitoring
+        self.deltas_written = 0
+        self.entries_written = 0
+        self.compactions = 0
+        self.last_error = None
+
+    def start(self):
+        """Start the background thread, writing an initial base checkpoint."""
+        if self.incremental:
+            self._seq = getattr(self.agent, 'checkpoint_seq', 0)
+            if not os.path.exists(self.filepath):
+                self.compact()
+            else:
+                self._deltas_since_compaction = len(read_delta_log(self.delta_path))
+
+        self._thread = threading.Thread(
+            target=self._run, name='rl-checkpointer', daemon=True
+        )
+        self._thread.start()
+
+    def request_checkpoint(self):
+        """Ask the background thread to checkpoint soon (non-blocking)."""
+        self._wakeup.set()
+
+    def stop(self):
+        """Stop the thread and write a final compacted checkpoint."""
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.checkpoint(force_compaction=True)
+
+    def _run(self):
+        """Background loop: checkpoint on request or every interval_s."""
+        while not self._stopping.is_set():
+            self._wakeup.wait(self.interval_s)
+            self._wakeup.clear()
+            if self._stopping.is_set():
+                break
+            try:
+                self.checkpoint()
+            except Exception as e:
+                # Never let checkpoint failures kill the thread
+                self.last_error = str(e)
+
+    def checkpoint(self, force_compaction=False):
+        """Write one checkpoint now (delta, compaction or full save).
+
+        Args:
+            force_compaction: Compact regardless of the delta count
+        """
+        with self._io_lock:
+            if not self.incremental:
+                self._save_full()
+                return
+
+            self._write_delta()
+            if force_compaction or self._deltas_since_compaction >= self.compact_every:
+                self._compact()
+
+    def compact(self):
+        """Write the full table as a new base and reset the delta log."""
+        with self._io_lock:
+            self._compact()
+
+    def _write_delta(self):
+        """Append entries changed since the previous checkpoint."""
+        entries = self.agent.pop_dirty_entries()
+        if not entries:
+            return
+
+        self._seq += 1
+        append_delta_record(self.delta_path, {
+            'seq': self._seq,
+            'entries': entries,
+            'stats': self.agent.get_checkpoint_stats()
+        })
+        self._deltas_since_compaction += 1
+        self.deltas_written += 1
+        self.entries_written += len(entries)
+
+    def _compact(self):
+        """Publish a new base checkpoint, then drop the replayed deltas.
+
+        The base records the last delta sequence number it contains, so a
+        crash between the two renames only causes already-included deltas
+        to be skipped on replay.
+        """
+        checkpoint = self.agent.get_full_checkpoint()
+        checkpoint['delta_seq'] = self._seq
+        atomic_write_bytes(
+            self.filepath,
+            pickle.dumps(checkpoint, protocol=pickle.HIGHEST_PROTOCOL)
+        )
+        atomic_write_bytes(self.delta_path, b'')
+        self._deltas_since_compaction = 0
+        self.compactions += 1
+
+    def _save_full(self):
+        """Fallback for agents without dirty tracking."""
+        tmp_path = self.filepath + '.tmp'
+        self.agent.save_checkpoint(tmp_path)
+        os.replace(tmp_path, self.filepath)
+
+    def get_statistics(self):
+        """Get checkpointer statistics for monitoring.
+
+        Returns:
+            dict: Statistics about checkpoint activity
+        """
+        return {
+            'incremental': self.incremental,
+            'seq': self._seq,
+            'deltas_written': self.deltas_written,
+            'entries_written': self.entries_written,
+            'compactions': self.compactions,
+            'pending_deltas': self._deltas_since_compaction,
+            'last_error': self.last_error
+        }
@@ -41,7 +41,7 @@ class ThreatClassifier(object):
     def __is_valid(self, parameter):
         return parameter != None and parameter != ''
 
-    def classify_request(self, req):
+    def __collect_parameters(self, req):
         if not isinstance(req, Request):
             raise TypeError("Object should be a Request!!!")
 
@@ -74,15 +74,6 @@ class ThreatClassifier(object):
 
         #print(parameters)
 
-        req.threats = {}
-
-        if len(parameters) != 0:
-            predictions = self.clf.predict(parameters)
-
-            for idx, pred in enumerate(predictions):
-                if pred != 'valid':
-                    req.threats[pred] = locations[idx]
-
         request_parameters = {}
         if self.__is_valid(req.request):
             request_parameters = urllib.parse.parse_qs(self.__clean_pattern(req.request))
@@ -100,30 +91,55 @@ class ThreatClassifier(object):
 
         #print(body_parameters)
 
-        parameters = []
-        locations = []
+        pt_parameters = []
+        pt_locations = []
 
         for name, value in request_parameters.items():
             for elem in value:
-                parameters.append([len(elem)])
-                locations.append('Request')
+                pt_parameters.append([len(elem)])
+                pt_locations.append('Request')
 
         for name, value in body_parameters.items():
             ###Output of the form parse is a list so we need to iterate, and JSON returns only one element so no need to iterate
             if isinstance(value, list):
                 for elem in value:
-                    parameters.append([len(elem)])
-                    locations.append('Body')
+                    pt_parameters.append([len(elem)])
+                    pt_locations.append('Body')
             else:
-                parameters.append([len(value)])
-                locations.append('Body')
+                pt_parameters.append([len(value)])
+                pt_locations.append('Body')
 
-        if len(parameters) != 0:
-            pt_predictions = self.pt_clf.predict(parameters)
+        return parameters, locations, pt_parameters, pt_locations
 
-            for idx, pred in enumerate(pt_predictions):
-                if pred != 'valid':
-                    req.threats[pred] = locations[idx]
+    def classify_request(self, req):
+        req.threats = self.classify_requests([req])[0]
 
-        if len(req.threats) == 0:
-            req.threats['valid'] = ''
\ No newline at end of file
+    def classify_requests(self, reqs):
+        ###Batch version of classify_request: one predict() call per classifier for all requests.
+        ###Returns the threats dict of every request instead of setting req.threats.
+        collected = [self.__collect_parameters(req) for req in reqs]
+        threats = [{} for _ in reqs]
+
+        parameters = [p for c in collected for p in c[0]]
+        if len(parameters) != 0:
+            predictions = iter(self.clf.predict(parameters))
+            for idx, c in enumerate(collected):
+                for location in c[1]:
+                    pred = next(predictions)
+                    if pred != 'valid':
+                        threats[idx][pred] = location
+
+        pt_parameters = [p for c in collected for p in c[2]]
+        if len(pt_parameters) != 0:
+            pt_predictions = iter(self.pt_clf.predict(pt_parameters))
+            for idx, c in enumerate(collected):
+                for location in c[3]:
+                    pred = next(pt_predictions)
+                    if pred != 'valid':
+                        threats[idx][pred] = location
+
+        for t in threats:
+            if len(t) == 0:
+                t['valid'] = ''
+
+        return threats
@@ -147,11 +147,11 @@ def index():
 
 @server.route('/review/<int:request_id>', methods = ['GET'])
 def review_request(request_id):
-    with open('./requests_log/'+str(request_id)+'.json', 'r') as f:
-        request = json.dumps(json.load(f), indent=4)
-
     db = DBController()
 
+    ###One seek into the payload segment (or the legacy <id>.json file)
+    request = json.dumps(json.loads(db.read_payload(int(request_id)) or '{}'), indent=4)
+
     log, data = db.read_request(int(request_id))
 
     db.close()
@@ -0,0 +1,220 @@
+'''Delayed reward assignment for the RL-based WAF.
+
+Real feedback about a decision (upstream status code, database errors, user
+complaints, offline labels) arrives after the request has been handled. This
+module keeps a bounded table of pending decisions keyed by request id:
+
+1. record(): store (features, action, timestamp) when the decision is made
+2. join(): when an outcome arrives, compute the reward and update the agent
+3. expiry: entries not joined within the TTL are resolved with a default
+   reward, and the oldest entries are resolved early when the table is full
+
+When several sources report on the same request (e.g. the captured response
+and a teacher label), set outcomes_required: each join() merges its fields
+into the entry and the reward is computed once the last one arrives. An
+entry that expires first is resolved like any other, with the outcomes
+merged so far included in its context.
+
+Entries are kept in insertion order, so expiry only ever looks at the front
+of the table and memory stays bounded under any request rate.
+
+With a decision_logger, each decision is logged when it is resolved, with
+the reward the agent actually learned from (joined or default), rather than
+the estimate available at decision time.
+'''
+
+from collections import OrderedDict
+import threading
+import time
+
+
+class PendingDecisionTable:
+    """Bounded table of decisions waiting for their outcome.
+
+    Safe to use from several threads: the capture loop records decisions
+    while response capture or labeling threads join outcomes.
+    """
+
+    def __init__(self, agent, reward_calculator, ttl_s=30.0, max_entries=100000,
+                 default_reward=None, outcomes_required=1, decision_logger=None):
+        """Initialize the pending decision table.
+
+        Args:
+            agent: Agent with update(state, action, reward)
+            reward_calculator: RewardCalculator used to score joined outcomes
+            ttl_s: Seconds an entry waits for its outcome
+            max_entries: Maximum number of pending entries
+            default_reward: Reward for entries that expire unjoined. None means
+                score the context recorded with the decision instead.
+            outcomes_required: Number of join() calls (one per outcome source)
+                after which an entry is resolved
+            decision_logger: Optional DecisionLogger; resolved decisions are
+                logged with the reward applied and the propensity passed to
+                record()
+        """
+        self.agent = agent
+        self.reward_calculator = reward_calculator
+        self.ttl_s = ttl_s
+        self.max_entries = max_entries
+        self.default_reward = default_reward
+        self.outcomes_required = outcomes_required
+        self.decision_logger = decision_logger
+
+        # request_id -> (features, action, timestamp, context, propensity)
+        self._pending = OrderedDict()
+        # request_id -> joins received, for entries still waiting for more
+        self._partial = {}
+        self._lock = threading.Lock()
+
+        # Statistics for monitoring
+        self.recorded = 0
+        self.joined = 0
+        self.expired = 0
+        self.evicted = 0
+        self.unmatched_joins = 0
+        self.partial_joins = 0
+
+    def __len__(self):
+        return len(self._pending)
+
+    def record(self, request_id, features, action, context=None, timestamp=None,
+               propensity=None):
+        """Store a decision until its outcome arrives.
+
+        Args:
+            request_id: Unique id of the request
+            features: dict of features the decision was based on
+            action: Action that was taken
+            context: Outcome fields known at decision time (e.g. 'is_attack',
+                'attack_probability', 'latency_ms'); joined outcomes override them
+            timestamp: Decision time (default: now)
+            propensity: Probability of the action under the logging policy,
+                written to the decision log when the entry is resolved
+        """
+        now = time.time() if timestamp is None else timestamp
+        resolved = []
+        with self._lock:
+            resolved.extend(self._pop_expired(now))
+            if request_id in self._pending:
+                del self._pending[request_id]
+                self._partial.pop(request_id, None)
+            while len(self._pending) >= self.max_entries:
+                evicted_id, entry = self._pending.popitem(last=False)
+                self._partial.pop(evicted_id, None)
+                resolved.append(entry)
+                self.evicted += 1
+            # Copied, because joins merge their outcomes into it
+            self._pending[request_id] = (features, action, now, dict(context or {}), propensity)
+            self.recorded += 1
+
+        for entry in resolved:
+            self._resolve_default(entry)
+
+    def join(self, request_id, outcome):
+        """Attach an outcome to a pending decision and update the agent.
+
+        Args:
+            request_id: Id passed to record()
+            outcome: dict accepted by RewardCalculator.calculate_reward
+
+        Returns:
+            float: Reward applied, or None if the request is unknown or expired
+                or still waits for other outcomes (see outcomes_required)
+        """
+        with self._lock:
+            entry = self._pending.get(request_id)
+            if entry is None:
+                self.unmatched_joins += 1
+                return None
+            entry[3].update(outcome)
+            received = self._partial.pop(request_id, 0) + 1
+            if received < self.outcomes_required:
+                self._partial[request_id] = received
+                self.partial_joins += 1
+                return None
+            del self._pending[request_id]
+            self.joined += 1
+
+        features, action, _, context, _ = entry
+        reward = self.reward_calculator.calculate_reward(action, context)
+        self.agent.update(features, action, reward)
+        self._log(entry, reward)
+        return reward
+
+    def get(self, request_id):
+        """Look up a pending decision without resolving it.
+
+        Args:
+            request_id: Id passed to record()
+
+        Returns:
+            tuple: (features, action, timestamp, context, propensity) or None
+        """
+        with self._lock:
+            return self._pending.get(request_id)
+
+    def expire(self, now=None):
+        """Resolve every entry older than the TTL.
+
+        Args:
+            now: Current time (default: time.time())
+
+        Returns:
+            int: Number of entries expired
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            resolved = self._pop_expired(now)
+        for entry in resolved:
+            self._resolve_default(entry)
+        return len(resolved)
+
+    def _pop_expired(self, now):
+        """Pop expired entries from the front (caller holds the lock)."""
+        resolved = []
+        deadline = now - self.ttl_s
+        pending = self._pending
+        while pending:
+            request_id, entry = next(iter(pending.items()))
+            if entry[2] > deadline:
+                break
+            del pending[request_id]
+            self._partial.pop(request_id, None)
+            resolved.append(entry)
+        self.expired += len(resolved)
+        return resolved
+
+    def _resolve_default(self, entry):
+        """Update the agent for an entry that never got an outcome."""
+        features, action, _, context, _ = entry
+        if self.default_reward is not None:
+            reward = self.default_reward
+        else:
+            reward = self.reward_calculator.calculate_reward(action, context)
+        self.agent.update(features, action, reward)
+        self._log(entry, reward)
+
+    def _log(self, entry, reward):
+        """Log a resolved decision with the reward it was given."""
+        if self.decision_logger is not None:
+            features, action, timestamp, _, propensity = entry
+            self.decision_logger.log(features, action, reward, propensity,
+                                     timestamp=timestamp)
+
+    def get_statistics(self):
+        """Get table statistics for monitoring.
+
+        Returns:
+            dict: Counters and current size
+        """
+        return {
+            'pending': len(self._pending),
+            'recorded': self.recorded,
+            'joined': self.joined,
+            'expired': self.expired,
+            'evicted': self.evicted,
+            'unmatched_joins': self.unmatched_joins,
+            'partial_joins': self.partial_joins,
+            'ttl_s': self.ttl_s,
+            'max_entries': self.max_entries
+        }
@@ -0,0 +1,217 @@
+'''Per-route endpoint rules for the safety layer.
+
+Rules are compiled into a path-segment trie, so resolving a request path
+costs one dictionary lookup per path segment regardless of how many rules
+are configured. Each rule can cap the action the agent may take on a route
+(max_action) and/or force a fixed action (force).
+
+Rules files are JSON:
+
+    {
+        "include_defaults": true,
+        "rules": [
+            {"path": "/admin*", "max_action": "challenge"},
+            {"path": "/api/payments", "max_action": "throttle"},
+            {"path": "/api/payments/webhook", "match": "exact", "force": "allow"},
+            {"path": "/wp-login.php", "force": "challenge"}
+        ]
+    }
+
+Path syntax:
+    "/api/auth"   prefix rule: the route and everything below it (default)
+    "/api/auth" with "match": "exact"   only the route itself
+    "/admin*"     the last segment is a prefix: /admin, /administrator/x, ...
+
+Query strings are ignored and empty segments are dropped, so '//admin/?x=1'
+resolves like '/admin'. When several rules match, the more specific rule
+wins for each field (deeper beats shallower, exact beats prefix), so a
+route can relax or tighten a rule set on one of its parents.
+
+An exact rule's force only applies to the route written exactly as in the
+rule: '/ping?id=1', '/ping/' and '//ping' still get its max_action, but
+are not forced (an attack payload in the query string must not be forced
+to ALLOW).
+'''
+
+import json
+
+from rl_agent import Action
+
+
+# Ordering used by max_action: an action is capped if it is more severe
+ACTION_SEVERITY = {
+    Action.ALLOW: 0,
+    Action.LOG_ONLY: 1,
+    Action.SANITIZE: 2,
+    Action.THROTTLE: 3,
+    Action.CHALLENGE: 4,
+    Action.BLOCK: 5,
+}
+
+# Built-in rules (same behaviour as the former hard-coded patterns)
+DEFAULT_ENDPOINT_RULES = [
+    {'path': '/admin*', 'max_action': 'challenge'},
+    {'path': '/api/auth*', 'max_action': 'challenge'},
+    {'path': '/health*', 'max_action': 'challenge'},
+    {'path': '/metrics*', 'max_action': 'challenge'},
+    {'path': '/health', 'match': 'exact', 'force': 'allow'},
+    {'path': '/ping', 'match': 'exact', 'force': 'allow'},
+]
+
+_MATCH_TYPES = ('prefix', 'exact')
+_RULE_FIELDS = {'path', 'match', 'max_action', 'force'}
+
+
+def split_path(path):
+    """Split a request path into segments (query string and empty segments dropped).
+
+    Args:
+        path: Request path, possibly with a query string
+
+    Returns:
+        list[str]: Path segments
+    """
+    path = path.split('?', 1)[0].split('#', 1)[0]
+    return [segment for segment in path.split('/') if segment]
+
+
+def _parse_action(rule, field):
+    value = rule.get(field)
+    if value is None:
+        return None
+    try:
+        return Action(value)
+    except ValueError:
+        raise ValueError(f"Rule {rule['path']!r}: unknown {field} {value!r}") from None
+
+
+class _Node:
+    """Trie node: children by segment, plus the rules anchored here."""
+
+    __slots__ = ('children', 'prefix', 'exact', 'wildcards')
+
+    def __init__(self):
+        self.children = {}
+        self.prefix = None       # (max_action, force) for this route and below
+        self.exact = None        # (max_action, force) for this route only
+        self.wildcards = []      # [(segment prefix, (max_action, force))]
+
+
+class EndpointRules:
+    """Path-segment trie of endpoint rules."""
+
+    def __init__(self, rules=()):
+        """Compile rules into the trie.
+
+        Args:
+            rules: Iterable of rule dicts (see module docstring)
+        """
+        self._root = _Node()
+        self.size = 0
+        for rule in rules:
+            self.add_rule(rule)
+
+    def add_rule(self, rule):
+        """Add one rule (a later rule with the same path and match replaces it).
+
+        Args:
+            rule: dict with 'path' and optional 'match', 'max_action', 'force'
+
+        Raises:
+            ValueError: If the rule is malformed
+        """
+        if not isinstance(rule, dict) or 'path' not in rule:
+            raise ValueError(f"Rule must be an object with a 'path': {rule!r}")
+        unknown = set(rule) - _RULE_FIELDS
+        if unknown:
+            raise ValueError(f"Rule {rule['path']!r}: unknown fields {sorted(unknown)}")
+        match = rule.get('match', 'prefix')
+        if match not in _MATCH_TYPES:
+            raise ValueError(f"Rule {rule['path']!r}: match must be one of {_MATCH_TYPES}")
+        effect = (_parse_action(rule, 'max_action'), _parse_action(rule, 'force'))
+        if effect == (None, None):
+            raise ValueError(f"Rule {rule['path']!r}: needs max_action or force")
+
+        segments = split_path(rule['path'])
+        wildcard = None
+        if segments and segments[-1].endswith('*'):
+            if match == 'exact':
+                raise ValueError(f"Rule {rule['path']!r}: wildcard rules cannot be exact")
+            wildcard = segments.pop()[:-1]
+
+        node = self._root
+        for segment in segments:
+            if '*' in segment:
+                raise ValueError(f"Rule {rule['path']!r}: '*' is only allowed at the end")
+            node = node.children.setdefault(segment, _Node())
+
+        if wildcard is not None:
+            kept = [(p, e) for p, e in node.wildcards if p != wildcard]
+            self.size += len(kept) == len(node.wildcards)
+            # Longer segment prefixes are more specific, so apply them last
+            node.wildcards = sorted(kept + [(wildcard, effect)], key=lambda item: len(item[0]))
+        elif match == 'exact':
+            self.size += node.exact is None
+            node.exact = effect
+        else:
+            self.size += node.prefix is None
+            node.prefix = effect
+
+    def resolve(self, path):
+        """Find the effective rule fields for a request path.
+
+        Args:
+            path: Request path
+
+        Returns:
+            tuple: (max_action or None, force action or None)
+        """
+        max_action = force = None
+        node = self._root
+        segments = split_path(path)
+        for segment in segments:
+            if node.prefix is not None:
+                max_action = node.prefix[0] or max_action
+                force = node.prefix[1] or force
+            for prefix, (rule_max, rule_force) in node.wildcards:
+                if segment.startswith(prefix):
+                    max_action = rule_max or max_action
+                    force = rule_force or force
+            node = node.children.get(segment)
+            if node is None:
+                return max_action, force
+
+        if node.prefix is not None:
+            max_action = node.prefix[0] or max_action
+            force = node.prefix[1] or force
+        if node.exact is not None:
+            max_action = node.exact[0] or max_action
+            if path == '/' + '/'.join(segments):
+                force = node.exact[1] or force
+        return max_action, force
+
+    def __len__(self):
+        return self.size
+
+
+def load_endpoint_rules(filepath=None, include_defaults=True):
+    """Build the endpoint rule trie from defaults and an optional rules file.
+
+    Args:
+        filepath: JSON rules file (see module docstring), or None
+        include_defaults: Add DEFAULT_ENDPOINT_RULES first (a rules file
+            can override this with "include_defaults")
+
+    Returns:
+        EndpointRules: Compiled rules
+    """
+    rules = {}
+    if filepath:
+        with open(filepath) as f:
+            rules = json.load(f)
+        include_defaults = rules.get('include_defaults', include_defaults)
+
+    compiled = EndpointRules(DEFAULT_ENDPOINT_RULES if include_defaults else ())
+    for rule in rules.get('rules', []):
+        compiled.add_rule(rule)
+    return compiled
@@ -0,0 +1,323 @@
+'''Batched kernel-level enforcement of BLOCK decisions.
+
+In sniffing mode the WAF only observes traffic, so a BLOCK decision has no
+effect on the connection. An enforcement backend turns blocked origins into
+firewall state instead: block() only records the origin and returns, and a
+background thread pushes everything collected since the last flush into an
+nftables set in one transaction.
+
+    table inet waf {
+        set blocked_v4 { type ipv4_addr; flags timeout; }
+        set blocked_v6 { type ipv6_addr; flags timeout; }
+        chain input {
+            type filter hook input priority -10; policy accept;
+            ip saddr @blocked_v4 drop
+            ip6 saddr @blocked_v6 drop
+        }
+    }
+
+Set elements carry their own timeout, so the kernel unblocks origins by
+itself and no cleanup pass is needed. One `nft -f -` process is started per
+batch (at most one per flush_interval_s), never per block, and origins that
+are already in the set with a live timeout are not pushed again.
+
+DryRunBackend renders the same scripts without running anything, for local
+testing and for reviewing what enforcement would do.
+'''
+
+from collections import OrderedDict, deque
+import ipaddress
+import subprocess
+import threading
+import time
+
+from ip_trie import parse_ip
+
+
+def nft_ruleset_script(family='inet', table='waf', set_v4='blocked_v4', set_v6='blocked_v6',
+                       priority=-10):
+    """Build the nft script creating the table, sets and drop rules.
+
+    Every command is an `add`, so running it again is harmless.
+
+    Args:
+        family: nftables address family
+        table: Table name
+        set_v4: Name of the IPv4 set
+        set_v6: Name of the IPv6 set
+        priority: Priority of the input hook
+
+    Returns:
+        str: nft script
+    """
+    return (
+        f"add table {family} {table}\n"
+        f"add set {family} {table} {set_v4} {{ type ipv4_addr; flags timeout; }}\n"
+        f"add set {family} {table} {set_v6} {{ type ipv6_addr; flags timeout; }}\n"
+        f"add chain {family} {table} input "
+        f"{{ type filter hook input priority {priority}; policy accept; }}\n"
+        f"flush chain {family} {table} input\n"
+        f"add rule {family} {table} input ip saddr @{set_v4} drop\n"
+        f"add rule {family} {table} input ip6 saddr @{set_v6} drop\n"
+    )
+
+
+def nft_elements_script(elements, family='inet', table='waf', set_v4='blocked_v4',
+                        set_v6='blocked_v6'):
+    """Build one nft script adding a batch of elements to the block sets.
+
+    Args:
+        elements: list of (version, address, timeout_s) tuples
+        family: nftables address family
+        table: Table name
+        set_v4: Name of the IPv4 set
+        set_v6: Name of the IPv6 set
+
+    Returns:
+        str: nft script (empty if there are no elements)
+    """
+    by_set = {4: [], 6: []}
+    for version, address, timeout_s in elements:
+        by_set[version].append(f"{address} timeout {int(timeout_s)}s")
+    lines = []
+    for version, set_name in ((4, set_v4), (6, set_v6)):
+        if by_set[version]:
+            lines.append(f"add element {family} {table} {set_name} {{ {', '.join(by_set[version])} }}")
+    return ''.join(line + '\n' for line in lines)
+
+
+class NftablesBackend:
+    """Pushes blocked origins into nftables sets in batches.
+
+    Usage:
+        backend = NftablesBackend(timeout_s=600)
+        backend.setup()                 # create table, sets and rules
+        backend.start()
+        backend.block('203.0.113.7')    # cheap, from the packet callback
+        backend.stop()                  # final flush
+    """
+
+    def __init__(self, timeout_s=600, batch_size=1024, flush_interval_s=0.05,
+                 max_pending=100000, max_known=100000, family='inet', table='waf',
+                 set_v4='blocked_v4', set_v6='blocked_v6', command=None):
+        """Initialize the backend.
+
+        Args:
+            timeout_s: Default block duration in seconds
+            batch_size: Maximum elements per nft transaction
+            flush_interval_s: Maximum time a block waits before it is pushed
+            max_pending: Maximum origins waiting for the next flush (further
+                blocks are dropped and counted)
+            max_known: Maximum origins remembered as already blocked
+            family: nftables address family
+            table: Table name
+            set_v4: Name of the IPv4 set
+            set_v6: Name of the IPv6 set
+            command: nft command prefix (default: ['nft']; e.g.
+                ['ip', 'netns', 'exec', 'ns0', 'nft'] for a namespace)
+        """
+        self.timeout_s = timeout_s
+        self.batch_size = batch_size
+        self.flush_interval_s = flush_interval_s
+        self.max_pending = max_pending
+        self.max_known = max_known
+        self.family = family
+        self.table = table
+        self.set_v4 = set_v4
+        self.set_v6 = set_v6
+        self.command = list(command or ['nft'])
+
+        # address -> (version, address, timeout_s), waiting for the next flush
+        self._pending = {}
+        # address -> monotonic expiry of the element already in the kernel set
+        self._known = OrderedDict()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+
+        # Statistics for monitoring
+        self.requested = 0
+        self.duplicates = 0
+        self.invalid = 0
+        self.dropped = 0
+        self.pushed = 0
+        self.batches = 0
+        self.errors = 0
+        self.last_error = None
+
+    def setup(self):
+        """Create the nftables table, sets and drop rules."""
+        self._run_nft(nft_ruleset_script(self.family, self.table, self.set_v4, self.set_v6))
+
+    def teardown(self):
+        """Delete the nftables table and everything in it."""
+        self._run_nft(f"delete table {self.family} {self.table}\n")
+
+    def start(self):
+        """Start the background flush thread."""
+        self._stopping.clear()
+        self._thread = threading.Thread(
+            target=self._run, name='block-backend', daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        """Stop the thread and push whatever is still pending."""
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def block(self, origin, timeout_s=None, now=None):
+        """Queue an origin for blocking (non-blocking).
+
+        Args:
+            origin: Client IP address
+            timeout_s: Block duration in seconds (default: self.timeout_s)
+            now: Current monotonic time (default: time.monotonic())
+
+        Returns:
+            bool: True if the origin is or will be in the block set
+        """
+        parsed = parse_ip(origin)
+        if parsed is None:
+            self.invalid += 1
+            return False
+        version, value = parsed
+        address = str(ipaddress.IPv4Address(value) if version == 4 else ipaddress.IPv6Address(value))
+        if timeout_s is None:
+            timeout_s = self.timeout_s
+        if now is None:
+            now = time.monotonic()
+
+        with self._lock:
+            self.requested += 1
+            expiry = self._known.get(address)
+            if address in self._pending or (expiry is not None and expiry > now):
+                self.duplicates += 1
+                return True
+            if len(self._pending) >= self.max_pending:
+                self.dropped += 1
+                return False
+            self._pending[address] = (version, address, timeout_s)
+            full = len(self._pending) >= self.batch_size
+        if full:
+            self._wakeup.set()
+        return True
+
+    def _run(self):
+        """Background loop: flush when a batch is full or every interval."""
+        while not self._stopping.is_set():
+            self._wakeup.wait(self.flush_interval_s)
+            self._wakeup.clear()
+            if self._stopping.is_set():
+                break
+            try:
+                self.flush()
+            except Exception as e:
+                # Never let enforcement failures kill the thread
+                self.last_error = str(e)
+
+    def flush(self, now=None):
+        """Push all pending origins now, batch_size elements per transaction.
+
+        Args:
+            now: Current monotonic time (default: time.monotonic())
+
+        Returns:
+            int: Number of elements pushed
+        """
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+            if not pending:
+                return 0
+            if now is None:
+                now = time.monotonic()
+
+            elements = list(pending.values())
+            pushed = 0
+            for start in range(0, len(elements), self.batch_size):
+                batch = elements[start:start + self.batch_size]
+                try:
+                    self._run_nft(nft_elements_script(
+                        batch, self.family, self.table, self.set_v4, self.set_v6
+                    ))
+                except (OSError, RuntimeError) as e:
+                    # The batch is lost; the next BLOCK for these origins retries
+                    self.errors += 1
+                    self.last_error = str(e)
+                    continue
+                self.batches += 1
+                pushed += len(batch)
+                with self._lock:
+                    for _, address, timeout_s in batch:
+                        self._known[address] = now + timeout_s
+                        self._known.move_to_end(address)
+                    while len(self._known) > self.max_known:
+                        self._known.popitem(last=False)
+            self.pushed += pushed
+            return pushed
+
+    def _run_nft(self, script):
+        """Run an nft script in a single process.
+
+        Args:
+            script: nft commands, one per line
+
+        Raises:
+            RuntimeError: If nft reports an error
+        """
+        result = subprocess.run(self.command + ['-f', '-'], input=script,
+                                capture_output=True, text=True)
+        if result.returncode != 0:
+            raise RuntimeError(f"nft failed ({result.returncode}): {result.stderr.strip()}")
+
+    def get_statistics(self):
+        """Get enforcement statistics for monitoring.
+
+        Returns:
+            dict: Block requests, pushes, batches and errors
+        """
+        return {
+            'requested': self.requested,
+            'duplicates': self.duplicates,
+            'invalid': self.invalid,
+            'dropped': self.dropped,
+            'pending': len(self._pending),
+            'pushed': self.pushed,
+            'batches': self.batches,
+            'errors': self.errors,
+            'last_error': self.last_error
+        }
+
+
+class DryRunBackend(NftablesBackend):
+    """Renders nft scripts instead of running them.
+
+    The most recent scripts are kept in `scripts`; with log_file set, every
+    script is also appended to that file.
+    """
+
+    def __init__(self, log_file=None, keep_scripts=100, **kwargs):
+        """Initialize the dry-run backend.
+
+        Args:
+            log_file: Optional path the scripts are appended to
+            keep_scripts: Number of recent scripts kept in memory
+            **kwargs: NftablesBackend arguments
+        """
+        super().__init__(**kwargs)
+        self.log_file = log_file
+        self.scripts = deque(maxlen=keep_scripts)
+
+    def _run_nft(self, script):
+        self.scripts.append(script)
+        if self.log_file:
+            with open(self.log_file, 'a') as f:
+                f.write(script)
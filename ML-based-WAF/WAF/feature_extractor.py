@@ -8,6 +8,7 @@ import urllib.parse
 import re
 import math
 from collections import Counter
+import numpy as np
 from request import Request
 
 
@@ -24,6 +25,20 @@ class FeatureExtractor:
     # SQL comment patterns
     SQL_COMMENTS = ['--', '/*', '*/', '#']
     
+    # Fixed feature order used when a dense vector is needed (linear models)
+    FEATURE_NAMES = [
+        'sql_keyword_count', 'quote_count', 'semicolon_count',
+        'comment_pattern_count', 'equals_count', 'or_and_count', 'length',
+        'entropy', 'special_char_ratio', 'digit_ratio', 'uppercase_ratio',
+        'encoding_depth', 'method_is_post', 'has_body', 'has_cookie'
+    ]
+    
+    # One pass over the text finds every keyword (keywords are whole words,
+    # so a match can never count for two keywords)
+    SQL_KEYWORD_PATTERN = re.compile(
+        r'\b(?:' + '|'.join(re.escape(k) for k in SQL_KEYWORDS) + r')\b'
+    )
+    
     def __init__(self):
         """Initialize the feature extractor."""
         pass
@@ -46,23 +61,7 @@ class FeatureExtractor:
         combined_text = self._get_combined_text(req)
         
         if combined_text:
-            # SQL injection indicators
-            features['sql_keyword_count'] = self._count_sql_keywords(combined_text)
-            features['quote_count'] = combined_text.count("'") + combined_text.count('"')
-            features['semicolon_count'] = combined_text.count(';')
-            features['comment_pattern_count'] = self._count_comment_patterns(combined_text)
-            features['equals_count'] = combined_text.count('=')
-            features['or_and_count'] = combined_text.lower().count(' or ') + combined_text.lower().count(' and ')
-            
-            # Statistical features
-            features['length'] = len(combined_text)
-            features['entropy'] = self._calculate_entropy(combined_text)
-            features['special_char_ratio'] = self._calculate_special_char_ratio(combined_text)
-            features['digit_ratio'] = self._calculate_digit_ratio(combined_text)
-            features['uppercase_ratio'] = self._calculate_uppercase_ratio(combined_text)
-            
-            # URL encoding depth (multiple encoding layers)
-            features['encoding_depth'] = self._calculate_encoding_depth(combined_text)
+            features.update(self._text_features(combined_text))
         else:
             # Empty request - all features are 0
             features = self._get_zero_features()
@@ -74,6 +73,97 @@ class FeatureExtractor:
         
         return features
     
+    def extract_features_batch(self, reqs):
+        """Extract features for many requests into a dense matrix.
+        
+        Produces the same values as extract_features, written straight into
+        a preallocated array instead of one dict per request.
+        
+        Args:
+            reqs: Sequence of Request objects
+            
+        Returns:
+            np.ndarray: (len(reqs), len(FEATURE_NAMES)) float64 matrix
+        """
+        matrix = np.zeros((len(reqs), len(self.FEATURE_NAMES)))
+        text_columns = self.FEATURE_NAMES[:12]
+        for i, req in enumerate(reqs):
+            if not isinstance(req, Request):
+                raise TypeError("Object should be a Request!")
+            
+            row = matrix[i]
+            combined_text = self._get_combined_text(req)
+            if combined_text:
+                text_features = self._text_features(combined_text)
+                row[:12] = [text_features[name] for name in text_columns]
+            
+            row[12] = 1 if req.method == 'POST' else 0
+            row[13] = 1 if req.body and req.body.strip() else 0
+            row[14] = 1 if req.headers and 'Cookie' in req.headers else 0
+        
+        return matrix
+    
+    def _text_features(self, text):
+        """Compute the text features of a non-empty combined request text.
+        
+        Character statistics share one frequency count of the text.
+        
+        Args:
+            text: Combined and cleaned text
+            
+        Returns:
+            dict: Text features (everything except request metadata)
+        """
+        text_lower = text.lower()
+        length = len(text)
+        counter = Counter(text)
+        
+        special = digits = uppercase = 0
+        entropy = 0.0
+        for char, count in counter.items():
+            probability = count / length
+            entropy -= probability * math.log2(probability)
+            if char.isdigit():
+                digits += count
+            if char.isupper():
+                uppercase += count
+            if not char.isalnum() and not char.isspace():
+                special += count
+        
+        return {
+            # SQL injection indicators
+            'sql_keyword_count': len(self.SQL_KEYWORD_PATTERN.findall(text_lower)),
+            'quote_count': counter["'"] + counter['"'],
+            'semicolon_count': counter[';'],
+            'comment_pattern_count': self._count_comment_patterns(text),
+            'equals_count': counter['='],
+            'or_and_count': text_lower.count(' or ') + text_lower.count(' and '),
+            
+            # Statistical features
+            'length': length,
+            'entropy': entropy,
+            'special_char_ratio': special / length,
+            'digit_ratio': digits / length,
+            'uppercase_ratio': uppercase / length,
+            
+            # URL encoding depth (multiple encoding layers)
+            'encoding_depth': self._calculate_encoding_depth(text)
+        }
+    
+    def to_vector(self, features):
+        """Convert a feature dict to a list ordered by FEATURE_NAMES.
+        
+        Missing features are treated as 0 so partial dicts (e.g. in tests)
+        still produce a vector of the expected length.
+        
+        Args:
+            features: dict of features as returned by extract_features
+            
+        Returns:
+            list[float]: Feature values in FEATURE_NAMES order
+        """
+        return [float(features.get(name, 0)) for name in self.FEATURE_NAMES]
+    
     def _get_combined_text(self, req):
         """Combine all request parts into a single string for analysis.
         
@@ -139,23 +229,6 @@ class FeatureExtractor:
             prev = decoded
         return prev
     
-    def _count_sql_keywords(self, text):
-        """Count SQL keywords in text.
-        
-        Args:
-            text: Text to analyze
-            
-        Returns:
-            int: Number of SQL keywords found
-        """
-        text_lower = text.lower()
-        count = 0
-        for keyword in self.SQL_KEYWORDS:
-            # Use word boundaries to avoid false positives
-            pattern = r'\b' + re.escape(keyword) + r'\b'
-            count += len(re.findall(pattern, text_lower))
-        return count
-    
     def _count_comment_patterns(self, text):
         """Count SQL comment patterns in text.
         
@@ -170,77 +243,6 @@ class FeatureExtractor:
             count += text.count(pattern)
         return count
     
-    def _calculate_entropy(self, text):
-        """Calculate Shannon entropy of text.
-        
-        Higher entropy may indicate obfuscation or encoding.
-        
-        Args:
-            text: Text to analyze
-            
-        Returns:
-            float: Entropy value
-        """
-        if not text:
-            return 0.0
-        
-        # Count character frequencies
-        counter = Counter(text)
-        length = len(text)
-        
-        # Calculate entropy
-        entropy = 0.0
-        for count in counter.values():
-            probability = count / length
-            entropy -= probability * math.log2(probability)
-        
-        return entropy
-    
-    def _calculate_special_char_ratio(self, text):
-        """Calculate ratio of special characters to total characters.
-        
-        Args:
-            text: Text to analyze
-            
-        Returns:
-            float: Ratio between 0 and 1
-        """
-        if not text:
-            return 0.0
-        
-        special_chars = sum(1 for c in text if not c.isalnum() and not c.isspace())
-        return special_chars / len(text)
-    
-    def _calculate_digit_ratio(self, text):
-        """Calculate ratio of digits to total characters.
-        
-        Args:
-            text: Text to analyze
-            
-        Returns:
-            float: Ratio between 0 and 1
-        """
-        if not text:
-            return 0.0
-        
-        digits = sum(1 for c in text if c.isdigit())
-        return digits / len(text)
-    
-    def _calculate_uppercase_ratio(self, text):
-        """Calculate ratio of uppercase letters to total characters.
-        
-        Args:
-            text: Text to analyze
-            
-        Returns:
-            float: Ratio between 0 and 1
-        """
-        if not text:
-            return 0.0
-        
-        uppercase = sum(1 for c in text if c.isupper())
-        return uppercase / len(text)
-    
     def _calculate_encoding_depth(self, text):
         """Calculate URL encoding depth (nested encoding layers).
         
@@ -0,0 +1,268 @@
+'''Frozen read-only policy export for inference-only workers.
+
+Workers that only enforce decisions do not need the learning machinery of
+PolicyAgent (defaultdict Q-table, exploration RNG, statistics). This module
+compiles the greedy policy into a compact table and writes it to a file:
+
+    header | sorted uint64 state hashes | uint8 action indices
+
+FrozenPolicy memory-maps the file read-only, so any number of worker
+processes share the same physical pages through the OS page cache. A lookup
+hashes the state and binary-searches the mapped key array in place, without
+copying the table or building per-lookup containers.
+
+Usage:
+    python frozen_policy.py rl_policy_checkpoint.pkl rl_policy.frozen
+'''
+
+from argparse import ArgumentParser
+from bisect import bisect_left
+import hashlib
+import mmap
+import struct
+import sys
+
+import numpy as np
+
+from rl_agent import PolicyAgent, Action, ACTIONS, ACTION_INDEX
+from checkpointer import atomic_write_bytes
+
+
+# magic, entry count, default action index, byte order ('<' or '>')
+_HEADER = struct.Struct('<8sQBc6x')
+_MAGIC = b'WAFPOL01'
+
+
+def _canonical_value(value):
+    """Normalize a feature value the way PolicyAgent._state_to_key does.
+
+    Integral floats are written as ints so 4 and 4.0 hash the same.
+    """
+    if isinstance(value, float):
+        value = round(value, 4)
+        if value.is_integer():
+            return int(value)
+    return value
+
+
+def hash_state_key(state_key):
+    """Compute a process-independent 64-bit hash of a PolicyAgent state key.
+
+    Python's built-in hash() is randomized per process, so a keyed digest
+    is used instead.
+
+    Args:
+        state_key: Tuple of (feature name, value) pairs sorted by name
+
+    Returns:
+        int: Unsigned 64-bit hash
+    """
+    text = '|'.join(f'{name}={_canonical_value(value)!r}' for name, value in state_key)
+    return int.from_bytes(
+        hashlib.blake2b(text.encode(), digest_size=8).digest(), 'little'
+    )
+
+
+def hash_state(state):
+    """Hash a feature dict (same result as hashing its PolicyAgent key).
+
+    Args:
+        state: dict of features
+
+    Returns:
+        int: Unsigned 64-bit hash
+    """
+    text = '|'.join(f'{name}={_canonical_value(state[name])!r}' for name in sorted(state))
+    return int.from_bytes(
+        hashlib.blake2b(text.encode(), digest_size=8).digest(), 'little'
+    )
+
+
+def compile_greedy_policy(agent):
+    """Extract the greedy action of every learned state.
+
+    States where all actions still share the same Q-value have learned
+    nothing and are left to the default action. Ties between learned
+    actions go to the least restrictive one (earliest in ACTIONS).
+
+    Args:
+        agent: PolicyAgent
+
+    Returns:
+        dict: Maps state_key -> Action
+    """
+    q_by_state = {}
+    for (state_key, action), q in list(agent.q_table.items()):
+        values = q_by_state.get(state_key)
+        if values is None:
+            values = q_by_state[state_key] = [agent.default_q_value] * len(ACTIONS)
+        values[ACTION_INDEX[action]] = q
+
+    policy = {}
+    for state_key, values in q_by_state.items():
+        best = max(values)
+        if min(values) == best:
+            continue
+        policy[state_key] = ACTIONS[values.index(best)]
+    return policy
+
+
+def export_frozen_policy(agent, filepath, default_action=Action.LOG_ONLY):
+    """Write the agent's greedy policy as a sorted hash -> action table.
+
+    Args:
+        agent: PolicyAgent to export
+        filepath: Output path (replaced atomically)
+        default_action: Action for states missing from the table
+
+    Returns:
+        int: Number of states exported
+    """
+    policy = compile_greedy_policy(agent)
+
+    keys = np.fromiter(
+        (hash_state_key(state_key) for state_key in policy), dtype='<u8', count=len(policy)
+    )
+    actions = np.fromiter(
+        (ACTION_INDEX[action] for action in policy.values()), dtype=np.uint8, count=len(policy)
+    )
+
+    # Sort by hash; on the (unlikely) collision keep the first entry
+    order = np.argsort(keys, kind='stable')
+    keys = keys[order]
+    actions = actions[order]
+    unique = np.r_[True, keys[1:] != keys[:-1]] if len(keys) else np.zeros(0, dtype=bool)
+    keys = keys[unique]
+    actions = actions[unique]
+
+    header = _HEADER.pack(_MAGIC, len(keys), ACTION_INDEX[default_action], b'<')
+    atomic_write_bytes(filepath, header + keys.tobytes() + actions.tobytes())
+    return len(keys)
+
+
+class FrozenPolicy:
+    """Read-only greedy policy backed by a memory-mapped file.
+
+    Provides select_action and get_action_probabilities like the learning
+    agents, but never learns.
+    """
+
+    def __init__(self, filepath):
+        """Map a file written by export_frozen_policy.
+
+        Args:
+            filepath: Frozen policy file
+        """
+        self.filepath = filepath
+        with open(filepath, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, count, default_index, byte_order = _HEADER.unpack_from(self._mmap, 0)
+        if magic != _MAGIC:
+            raise ValueError(f"{filepath} is not a frozen policy file")
+        if byte_order != (b'<' if sys.byteorder == 'little' else b'>'):
+            raise ValueError(f"{filepath} was written on a host with different byte order")
+
+        self.size = count
+        self.default_action = ACTIONS[default_index]
+
+        keys_start = _HEADER.size
+        actions_start = keys_start + 8 * count
+        view = memoryview(self._mmap)
+        self._keys = view[keys_start:actions_start].cast('Q')
+        self._actions = view[actions_start:actions_start + count]
+
+        # NumPy views over the same pages for batch lookups
+        self.keys = np.frombuffer(self._mmap, dtype='<u8', count=count, offset=keys_start)
+        self.actions = np.frombuffer(self._mmap, dtype=np.uint8, count=count, offset=actions_start)
+
+    def lookup_hash(self, state_hash):
+        """Get the action for a precomputed state hash.
+
+        Args:
+            state_hash: Value from hash_state
+
+        Returns:
+            Action: Greedy action (default_action if the state is unknown)
+        """
+        keys = self._keys
+        i = bisect_left(keys, state_hash)
+        if i < self.size and keys[i] == state_hash:
+            return ACTIONS[self._actions[i]]
+        return self.default_action
+
+    def select_action(self, state):
+        """Select the greedy action for a state.
+
+        Args:
+            state: dict of features extracted from request
+
+        Returns:
+            Action: Greedy action
+        """
+        return self.lookup_hash(hash_state(state))
+
+    def select_actions_batch(self, state_hashes):
+        """Look up many state hashes at once.
+
+        Args:
+            state_hashes: Array of uint64 hashes
+
+        Returns:
+            np.ndarray: Action indices into ACTIONS
+        """
+        state_hashes = np.asarray(state_hashes, dtype='<u8')
+        if self.size == 0:
+            return np.full(len(state_hashes), ACTION_INDEX[self.default_action], dtype=np.uint8)
+        idx = np.minimum(np.searchsorted(self.keys, state_hashes), self.size - 1)
+        found = self.keys[idx] == state_hashes
+        return np.where(found, self.actions[idx], ACTION_INDEX[self.default_action]).astype(np.uint8)
+
+    def get_action_probabilities(self, state):
+        """Deterministic policy: probability 1 for the greedy action.
+
+        Args:
+            state: dict of features
+
+        Returns:
+            dict: Maps Action -> probability
+        """
+        chosen = self.select_action(state)
+        return {action: 1.0 if action == chosen else 0.0 for action in ACTIONS}
+
+    def get_statistics(self):
+        """Get policy statistics for monitoring.
+
+        Returns:
+            dict: Table size and default action
+        """
+        return {
+            'total_updates': 0,
+            'exploration_ratio': 0.0,
+            'policy_size': self.size,
+            'default_action': self.default_action.value,
+            'file_bytes': len(self._mmap)
+        }
+
+    def close(self):
+        """Release the memory map."""
+        self._keys.release()
+        self._actions.release()
+        self.keys = self.actions = None
+        self._mmap.close()
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Export a frozen greedy policy for inference workers')
+    parser.add_argument('checkpoint', help='PolicyAgent checkpoint to export')
+    parser.add_argument('output', help='Frozen policy file to write')
+    parser.add_argument('--default-action', choices=[a.value for a in Action],
+                        default=Action.LOG_ONLY.value,
+                        help='Action for states not in the table')
+    args = parser.parse_args()
+
+    agent = PolicyAgent()
+    if not agent.load_checkpoint(args.checkpoint):
+        parser.error(f"Checkpoint not found: {args.checkpoint}")
+    count = export_frozen_policy(agent, args.output, Action(args.default_action))
+    print(f"[INFO] Exported {count} states to {args.output}")
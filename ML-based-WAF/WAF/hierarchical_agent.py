@@ -0,0 +1,370 @@
+'''Hierarchical per-route / per-host policy for the RL-based WAF.
+
+Traffic on /api/auth behaves differently from static pages, and tenants
+differ from each other, but a single global Q-table cannot tell them apart.
+HierarchicalPolicyAgent keeps three levels of Q-values for the same request
+features:
+
+    host + route cluster  →  route cluster  →  global
+
+Every update is applied to all three levels, so coarse levels aggregate the
+statistics of everything below them. A decision backs off from the most
+specific level towards the coarser ones: each level's estimate is shrunk
+towards its parent's in proportion to how rarely it has been seen,
+
+    Q = (n * Q_level + k * Q_parent) / (n + k)
+
+so a new host or route starts with the route or global policy and moves to
+its own estimates as evidence accumulates. Each level is an LRU table with
+its own entry budget, keeping memory bounded as routes and tenants grow.
+'''
+
+from collections import OrderedDict
+import os
+import pickle
+import random
+import re
+import threading
+
+from rl_agent import ACTIONS, ACTION_INDEX
+from checkpointer import atomic_write_bytes
+
+
+LEVELS = ('global', 'route', 'host')
+
+# Keys added to the feature dict by add_context()
+ROUTE_KEY = 'route'
+HOST_KEY = 'host'
+
+# Path segments that identify a resource rather than a route
+_ID_SEGMENT = re.compile(
+    r'^(\d+|[0-9a-fA-F]{8,}|[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12})$'
+)
+
+
+def route_cluster(path, depth=2):
+    """Map a request path to a coarse route cluster.
+
+    The query string is dropped, id-like segments (numbers, hex, UUIDs)
+    become ':id', and only the first `depth` segments are kept:
+    '/api/user/42/orders?x=1' → '/api/user'.
+
+    Args:
+        path: Request path, possibly with a query string
+        depth: Number of leading segments kept
+
+    Returns:
+        str: Route cluster
+    """
+    if not path:
+        return '/'
+    path = path.split('?', 1)[0].split('#', 1)[0]
+    segments = []
+    for segment in path.split('/'):
+        if not segment:
+            continue
+        segments.append(':id' if _ID_SEGMENT.match(segment) else segment.lower())
+        if len(segments) == depth:
+            break
+    return '/' + '/'.join(segments)
+
+
+def add_context(features, path, host, depth=2):
+    """Add the route cluster and host to a feature dict (in place).
+
+    Args:
+        features: dict of features from FeatureExtractor
+        path: Request path
+        host: Request host (tenant)
+        depth: Route cluster depth
+
+    Returns:
+        dict: The same feature dict
+    """
+    features[ROUTE_KEY] = route_cluster(path, depth)
+    features[HOST_KEY] = (host or '').lower()
+    return features
+
+
+class HierarchicalPolicyAgent:
+    """Epsilon-greedy agent with host → route → global backoff.
+
+    States are feature dicts with ROUTE_KEY and HOST_KEY entries (see
+    add_context). Without them a request only uses the global level.
+    """
+
+    def __init__(self, epsilon=0.1, learning_rate=0.1, default_q_value=0.0,
+                 backoff_strength=5.0, max_entries=None):
+        """Initialize the hierarchical agent.
+
+        Args:
+            epsilon: Exploration rate
+            learning_rate: Step size of the incremental Q update
+            default_q_value: Initial Q-value for unseen states
+            backoff_strength: Pseudo-count k; a level needs about k visits
+                of an action before its own estimate outweighs its parent's
+            max_entries: dict level -> LRU entry budget (default 100000 per level)
+        """
+        self.epsilon = epsilon
+        self.learning_rate = learning_rate
+        self.default_q_value = default_q_value
+        self.backoff_strength = backoff_strength
+        self.max_entries = {level: 100000 for level in LEVELS}
+        if max_entries:
+            self.max_entries.update(max_entries)
+
+        # level -> OrderedDict(key -> [q_values, visit_counts]), least recent first
+        self.tables = {level: OrderedDict() for level in LEVELS}
+        self._lock = threading.Lock()
+
+        # Statistics for monitoring
+        self.total_updates = 0
+        self.exploration_count = 0
+        self.exploitation_count = 0
+        self.evictions = {level: 0 for level in LEVELS}
+
+    def _state_to_keys(self, state):
+        """Build the lookup key of each level for a state.
+
+        Args:
+            state: dict of features plus optional route/host context
+
+        Returns:
+            tuple: (global key, route key or None, host key or None)
+        """
+        items = []
+        for name in sorted(state):
+            if name == ROUTE_KEY or name == HOST_KEY:
+                continue
+            value = state[name]
+            if isinstance(value, float):
+                value = round(value, 4)
+            items.append((name, value))
+        features = tuple(items)
+
+        route = state.get(ROUTE_KEY)
+        if route is None:
+            return features, None, None
+        host = state.get(HOST_KEY)
+        return features, (route, features), (host, route, features) if host else None
+
+    def _estimate(self, keys):
+        """Backed-off Q-values for a state (caller holds the lock).
+
+        Args:
+            keys: Level keys from _state_to_keys
+
+        Returns:
+            list[float]: Q-value per action in ACTIONS order
+        """
+        k = self.backoff_strength
+        q = [self.default_q_value] * len(ACTIONS)
+        for level, key in zip(LEVELS, keys):
+            if key is None:
+                break
+            entry = self.tables[level].get(key)
+            if entry is None:
+                # Unseen (or evicted) at this level: keep the parent estimate
+                continue
+            self.tables[level].move_to_end(key)
+            values, counts = entry
+            q = [(n * v + k * parent) / (n + k) for v, n, parent in zip(values, counts, q)]
+        return q
+
+    def _best_actions(self, q_values):
+        max_q = max(q_values)
+        return [action for action, q in zip(ACTIONS, q_values) if q == max_q]
+
+    def select_action(self, state):
+        """Select action using epsilon-greedy policy over backed-off Q-values.
+
+        Args:
+            state: dict of features (with route/host context)
+
+        Returns:
+            Action: Selected action
+        """
+        keys = self._state_to_keys(state)
+        with self._lock:
+            q_values = self._estimate(keys)
+        best_actions = self._best_actions(q_values)
+
+        if random.random() < self.epsilon:
+            action = random.choice(ACTIONS)
+        else:
+            action = random.choice(best_actions)
+
+        # Counted as exploration only when the random draw changed the choice
+        if action in best_actions:
+            self.exploitation_count += 1
+        else:
+            self.exploration_count += 1
+        return action
+
+    def get_action_probabilities(self, state):
+        """Get the probability of each action under the epsilon-greedy policy.
+
+        Args:
+            state: dict of features
+
+        Returns:
+            dict: Maps Action -> probability
+        """
+        keys = self._state_to_keys(state)
+        with self._lock:
+            best_actions = self._best_actions(self._estimate(keys))
+        greedy_share = (1.0 - self.epsilon) / len(best_actions)
+        return {
+            action: self.epsilon / len(ACTIONS) + (greedy_share if action in best_actions else 0.0)
+            for action in ACTIONS
+        }
+
+    def update(self, state, action, reward):
+        """Update the Q-value of the action at every level of the state.
+
+        Args:
+            state: dict of features (with route/host context)
+            action: Action that was taken
+            reward: Observed reward
+        """
+        keys = self._state_to_keys(state)
+        index = ACTION_INDEX[action]
+        alpha = self.learning_rate
+
+        with self._lock:
+            for level, key in zip(LEVELS, keys):
+                if key is None:
+                    break
+                table = self.tables[level]
+                entry = table.get(key)
+                if entry is None:
+                    entry = table[key] = [
+                        [self.default_q_value] * len(ACTIONS), [0] * len(ACTIONS)
+                    ]
+                    if len(table) > self.max_entries[level]:
+                        table.popitem(last=False)
+                        self.evictions[level] += 1
+                else:
+                    table.move_to_end(key)
+                values, counts = entry
+                values[index] += alpha * (reward - values[index])
+                counts[index] += 1
+            self.total_updates += 1
+
+    def get_q_values(self, state):
+        """Get backed-off Q-values for all actions (for debugging/monitoring).
+
+        Args:
+            state: dict of features
+
+        Returns:
+            dict: Maps Action -> Q-value
+        """
+        keys = self._state_to_keys(state)
+        with self._lock:
+            q_values = self._estimate(keys)
+        return dict(zip(ACTIONS, q_values))
+
+    def get_statistics(self):
+        """Get agent statistics for monitoring.
+
+        Returns:
+            dict: Statistics about agent behavior and table sizes
+        """
+        total_decisions = self.exploration_count + self.exploitation_count
+        exploration_ratio = (
+            self.exploration_count / total_decisions
+            if total_decisions > 0 else 0.0
+        )
+
+        return {
+            'total_updates': self.total_updates,
+            'total_decisions': total_decisions,
+            'exploration_count': self.exploration_count,
+            'exploitation_count': self.exploitation_count,
+            'exploration_ratio': exploration_ratio,
+            'q_table_size': sum(len(table) for table in self.tables.values()),
+            'level_sizes': {level: len(table) for level, table in self.tables.items()},
+            'evictions': dict(self.evictions),
+            'epsilon': self.epsilon,
+            'learning_rate': self.learning_rate
+        }
+
+    def save_checkpoint(self, filepath='hierarchical_checkpoint.pkl'):
+        """Save all levels and hyperparameters to disk.
+
+        Args:
+            filepath: Path to save checkpoint
+        """
+        with self._lock:
+            checkpoint = {
+                'tables': {
+                    level: [(key, list(values), list(counts))
+                            for key, (values, counts) in table.items()]
+                    for level, table in self.tables.items()
+                },
+                'actions': [action.value for action in ACTIONS],
+                'epsilon': self.epsilon,
+                'learning_rate': self.learning_rate,
+                'default_q_value': self.default_q_value,
+                'backoff_strength': self.backoff_strength,
+                'max_entries': dict(self.max_entries),
+                'total_updates': self.total_updates,
+                'exploration_count': self.exploration_count,
+                'exploitation_count': self.exploitation_count
+            }
+
+        atomic_write_bytes(
+            filepath, pickle.dumps(checkpoint, protocol=pickle.HIGHEST_PROTOCOL)
+        )
+
+    def load_checkpoint(self, filepath='hierarchical_checkpoint.pkl'):
+        """Load all levels and hyperparameters from disk.
+
+        Args:
+            filepath: Path to checkpoint file
+
+        Returns:
+            bool: True if loaded successfully, False if file not found
+        """
+        if not os.path.exists(filepath):
+            return False
+
+        with open(filepath, 'rb') as f:
+            checkpoint = pickle.load(f)
+
+        if checkpoint['actions'] != [action.value for action in ACTIONS]:
+            raise ValueError(f"{filepath} was written with a different action set")
+
+        with self._lock:
+            # Entries were saved least recently used first
+            self.tables = {
+                level: OrderedDict(
+                    (key, [values, counts]) for key, values, counts in checkpoint['tables'][level]
+                )
+                for level in LEVELS
+            }
+            self.epsilon = checkpoint['epsilon']
+            self.learning_rate = checkpoint['learning_rate']
+            self.default_q_value = checkpoint['default_q_value']
+            self.backoff_strength = checkpoint['backoff_strength']
+            self.max_entries = checkpoint['max_entries']
+            self.total_updates = checkpoint['total_updates']
+            self.exploration_count = checkpoint['exploration_count']
+            self.exploitation_count = checkpoint['exploitation_count']
+
+        return True
+
+    def set_epsilon(self, epsilon):
+        """Adjust exploration rate.
+
+        Args:
+            epsilon: New exploration rate (0.0 to 1.0)
+        """
+        self.epsilon = max(0.0, min(1.0, epsilon))
+
+    def reset_statistics(self):
+        """Reset decision counters (useful after loading checkpoint)."""
+        self.total_updates = 0
+        self.exploration_count = 0
+        self.exploitation_count = 0
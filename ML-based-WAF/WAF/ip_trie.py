@@ -0,0 +1,205 @@
+'''CIDR prefix trie for IP address classification.
+
+Addresses are parsed into integers (IPv4-mapped IPv6 addresses are treated as
+IPv4) and matched against a binary trie with one root per address family.
+A lookup walks at most one node per prefix bit and returns the value of the
+longest matching prefix, so the cost does not grow with the number of ranges.
+
+Rules files are JSON:
+
+    {
+        "include_defaults": true,
+        "allow": ["10.0.0.0/8", "2001:db8::/32"],
+        "deny": ["10.66.0.0/16"]
+    }
+
+The longest prefix wins, so a deny range can carve an exception out of a
+larger allow range (and vice versa).
+'''
+
+import ipaddress
+import json
+import socket
+
+
+ALLOW = 'allow'
+DENY = 'deny'
+
+# Private / loopback / link-local networks treated as internal by default
+DEFAULT_INTERNAL_CIDRS = [
+    '127.0.0.0/8',       # localhost
+    '10.0.0.0/8',        # private class A
+    '172.16.0.0/12',     # private class B
+    '192.168.0.0/16',    # private class C
+    '::1/128',           # IPv6 localhost
+    'fe80::/10',         # IPv6 link-local
+    'fc00::/7',          # IPv6 unique local
+]
+
+_IPV4_MAPPED_PREFIX = 0xffff
+
+
+def parse_ip(ip):
+    """Parse an IP address string into (version, integer).
+
+    Args:
+        ip: IPv4 or IPv6 address (an IPv6 zone suffix like '%eth0' is ignored)
+
+    Returns:
+        tuple: (4 or 6, int), or None if the string is not an IP address
+    """
+    try:
+        return 4, int.from_bytes(socket.inet_pton(socket.AF_INET, ip), 'big')
+    except (OSError, TypeError):
+        pass
+    try:
+        value = int.from_bytes(socket.inet_pton(socket.AF_INET6, ip.split('%', 1)[0]), 'big')
+    except (OSError, TypeError, AttributeError):
+        return None
+    if value >> 32 == _IPV4_MAPPED_PREFIX:
+        return 4, value & 0xffffffff
+    return 6, value
+
+
+class CIDRTrie:
+    """Binary prefix trie mapping CIDR ranges to values.
+
+    Nodes live in flat lists (child indices and values) rather than
+    per-node objects, which keeps large rule sets compact.
+    """
+
+    _BITS = {4: 32, 6: 128}
+
+    def __init__(self):
+        """Create an empty trie with an IPv4 and an IPv6 root."""
+        self._zero = []
+        self._one = []
+        self._values = []
+        self._roots = {4: self._new_node(), 6: self._new_node()}
+        self.size = 0
+        # Longest prefix inserted per family: addresses that agree on this
+        # many leading bits always get the same lookup result
+        self.max_prefix = {4: 0, 6: 0}
+
+    def _new_node(self):
+        self._zero.append(-1)
+        self._one.append(-1)
+        self._values.append(None)
+        return len(self._values) - 1
+
+    def insert(self, cidr, value):
+        """Add a CIDR range (a later insert of the same range replaces it).
+
+        Args:
+            cidr: Network string like '10.0.0.0/8' or '2001:db8::/32'
+                (host bits are ignored)
+            value: Value returned for addresses in the range
+        """
+        network = ipaddress.ip_network(cidr, strict=False)
+        version = network.version
+        prefix = network.prefixlen
+        address = int(network.network_address)
+        if version == 6 and prefix >= 96 and address >> 32 == _IPV4_MAPPED_PREFIX:
+            # ::ffff:a.b.c.d/n is the IPv4 range a.b.c.d/(n-96)
+            version, prefix, address = 4, prefix - 96, address & 0xffffffff
+
+        bits = self._BITS[version]
+        node = self._roots[version]
+        for shift in range(bits - 1, bits - 1 - prefix, -1):
+            children = self._one if (address >> shift) & 1 else self._zero
+            child = children[node]
+            if child == -1:
+                child = self._new_node()
+                children[node] = child
+            node = child
+
+        if self._values[node] is None:
+            self.size += 1
+        self._values[node] = value
+        self.max_prefix[version] = max(self.max_prefix[version], prefix)
+
+    def lookup(self, ip):
+        """Find the value of the longest prefix containing an address.
+
+        Args:
+            ip: Address string
+
+        Returns:
+            Value of the longest matching range, or None
+        """
+        parsed = parse_ip(ip)
+        if parsed is None:
+            return None
+        return self.lookup_int(*parsed)
+
+    def lookup_int(self, version, address):
+        """Longest-prefix match for a parsed address.
+
+        Args:
+            version: 4 or 6
+            address: Address as an integer
+
+        Returns:
+            Value of the longest matching range, or None
+        """
+        zero, one, values = self._zero, self._one, self._values
+        node = self._roots[version]
+        best = values[node]
+        for shift in range(self._BITS[version] - 1, -1, -1):
+            node = one[node] if (address >> shift) & 1 else zero[node]
+            if node == -1:
+                break
+            value = values[node]
+            if value is not None:
+                best = value
+        return best
+
+    def prefix_key(self, ip):
+        """Truncate an address to the longest prefix length in the trie.
+
+        Addresses with the same key always have the same lookup result, which
+        makes the key usable for caching decisions per origin network.
+
+        Args:
+            ip: Address string
+
+        Returns:
+            tuple: (version, truncated address), or None if not an IP address
+        """
+        parsed = parse_ip(ip)
+        if parsed is None:
+            return None
+        version, address = parsed
+        return version, address >> (self._BITS[version] - self.max_prefix[version])
+
+    def __len__(self):
+        return self.size
+
+
+def load_ip_rules(filepath=None, include_defaults=True):
+    """Build an allow/deny trie from defaults and an optional rules file.
+
+    Args:
+        filepath: JSON rules file (see module docstring), or None
+        include_defaults: Add DEFAULT_INTERNAL_CIDRS as allow ranges (a
+            rules file can override this with "include_defaults")
+
+    Returns:
+        CIDRTrie: Maps ranges to ALLOW or DENY
+    """
+    rules = {}
+    if filepath:
+        with open(filepath) as f:
+            rules = json.load(f)
+        include_defaults = rules.get('include_defaults', include_defaults)
+
+    trie = CIDRTrie()
+    if include_defaults:
+        for cidr in DEFAULT_INTERNAL_CIDRS:
+            trie.insert(cidr, ALLOW)
+    for cidr in rules.get(ALLOW, []):
+        trie.insert(cidr, ALLOW)
+    # Deny ranges are inserted last so they win over identical allow ranges
+    for cidr in rules.get(DENY, []):
+        trie.insert(cidr, DENY)
+    return trie
@@ -0,0 +1,284 @@
+'''Offline trainer for PolicyAgent.
+
+Live traffic teaches the agent one request at a time. This trainer replays
+historical requests instead, at batch speed:
+
+1. stream requests in chunks from log.db + its payload log and/or from the
+   labelled datasets (Dataset/*_clean.json)
+2. re-extract features with FeatureExtractor.extract_features_batch
+3. score every action against the ground-truth label (ThreatClassifier
+   verdicts stored in the threats table, or the dataset label)
+4. apply the rewards with PolicyAgent.update_batch
+5. write a checkpoint that sniffing_rl.py loads at startup
+
+Because the label says what the request really was, the reward of every
+action is known, so each request updates all actions of its state.
+
+Usage:
+    python offline_trainer.py --db log.db --dataset ../Dataset/HTTPParams_clean.json
+'''
+
+from argparse import ArgumentParser
+import json
+import sqlite3
+import time
+
+import numpy as np
+
+from request import Request
+from payload_store import load_payload
+from feature_extractor import FeatureExtractor
+from rl_agent import PolicyAgent, ACTIONS
+from reward_calculator import RewardCalculator
+
+
+# Verdicts written by ThreatClassifier (see classifier.py)
+ATTACK_LABELS = {'sqli', 'xss', 'cmdi', 'path-traversal', 'parameter-tampering'}
+BENIGN_LABEL = 'valid'
+
+
+def label_from_threats(threat_types):
+    """Turn the threat types logged for a request into a ground-truth label.
+
+    Args:
+        threat_types: Iterable of threat_type values from the threats table
+
+    Returns:
+        bool: True for an attack, False for benign, None if no classifier
+            verdict was logged (e.g. rows written by sniffing_rl.py)
+    """
+    threat_types = set(threat_types)
+    if threat_types & ATTACK_LABELS:
+        return True
+    if BENIGN_LABEL in threat_types:
+        return False
+    return None
+
+
+def _load_logged_request(conn, log_dir, log_id, method):
+    """Rebuild a Request from its logged payload (segment or <id>.json file)."""
+    try:
+        payload = load_payload(conn, log_dir, log_id)
+        if payload is None:
+            return None
+        data = json.loads(payload)
+    except (OSError, ValueError):
+        return None
+    request = data.pop('request', None)
+    body = data.pop('body', None)
+    return Request(id=log_id, request=request, body=body, method=method, headers=data)
+
+
+def iter_log_requests(db_path, log_dir='requests_log', chunk_size=10000, classifier=None):
+    """Stream labelled requests out of the log database.
+
+    Args:
+        db_path: SQLite log database written by DBController
+        log_dir: Directory with the request JSON files
+        chunk_size: Requests per yielded chunk
+        classifier: Optional ThreatClassifier used to label rows without a
+            logged verdict (unlabelled rows are skipped otherwise)
+
+    Yields:
+        tuple: (list of Request, np.ndarray of bool labels)
+    """
+    conn = sqlite3.connect(db_path)
+    try:
+        cursor = conn.execute(
+            "SELECT l.id, l.method, group_concat(t.threat_type, char(31)) "
+            "FROM logs AS l LEFT JOIN threats AS t ON l.id = t.log_id "
+            "GROUP BY l.id ORDER BY l.id"
+        )
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            requests, labels = [], []
+            for log_id, method, threat_types in rows:
+                req = _load_logged_request(conn, log_dir, log_id, method)
+                if req is None:
+                    continue
+                label = label_from_threats(threat_types.split('\x1f') if threat_types else ())
+                if label is None and classifier is not None:
+                    classifier.classify_request(req)
+                    label = label_from_threats(req.threats)
+                if label is None:
+                    continue
+                requests.append(req)
+                labels.append(label)
+            if requests:
+                yield requests, np.array(labels, dtype=bool)
+    finally:
+        conn.close()
+
+
+def iter_dataset_requests(path, chunk_size=10000):
+    """Stream labelled requests from a dataset JSON file.
+
+    Each pattern becomes the request line of a GET request. Records without
+    a pattern (e.g. pt_dataset.json, which only has lengths) are skipped.
+
+    Args:
+        path: JSON list of {'pattern': ..., 'type': ...} records
+        chunk_size: Requests per yielded chunk
+
+    Yields:
+        tuple: (list of Request, np.ndarray of bool labels)
+    """
+    with open(path) as f:
+        records = json.load(f)
+
+    for start in range(0, len(records), chunk_size):
+        requests, labels = [], []
+        for record in records[start:start + chunk_size]:
+            pattern = record.get('pattern')
+            if not pattern:
+                continue
+            requests.append(Request(request=pattern, method='GET', headers={}))
+            labels.append(record.get('type', record.get('label')) != BENIGN_LABEL)
+        if requests:
+            yield requests, np.array(labels, dtype=bool)
+
+
+class OfflineTrainer:
+    """Replays labelled requests through a PolicyAgent in batches."""
+
+    def __init__(self, agent, reward_calculator=None, feature_extractor=None):
+        """Initialize the trainer.
+
+        Args:
+            agent: PolicyAgent to train
+            reward_calculator: RewardCalculator defining the rewards
+            feature_extractor: FeatureExtractor (default: a new one)
+        """
+        self.agent = agent
+        self.reward_calculator = reward_calculator or RewardCalculator()
+        self.feature_extractor = feature_extractor or FeatureExtractor()
+
+        # reward_table[is_attack, action_index]
+        self.reward_table = np.array([
+            [self.reward_calculator.calculate_reward(action, {'is_attack': is_attack})
+             for action in ACTIONS]
+            for is_attack in (False, True)
+        ])
+
+        self.requests_trained = 0
+        self.updates_applied = 0
+        self.extract_time = 0.0
+        self.update_time = 0.0
+
+    def train_chunk(self, requests, labels):
+        """Train on one chunk of labelled requests.
+
+        Args:
+            requests: List of Request objects
+            labels: Array of bools (True = attack)
+
+        Returns:
+            int: Number of Q-value updates applied
+        """
+        start = time.perf_counter()
+        features = self.feature_extractor.extract_features_batch(requests)
+        self.extract_time += time.perf_counter() - start
+
+        start = time.perf_counter()
+        # Look up each distinct state once
+        unique_rows, inverse = np.unique(features, axis=0, return_inverse=True)
+        names = FeatureExtractor.FEATURE_NAMES
+        unique_ids = np.fromiter(
+            (self.agent.state_id(dict(zip(names, row))) for row in unique_rows.tolist()),
+            dtype=np.int64, count=len(unique_rows)
+        )
+        state_ids = unique_ids[inverse.reshape(-1)]
+
+        # Full information: every action of every request gets its reward
+        n_actions = len(ACTIONS)
+        self.agent.update_batch(
+            np.repeat(state_ids, n_actions),
+            np.tile(np.arange(n_actions), len(state_ids)),
+            self.reward_table[labels.astype(np.int64)].reshape(-1)
+        )
+        self.update_time += time.perf_counter() - start
+
+        updates = len(state_ids) * n_actions
+        self.requests_trained += len(state_ids)
+        self.updates_applied += updates
+        return updates
+
+    def train(self, chunks):
+        """Train on every chunk of an iterator.
+
+        Args:
+            chunks: Iterator of (requests, labels) chunks
+
+        Returns:
+            dict: Training statistics
+        """
+        for requests, labels in chunks:
+            self.train_chunk(requests, labels)
+        return self.get_statistics()
+
+    def get_statistics(self):
+        """Get training statistics.
+
+        Returns:
+            dict: Counts, stage timings and throughput
+        """
+        total_time = self.extract_time + self.update_time
+        return {
+            'requests_trained': self.requests_trained,
+            'updates_applied': self.updates_applied,
+            'q_table_size': len(self.agent.q_table),
+            'extract_time_s': self.extract_time,
+            'update_time_s': self.update_time,
+            'requests_per_second': self.requests_trained / total_time if total_time else 0.0,
+            'updates_per_second': self.updates_applied / self.update_time if self.update_time else 0.0
+        }
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Train the RL policy offline from logged or labelled requests')
+    parser.add_argument('--db', default=None, help='Log database written by the WAF')
+    parser.add_argument('--log-dir', default='requests_log', help='Directory of logged request payloads')
+    parser.add_argument('--dataset', action='append', default=[],
+                        help='Labelled dataset JSON (repeatable)')
+    parser.add_argument('--classify', action='store_true',
+                        help='Label database rows without a verdict with ThreatClassifier')
+    parser.add_argument('--checkpoint', default='rl_policy_checkpoint.pkl',
+                        help='Checkpoint to write (loaded by sniffing_rl.py)')
+    parser.add_argument('--resume', action='store_true',
+                        help='Continue from the existing checkpoint')
+    parser.add_argument('--learning-rate', type=float, default=0.05, help='Q-learning rate')
+    parser.add_argument('--epochs', type=int, default=1, help='Passes over the data')
+    parser.add_argument('--chunk-size', type=int, default=10000, help='Requests per batch')
+    args = parser.parse_args()
+
+    if args.db is None and not args.dataset:
+        parser.error('give --db and/or --dataset')
+
+    agent = PolicyAgent(learning_rate=args.learning_rate)
+    if args.resume and agent.load_checkpoint(args.checkpoint):
+        print(f"[INFO] Resuming from {args.checkpoint}")
+
+    classifier = None
+    if args.classify:
+        from classifier import ThreatClassifier
+        classifier = ThreatClassifier()
+
+    trainer = OfflineTrainer(agent)
+    for epoch in range(args.epochs):
+        if args.db is not None:
+            trainer.train(iter_log_requests(args.db, args.log_dir, args.chunk_size, classifier))
+        for path in args.dataset:
+            trainer.train(iter_dataset_requests(path, args.chunk_size))
+        stats = trainer.get_statistics()
+        print(f"[EPOCH {epoch + 1}] {stats['requests_trained']} requests, "
+              f"{stats['updates_applied']} updates, {stats['q_table_size']} Q-table entries")
+
+    stats = trainer.get_statistics()
+    print(f"[INFO] Feature extraction: {stats['extract_time_s']:.2f}s, "
+          f"updates: {stats['update_time_s']:.2f}s "
+          f"({stats['updates_per_second']:,.0f} updates/s)")
+
+    agent.save_checkpoint(args.checkpoint)
+    print(f"[INFO] Checkpoint written to {args.checkpoint}")
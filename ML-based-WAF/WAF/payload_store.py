@@ -0,0 +1,341 @@
+'''Segmented append-only store for logged request payloads.
+
+DBController used to write requests_log/<id>.json for every request, which
+costs one inode and one directory entry per request. Payloads are now
+appended to a few large segment files instead:
+
+    requests_log/segment-000001.log, segment-000002.log, ...
+
+Each record is framed as (log_id, length, CRC32) followed by the payload
+bytes, and the `payloads` table in log.db maps
+
+    log_id -> (segment, offset, length)
+
+so a payload is read with one seek and one read, and the framing lets a
+reader check that the bytes are the record it asked for. A new segment is
+started when the current one would grow past segment_bytes.
+
+The index row is written in the same transaction as the log row, after the
+record has been appended, so an indexed payload is always present. Appends
+lock the segment (flock) and take their offset from its current size, so
+several processes can write the same directory (sniffing.py and
+sniffing_rl.py both default to requests_log/). A record
+whose transaction never committed is simply never referenced.
+
+Existing per-request JSON files are moved into segments once with
+
+    python payload_store.py --db log.db --log-dir requests_log
+
+and readers fall back to <id>.json for ids that are not indexed yet.
+'''
+
+from argparse import ArgumentParser
+import fcntl
+import os
+import re
+import sqlite3
+import struct
+import zlib
+
+
+# Record header: log id, payload length, CRC32 of the payload
+_RECORD_HEADER = struct.Struct('<QII')
+
+_SEGMENT_NAME = re.compile(r'^segment-(\d+)\.log$')
+_LEGACY_NAME = re.compile(r'^(\d+)\.json$')
+
+
+def segment_path(directory, segment):
+    """Path of a segment file.
+
+    Args:
+        directory: Payload directory
+        segment: Segment number
+
+    Returns:
+        str: Segment path
+    """
+    return os.path.join(directory, f'segment-{segment:06d}.log')
+
+
+# Also part of the log database schema in request.py
+PAYLOADS_TABLE_SQL = (
+    "CREATE TABLE IF NOT EXISTS payloads ("
+    "log_id INTEGER PRIMARY KEY, segment INTEGER, offset INTEGER, length INTEGER)"
+)
+
+
+def create_index_table(conn):
+    """Create the payload index table if it does not exist.
+
+    Args:
+        conn: sqlite3 connection to the log database
+    """
+    conn.execute(PAYLOADS_TABLE_SQL)
+
+
+def read_record(directory, segment, offset, length, log_id=None):
+    """Read one payload with a single seek.
+
+    Args:
+        directory: Payload directory
+        segment: Segment number from the index
+        offset: Record offset from the index
+        length: Payload length from the index
+        log_id: Expected log id (checked against the record header)
+
+    Returns:
+        bytes: Payload
+
+    Raises:
+        ValueError: If the record is truncated, corrupted or belongs to
+            another id
+    """
+    with open(segment_path(directory, segment), 'rb') as f:
+        f.seek(offset)
+        data = f.read(_RECORD_HEADER.size + length)
+    if len(data) != _RECORD_HEADER.size + length:
+        raise ValueError(f"segment {segment}: record at {offset} is truncated")
+    record_id, record_length, crc = _RECORD_HEADER.unpack_from(data)
+    payload = data[_RECORD_HEADER.size:]
+    if record_length != length or zlib.crc32(payload) != crc or (log_id is not None and record_id != log_id):
+        raise ValueError(f"segment {segment}: record at {offset} is corrupted")
+    return payload
+
+
+def load_payload(conn, directory, log_id):
+    """Load the logged payload of a request.
+
+    Args:
+        conn: sqlite3 connection to the log database
+        directory: Payload directory
+        log_id: Id of the logs row
+
+    Returns:
+        str: JSON payload, or None if the request has none
+    """
+    try:
+        row = conn.execute(
+            "SELECT segment, offset, length FROM payloads WHERE log_id = ?", (log_id,)
+        ).fetchone()
+    except sqlite3.OperationalError:
+        # Database from before the payload index
+        row = None
+    if row is not None:
+        return read_record(directory, row[0], row[1], row[2], log_id).decode('utf-8')
+
+    # Not migrated yet
+    try:
+        with open(os.path.join(directory, f'{log_id}.json')) as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+class PayloadStore:
+    """Appends payload records to rotating segment files.
+
+    Not thread-safe: a store is written by one thread (DBController's
+    writer), readers use read_record()/load_payload(). Stores in several
+    processes may share a directory; appends are serialized with flock.
+    """
+
+    def __init__(self, directory='requests_log', segment_bytes=64 * 1024 * 1024):
+        """Initialize the store.
+
+        Args:
+            directory: Directory holding the segments
+            segment_bytes: Size after which a new segment is started
+        """
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+
+        # Current segment, opened on the first append
+        self._file = None
+        self._segment = None
+        self._size = 0
+
+        # Statistics for monitoring
+        self.records_written = 0
+        self.bytes_written = 0
+        self.rotations = 0
+
+    def _open_segment(self, segment):
+        if self._file is not None:
+            self._file.close()
+        self._file = open(segment_path(self.directory, segment), 'ab')
+        self._segment = segment
+        self._size = self._file.tell()
+
+    def _open_latest(self):
+        """Continue the newest existing segment (or start the first one)."""
+        os.makedirs(self.directory, exist_ok=True)
+        segments = [int(m.group(1)) for m in map(_SEGMENT_NAME.match, os.listdir(self.directory)) if m]
+        self._open_segment(max(segments, default=1))
+
+    def _lock_segment(self, needed):
+        """Lock the current segment and return its end offset.
+
+        Moves on to the next segment while the current one (possibly filled
+        by another writer) has no room for `needed` bytes.
+        """
+        while True:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+            size = os.fstat(self._file.fileno()).st_size
+            if size == 0 or size + needed <= self.segment_bytes:
+                return size
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+            self._open_segment(self._segment + 1)
+            self.rotations += 1
+
+    def append_batch(self, records):
+        """Append records with one write per segment touched.
+
+        Each segment is written under an exclusive lock, at its current end,
+        so writers in other processes (a second WAF, a running migration)
+        never get overlapping offsets.
+
+        Args:
+            records: list of (log_id, payload bytes)
+
+        Returns:
+            list: (log_id, segment, offset, length) index rows, in order
+        """
+        if self._file is None:
+            self._open_latest()
+
+        index_rows = []
+        chunks = []
+        locked = False
+        try:
+            for log_id, payload in records:
+                size = _RECORD_HEADER.size + len(payload)
+                if not locked:
+                    self._size = self._lock_segment(size)
+                    locked = True
+                elif self._size + size > self.segment_bytes:
+                    self._write(chunks)
+                    chunks = []
+                    fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+                    self._open_segment(self._segment + 1)
+                    self.rotations += 1
+                    self._size = self._lock_segment(size)
+                index_rows.append((log_id, self._segment, self._size, len(payload)))
+                chunks.append(_RECORD_HEADER.pack(log_id, len(payload), zlib.crc32(payload)))
+                chunks.append(payload)
+                self._size += size
+            self._write(chunks)
+        except OSError:
+            # A partial write leaves the offsets unknown (closing also
+            # releases the lock)
+            self.close()
+            raise
+        finally:
+            if locked and self._file is not None:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+        self.records_written += len(records)
+        return index_rows
+
+    def append(self, log_id, payload):
+        """Append one record.
+
+        Args:
+            log_id: Id of the logs row
+            payload: Payload bytes
+
+        Returns:
+            tuple: (log_id, segment, offset, length) index row
+        """
+        return self.append_batch([(log_id, payload)])[0]
+
+    def _write(self, chunks):
+        if chunks:
+            data = b''.join(chunks)
+            self._file.write(data)
+            self._file.flush()
+            self.bytes_written += len(data)
+
+    def close(self):
+        """Close the current segment."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def get_statistics(self):
+        """Get store statistics for monitoring.
+
+        Returns:
+            dict: Current segment and write counters
+        """
+        return {
+            'segment': self._segment,
+            'segment_size': self._size,
+            'records_written': self.records_written,
+            'bytes_written': self.bytes_written,
+            'rotations': self.rotations
+        }
+
+
+def migrate_directory(conn, directory, segment_bytes=64 * 1024 * 1024, batch_size=1000,
+                      remove_files=True):
+    """Move per-request <id>.json files into segments (one-time migration).
+
+    Files are indexed in batches; a batch's files are deleted only after its
+    index rows are committed, so the migration can be interrupted and rerun.
+
+    Args:
+        conn: sqlite3 connection to the log database
+        directory: Directory with the <id>.json files
+        segment_bytes: Segment size for the new segments
+        batch_size: Files per transaction
+        remove_files: Delete the JSON files once migrated
+
+    Returns:
+        int: Number of payloads migrated
+    """
+    create_index_table(conn)
+    conn.commit()
+    indexed = {row[0] for row in conn.execute("SELECT log_id FROM payloads")}
+    legacy = sorted(
+        (int(m.group(1)), m.group(0))
+        for m in map(_LEGACY_NAME.match, os.listdir(directory)) if m
+    )
+
+    store = PayloadStore(directory, segment_bytes)
+    migrated = 0
+    try:
+        for start in range(0, len(legacy), batch_size):
+            batch = legacy[start:start + batch_size]
+            records = []
+            for log_id, name in batch:
+                if log_id in indexed:
+                    continue
+                with open(os.path.join(directory, name), 'rb') as f:
+                    records.append((log_id, f.read()))
+            if records:
+                with conn:
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO payloads (log_id, segment, offset, length) "
+                        "VALUES (?, ?, ?, ?)",
+                        store.append_batch(records)
+                    )
+                migrated += len(records)
+            if remove_files:
+                for _, name in batch:
+                    os.remove(os.path.join(directory, name))
+    finally:
+        store.close()
+    return migrated
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Move requests_log/<id>.json files into payload segments')
+    parser.add_argument('--db', default='log.db', help='Log database written by the WAF')
+    parser.add_argument('--log-dir', default='requests_log', help='Directory of logged request files')
+    parser.add_argument('--keep-files', action='store_true', help='Do not delete migrated JSON files')
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db)
+    count = migrate_directory(conn, args.log_dir, remove_files=not args.keep_files)
+    conn.close()
+    print(f"[INFO] Migrated {count} payloads from {args.log_dir}/*.json into segments")
@@ -0,0 +1,343 @@
+'''Offline policy evaluation over logged WAF decisions.
+
+Before enabling --enforce we want to know how a candidate policy would have
+performed on past traffic. sniffing_rl.py can log every decision (features,
+final action, reward and the propensity of that action) with DecisionLogger
+into a flat binary file. This module loads such logs straight into NumPy
+arrays and computes three estimates of the candidate policy's average reward:
+
+- IPS (inverse propensity scoring): mean(w * r), with w = pi(a|x) / mu(a|x)
+- SNIPS (self-normalized IPS): sum(w * r) / sum(w)
+- DR (doubly robust): mean(sum_a pi(a|x) q(x,a) + w * (r - q(x,a_logged)))
+
+All estimates are computed with array operations (no Python loop per row)
+and reported with normal-approximation confidence intervals.
+
+Usage:
+    python policy_evaluation.py decisions.log --checkpoint rl_policy_checkpoint.pkl
+'''
+
+from argparse import ArgumentParser
+from statistics import NormalDist
+import os
+import threading
+import time
+
+import numpy as np
+
+from rl_agent import PolicyAgent, ACTIONS, ACTION_INDEX
+from feature_extractor import FeatureExtractor
+
+
+FEATURE_NAMES = FeatureExtractor.FEATURE_NAMES
+
+# One fixed-size record per decision
+DECISION_DTYPE = np.dtype([
+    ('timestamp', '<f8'),
+    ('features', '<f8', (len(FEATURE_NAMES),)),
+    ('action', 'i1'),
+    ('reward', '<f4'),
+    ('propensity', '<f4')
+])
+
+
+class DecisionLogger:
+    """Appends decisions to a binary log readable with load_decisions.
+
+    Records are buffered in a NumPy array and appended in blocks, so
+    logging a decision costs one row write. Safe to use from several
+    threads: delayed rewards are logged by the threads that join them.
+    """
+
+    def __init__(self, filepath, flush_every=1024):
+        """Initialize the decision logger.
+
+        Args:
+            filepath: Log file path (appended to if it exists)
+            flush_every: Number of buffered records per write
+        """
+        self.filepath = filepath
+        self._buffer = np.zeros(flush_every, dtype=DECISION_DTYPE)
+        self._count = 0
+        self.records_written = 0
+        self._lock = threading.Lock()
+
+    def log(self, features, action, reward, propensity, timestamp=None):
+        """Buffer one decision.
+
+        Args:
+            features: dict of features the decision was based on
+            action: Action that was executed
+            reward: Observed (or estimated) reward
+            propensity: Probability that the logging policy executed this action
+            timestamp: Decision time (default: now)
+        """
+        with self._lock:
+            row = self._buffer[self._count]
+            row['timestamp'] = time.time() if timestamp is None else timestamp
+            row['features'] = [features.get(name, 0) for name in FEATURE_NAMES]
+            row['action'] = ACTION_INDEX[action]
+            row['reward'] = reward
+            row['propensity'] = propensity
+            self._count += 1
+            if self._count == len(self._buffer):
+                self._flush()
+
+    def flush(self):
+        """Append buffered decisions to the log file."""
+        with self._lock:
+            self._flush()
+
+    def _flush(self):
+        """Write the buffer (caller holds the lock)."""
+        if self._count == 0:
+            return
+        with open(self.filepath, 'ab') as f:
+            self._buffer[:self._count].tofile(f)
+        self.records_written += self._count
+        self._count = 0
+
+    def close(self):
+        """Flush remaining decisions."""
+        self.flush()
+
+
+def load_decisions(filepath):
+    """Load a decision log into a structured array.
+
+    A partially written last record (e.g. after a crash) is ignored.
+
+    Args:
+        filepath: Log written by DecisionLogger
+
+    Returns:
+        np.ndarray: Structured array with DECISION_DTYPE
+    """
+    count = os.path.getsize(filepath) // DECISION_DTYPE.itemsize
+    return np.fromfile(filepath, dtype=DECISION_DTYPE, count=count)
+
+
+def policy_action_probabilities(policy, features):
+    """Evaluate a candidate policy's action probabilities on logged features.
+
+    Tabular and linear agents compute all rows with array operations
+    (get_action_probabilities_batch). Other policies are queried once per
+    distinct feature vector, which with continuous features such as length
+    and entropy is close to once per row.
+
+    Args:
+        policy: Object with get_action_probabilities(state) -> {Action: p}
+        features: (n, n_features) array in FEATURE_NAMES order
+
+    Returns:
+        np.ndarray: (n, n_actions) probabilities in ACTIONS order
+    """
+    if len(features) == 0:
+        return np.zeros((0, len(ACTIONS)))
+    if hasattr(policy, 'get_action_probabilities_batch'):
+        return policy.get_action_probabilities_batch(features, FEATURE_NAMES)
+
+    unique_rows, inverse = np.unique(features, axis=0, return_inverse=True)
+    unique_probabilities = np.empty((len(unique_rows), len(ACTIONS)))
+    for i, row in enumerate(unique_rows.tolist()):
+        probabilities = policy.get_action_probabilities(dict(zip(FEATURE_NAMES, row)))
+        unique_probabilities[i] = [probabilities[action] for action in ACTIONS]
+    return unique_probabilities[inverse.reshape(-1)]
+
+
+def fit_reward_model(features, actions, rewards, regularization=1.0):
+    """Fit a ridge regression reward model per action (the DR direct method).
+
+    Features are log1p-compressed and a bias column is added.
+
+    Args:
+        features: (n, n_features) array
+        actions: (n,) logged action indices
+        rewards: (n,) logged rewards
+        regularization: Ridge penalty
+
+    Returns:
+        np.ndarray: (n, n_actions) predicted reward for every action
+    """
+    x = np.log1p(np.maximum(features, 0.0))
+    x = np.hstack((x, np.ones((len(x), 1))))
+    identity = np.eye(x.shape[1]) * regularization
+
+    predictions = np.zeros((len(x), len(ACTIONS)))
+    for a in range(len(ACTIONS)):
+        mask = actions == a
+        if not mask.any():
+            continue
+        xa = x[mask]
+        theta = np.linalg.solve(xa.T @ xa + identity, xa.T @ rewards[mask])
+        predictions[:, a] = x @ theta
+    return predictions
+
+
+class OfflinePolicyEvaluator:
+    """Computes IPS, SNIPS and doubly-robust estimates with confidence intervals."""
+
+    def __init__(self, confidence=0.95, max_weight=None, min_propensity=1e-6):
+        """Initialize the evaluator.
+
+        Args:
+            confidence: Confidence level of the reported intervals
+            max_weight: Optional clip for importance weights (reduces variance,
+                adds bias)
+            min_propensity: Floor for logged propensities (sampled Thompson
+                propensities can be 0)
+        """
+        self.confidence = confidence
+        self.max_weight = max_weight
+        self.min_propensity = min_propensity
+        self._z = NormalDist().inv_cdf(0.5 + confidence / 2.0)
+
+    def _interval(self, estimate, std_error):
+        return {
+            'estimate': float(estimate),
+            'std_error': float(std_error),
+            'ci_low': float(estimate - self._z * std_error),
+            'ci_high': float(estimate + self._z * std_error)
+        }
+
+    def evaluate(self, actions, rewards, propensities, target_probabilities,
+                 reward_predictions=None):
+        """Estimate the candidate policy's average reward on logged data.
+
+        Args:
+            actions: (n,) logged action indices
+            rewards: (n,) logged rewards
+            propensities: (n,) probability of the logged action under the logging policy
+            target_probabilities: (n, n_actions) candidate policy probabilities
+            reward_predictions: (n, n_actions) reward model output for DR
+                (optional, DR is skipped without it)
+
+        Returns:
+            dict: Estimates with confidence intervals and diagnostics
+        """
+        actions = np.asarray(actions, dtype=np.int64)
+        rewards = np.asarray(rewards, dtype=np.float64)
+        propensities = np.maximum(np.asarray(propensities, dtype=np.float64), self.min_propensity)
+        n = len(actions)
+        if n == 0:
+            raise ValueError("No logged decisions to evaluate")
+
+        rows = np.arange(n)
+        weights = target_probabilities[rows, actions] / propensities
+        if self.max_weight is not None:
+            weights = np.minimum(weights, self.max_weight)
+        sqrt_n = np.sqrt(n)
+
+        # IPS
+        ips_terms = weights * rewards
+        ips = ips_terms.mean()
+        results = {'ips': self._interval(ips, ips_terms.std(ddof=1) / sqrt_n if n > 1 else 0.0)}
+
+        # SNIPS (delta-method standard error)
+        weight_sum = weights.sum()
+        mean_weight = weight_sum / n
+        if weight_sum > 0:
+            snips = ips_terms.sum() / weight_sum
+            residuals = weights * (rewards - snips)
+            std_error = np.sqrt(np.mean(residuals ** 2) / n) / mean_weight
+        else:
+            snips, std_error = 0.0, 0.0
+        results['snips'] = self._interval(snips, std_error)
+
+        # Doubly robust
+        if reward_predictions is not None:
+            direct = (target_probabilities * reward_predictions).sum(axis=1)
+            dr_terms = direct + weights * (rewards - reward_predictions[rows, actions])
+            results['dr'] = self._interval(
+                dr_terms.mean(), dr_terms.std(ddof=1) / sqrt_n if n > 1 else 0.0
+            )
+            results['direct_method'] = float(direct.mean())
+
+        results['n'] = n
+        results['logged_policy_value'] = float(rewards.mean())
+        results['effective_sample_size'] = float(
+            weight_sum ** 2 / np.sum(weights ** 2) if weight_sum > 0 else 0.0
+        )
+        results['max_weight'] = float(weights.max())
+        results['confidence'] = self.confidence
+        return results
+
+    def evaluate_log(self, decisions, policy, reward_model=True):
+        """Evaluate a candidate policy on a loaded decision log.
+
+        Args:
+            decisions: Structured array from load_decisions
+            policy: Candidate with get_action_probabilities(state)
+            reward_model: Fit a ridge reward model and report DR
+
+        Returns:
+            dict: Same as evaluate()
+        """
+        features = decisions['features']
+        actions = decisions['action'].astype(np.int64)
+        rewards = decisions['reward'].astype(np.float64)
+        target = policy_action_probabilities(policy, features)
+        predictions = fit_reward_model(features, actions, rewards) if reward_model else None
+        return self.evaluate(actions, rewards, decisions['propensity'], target, predictions)
+
+
+def load_candidate(agent_type, checkpoint, epsilon=None):
+    """Create a candidate agent from a checkpoint.
+
+    Args:
+        agent_type: 'tabular', 'linucb' or 'thompson'
+        checkpoint: Checkpoint path
+        epsilon: Optional exploration rate override for tabular agents
+
+    Returns:
+        Agent with get_action_probabilities
+    """
+    if agent_type == 'tabular':
+        agent = PolicyAgent()
+    else:
+        from linear_agent import LinearBanditAgent
+        agent = LinearBanditAgent(algorithm=agent_type)
+
+    if not agent.load_checkpoint(checkpoint):
+        raise FileNotFoundError(checkpoint)
+    if epsilon is not None:
+        agent.set_epsilon(epsilon)
+    return agent
+
+
+def print_report(results):
+    """Print an evaluation report."""
+    level = int(results['confidence'] * 100)
+    print(f"Logged decisions:      {results['n']}")
+    print(f"Logged policy value:   {results['logged_policy_value']:+.4f}")
+    print(f"Effective sample size: {results['effective_sample_size']:.1f}")
+    print(f"Max importance weight: {results['max_weight']:.2f}")
+    for name in ('ips', 'snips', 'dr'):
+        if name in results:
+            r = results[name]
+            print(f"{name.upper():6s} {r['estimate']:+.4f}  "
+                  f"{level}% CI [{r['ci_low']:+.4f}, {r['ci_high']:+.4f}]")
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Offline evaluation of a candidate policy')
+    parser.add_argument('log', help='Decision log written by sniffing_rl.py --decision-log')
+    parser.add_argument('--checkpoint', default='rl_policy_checkpoint.pkl',
+                        help='Checkpoint of the candidate policy')
+    parser.add_argument('--agent', choices=['tabular', 'linucb', 'thompson'],
+                        default='tabular', help='Candidate agent type')
+    parser.add_argument('--epsilon', type=float, default=None,
+                        help='Override exploration rate of the candidate')
+    parser.add_argument('--confidence', type=float, default=0.95,
+                        help='Confidence level of intervals')
+    parser.add_argument('--max-weight', type=float, default=None,
+                        help='Clip importance weights')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    decisions = load_decisions(args.log)
+    candidate = load_candidate(args.agent, args.checkpoint, args.epsilon)
+    evaluator = OfflinePolicyEvaluator(confidence=args.confidence, max_weight=args.max_weight)
+    results = evaluator.evaluate_log(decisions, candidate)
+    print_report(results)
+    print(f"Evaluated in {time.perf_counter() - start:.2f}s")
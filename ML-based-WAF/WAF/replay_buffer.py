@@ -0,0 +1,185 @@
+'''Experience replay for the RL-based WAF.
+
+Instead of updating the Q-table synchronously for every request, the packet
+callback records each decision in a fixed-size ring buffer (one structured
+NumPy row write). A BatchUpdater thread applies new rows to the agent with
+PolicyAgent.update_batch, and the same buffer can be sampled to replay past
+traffic so the policy converges with fewer live requests.
+'''
+
+import threading
+
+import numpy as np
+
+
+# One row per decision: state id, action index, reward, propensity
+TRANSITION_DTYPE = np.dtype([
+    ('state_id', np.int64),
+    ('action', np.int8),
+    ('reward', np.float32),
+    ('propensity', np.float32)
+])
+
+
+class ReplayBuffer:
+    """Fixed-size ring buffer of transitions backed by a NumPy array.
+
+    Memory is allocated once; when full, the oldest rows are overwritten.
+    A single producer (the capture loop) and a single consumer (the
+    BatchUpdater) can use it concurrently: rows are written before the
+    total counter is advanced, so readers never see half-written rows.
+    """
+
+    def __init__(self, capacity=65536, seed=None):
+        """Initialize the replay buffer.
+
+        Args:
+            capacity: Maximum number of transitions kept
+            seed: Optional seed for sampling
+        """
+        self.capacity = capacity
+        self.data = np.zeros(capacity, dtype=TRANSITION_DTYPE)
+
+        # Total rows ever added; the write slot is total % capacity
+        self.total = 0
+        self._rng = np.random.default_rng(seed)
+
+    def __len__(self):
+        return min(self.total, self.capacity)
+
+    def add(self, state_id, action_index, reward, propensity=1.0):
+        """Record one transition (a single array row write).
+
+        Args:
+            state_id: Id from PolicyAgent.state_id
+            action_index: Index into rl_agent.ACTIONS
+            reward: Observed reward
+            propensity: Probability the logging policy chose this action
+        """
+        self.data[self.total % self.capacity] = (state_id, action_index, reward, propensity)
+        self.total += 1
+
+    def read_since(self, cursor):
+        """Get rows added after a cursor position.
+
+        Args:
+            cursor: Value of self.total at the previous read
+
+        Returns:
+            tuple: (rows copy, new cursor, number of rows lost to overwrite)
+        """
+        end = self.total
+        start = max(cursor, end - self.capacity)
+        dropped = start - cursor
+        if start == end:
+            return self.data[:0].copy(), end, dropped
+
+        first = start % self.capacity
+        last = end % self.capacity
+        if first < last:
+            rows = self.data[first:last].copy()
+        else:
+            rows = np.concatenate((self.data[first:], self.data[:last]))
+        return rows, end, dropped
+
+    def sample(self, batch_size):
+        """Sample stored transitions uniformly with replacement.
+
+        Args:
+            batch_size: Number of transitions to sample
+
+        Returns:
+            np.ndarray: Structured array with TRANSITION_DTYPE
+        """
+        size = len(self)
+        if size == 0:
+            return self.data[:0].copy()
+        return self.data[self._rng.integers(0, size, batch_size)]
+
+
+class BatchUpdater:
+    """Background thread that applies buffered transitions in batches.
+
+    Every interval_s it applies all rows added since the previous pass and,
+    optionally, replays a random sample of older traffic.
+    """
+
+    def __init__(self, agent, buffer, interval_s=0.5, replay_batch_size=0):
+        """Initialize the batch updater.
+
+        Args:
+            agent: PolicyAgent providing update_batch
+            buffer: ReplayBuffer written by the capture loop
+            interval_s: Time between batch updates
+            replay_batch_size: Extra sampled transitions per pass (0 = none)
+        """
+        if getattr(agent, 'max_state_ids', buffer.capacity) < buffer.capacity:
+            # Ids still in the buffer could be reassigned to other states
+            raise ValueError(f"Agent keeps {agent.max_state_ids} state ids, "
+                             f"fewer than the buffer capacity {buffer.capacity}")
+        self.agent = agent
+        self.buffer = buffer
+        self.interval_s = interval_s
+        self.replay_batch_size = replay_batch_size
+
+        self._cursor = buffer.total
+        self._stop = threading.Event()
+        self._thread = None
+
+        # Statistics for monitoring
+        self.batches_applied = 0
+        self.rows_applied = 0
+        self.rows_replayed = 0
+        self.rows_dropped = 0
+
+    def start(self):
+        """Start the background thread."""
+        self._thread = threading.Thread(
+            target=self._run, name='rl-batch-updater', daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        """Stop the thread after applying everything still buffered."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def _run(self):
+        """Background loop."""
+        while not self._stop.wait(self.interval_s):
+            self.flush()
+            if self.replay_batch_size > 0 and len(self.buffer) > 0:
+                self.rows_replayed += self.agent.replay(self.buffer, self.replay_batch_size)
+
+    def flush(self):
+        """Apply all rows added since the previous flush.
+
+        Returns:
+            int: Number of rows applied
+        """
+        rows, self._cursor, dropped = self.buffer.read_since(self._cursor)
+        self.rows_dropped += dropped
+        if len(rows) == 0:
+            return 0
+
+        self.agent.update_batch(rows['state_id'], rows['action'], rows['reward'])
+        self.batches_applied += 1
+        self.rows_applied += len(rows)
+        return len(rows)
+
+    def get_statistics(self):
+        """Get updater statistics for monitoring.
+
+        Returns:
+            dict: Batch counters and buffer backlog
+        """
+        return {
+            'batches_applied': self.batches_applied,
+            'rows_applied': self.rows_applied,
+            'rows_replayed': self.rows_replayed,
+            'rows_dropped': self.rows_dropped,
+            'backlog': self.buffer.total - self._cursor
+        }
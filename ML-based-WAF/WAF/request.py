@@ -4,7 +4,70 @@ import datetime
 import sqlite3
 import pandas as pd
 import json
-import os
+import atexit
+import queue
+import threading
+import time
+
+from payload_store import PayloadStore, PAYLOADS_TABLE_SQL, load_payload
+
+###Log database schema. MIGRATIONS[n] upgrades a database from version n to n + 1 and the
+###version is kept in PRAGMA user_version. Released entries are never edited: schema changes
+###are appended as a new entry. Databases created before versioning are version 0, which is
+###why the first entry only creates what is missing.
+MIGRATIONS = [
+    [
+        "CREATE TABLE IF NOT EXISTS logs (id INTEGER PRIMARY KEY, timestamp TIMESTAMP, origin TEXT, host TEXT, method TEXT)",
+        ###location has no type: it holds strings and numbers (e.g. the logged reward)
+        "CREATE TABLE IF NOT EXISTS threats (log_id INTEGER REFERENCES logs (id), threat_type TEXT, location)",
+        PAYLOADS_TABLE_SQL
+    ],
+    [
+        ###Tables made by hand before versioning can have an untyped threats.log_id, and an
+        ###index on it cannot serve the join with logs.id (INTEGER): rebuild with INTEGER affinity
+        "CREATE TABLE threats_v2 (log_id INTEGER REFERENCES logs (id), threat_type TEXT, location)",
+        "INSERT INTO threats_v2 (log_id, threat_type, location) SELECT log_id, threat_type, location FROM threats",
+        "DROP TABLE threats",
+        "ALTER TABLE threats_v2 RENAME TO threats",
+        ###read_request() and the offline trainer look threats up by log_id
+        "CREATE INDEX IF NOT EXISTS idx_threats_log_id ON threats (log_id)",
+        "CREATE INDEX IF NOT EXISTS idx_threats_threat_type ON threats (threat_type)",
+        "CREATE INDEX IF NOT EXISTS idx_logs_timestamp ON logs (timestamp)",
+        "CREATE INDEX IF NOT EXISTS idx_logs_origin ON logs (origin)"
+    ]
+]
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+def schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def migrate_schema(conn):
+    ###Up to date: no write lock needed (the dashboard opens a controller on every refresh)
+    if schema_version(conn) == SCHEMA_VERSION:
+        return SCHEMA_VERSION
+
+    ###BEGIN IMMEDIATE takes the write lock first, so two processes starting together
+    ###cannot both apply a migration; the version is read again under the lock
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        version = schema_version(conn)
+
+        if version > SCHEMA_VERSION:
+            raise RuntimeError("Log database schema version %d is newer than this code (%d)" % (version, SCHEMA_VERSION))
+
+        for statements in MIGRATIONS[version:]:
+            for statement in statements:
+                conn.execute(statement)
+
+        ###user_version is transactional: it only changes if every migration above commits
+        conn.execute("PRAGMA user_version = %d" % SCHEMA_VERSION)
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+
+    return SCHEMA_VERSION
 
 class Request(object):
     def __init__(self, id = None, timestamp = None, origin = None, host = None, request = None, body = None, method = None, headers = None, threats = None):
@@ -34,14 +97,58 @@ class Request(object):
         return json.dumps(output)
 
 class DBController(object):
-    def __init__(self):
-        self.conn = sqlite3.connect("log.db")
+    ###With async_writes=True, save() only queues the request. A writer thread groups queued
+    ###saves into one transaction per batch_rows rows or batch_ms milliseconds (executemany,
+    ###WAL journal), so commits no longer happen once per request. Ids are assigned by the writer
+    ###inside the batch transaction, so several processes can write the same log.db (sniffing.py
+    ###and sniffing_rl.py); obj.id is set once the batch commits (after flush() returns).
+    ###Queued saves are written by flush() and close(), and at interpreter exit.
+    ###A batch that fails (e.g. the database stays locked) is retried write_retries times, then
+    ###dropped and counted in get_statistics().
+    ###Request payloads go to append-only segments in log_dir (see payload_store.py).
+    def __init__(self, db_path = "log.db", log_dir = 'requests_log', async_writes = False, batch_rows = 500, batch_ms = 50, max_queue = 10000, segment_bytes = 64 * 1024 * 1024, write_retries = 3):
+        self.db_path = db_path
+        self.log_dir = log_dir
+        self.conn = sqlite3.connect(db_path)
         self.conn.row_factory = sqlite3.Row
-    
+
+        ###Creates the tables and indexes, or upgrades an older log.db
+        migrate_schema(self.conn)
+
+        ###Written by save() in synchronous mode, by the writer thread otherwise
+        self.store = PayloadStore(log_dir, segment_bytes)
+
+        self.async_writes = async_writes
+        self.batch_rows = batch_rows
+        self.batch_ms = batch_ms
+        self.write_retries = write_retries
+        self.closed = False
+
+        self.queued = 0
+        self.written = 0
+        self.commits = 0
+        self.errors = 0
+        self.dropped = 0
+        self.max_queue_depth = 0
+        self.last_error = None
+
+        if async_writes:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+
+            self.__queue = queue.Queue(maxsize = max_queue)
+            self.__writer = threading.Thread(target = self.__write_loop, name = 'db-writer', daemon = True)
+            self.__writer.start()
+
+            atexit.register(self.close)
+
     def save(self, obj):
         if not isinstance(obj, Request):
             raise TypeError("Object should be a Request!!!")
 
+        if self.async_writes:
+            self.__save_async(obj)
+            return
+
         cursor = self.conn.cursor()
 
         obj.timestamp = datetime.datetime.now()
@@ -51,16 +158,134 @@ class DBController(object):
 
         obj.id = cursor.lastrowid
 
-        file_name = str(obj.id) + '.json'
-        file_path = os.path.join('requests_log', file_name)
-
-        with open(file_path, 'w') as f:
-            json.dump(json.loads(obj.to_json()), f)
+        cursor.execute("INSERT INTO payloads (log_id, segment, offset, length) VALUES (?, ?, ?, ?)",
+                        self.store.append(obj.id, obj.to_json().encode('utf-8')))
 
         for threat, location in obj.threats.items():
             cursor.execute("INSERT INTO threats (log_id, threat_type, location) VALUES (?, ?, ?)", (obj.id, threat, location))
 
         self.conn.commit()
+        self.written += 1
+        self.commits += 1
+
+    def __save_async(self, obj):
+        if self.closed:
+            raise RuntimeError("DBController is closed")
+
+        obj.timestamp = datetime.datetime.now()
+        obj.id = None
+
+        ###Snapshot everything now: the caller may reuse or modify the request afterwards.
+        ###obj is only kept to report the id assigned by the writer
+        threats = list(obj.threats.items())
+        item = ((obj.timestamp, obj.origin, obj.host, obj.method), threats, obj.to_json(), obj)
+
+        ###Bounded queue: when the writer falls behind, save() waits instead of dropping logs
+        self.__queue.put(item)
+        self.queued += 1
+        depth = self.__queue.qsize()
+        if depth > self.max_queue_depth:
+            self.max_queue_depth = depth
+
+    def __take_batch(self):
+        batch = [self.__queue.get()]
+        deadline = time.monotonic() + self.batch_ms / 1000
+
+        while batch[-1] is not None and len(batch) < self.batch_rows:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining <= 0:
+                    batch.append(self.__queue.get_nowait())
+                else:
+                    batch.append(self.__queue.get(timeout = remaining))
+            except queue.Empty:
+                break
+
+        return batch
+
+    def __write_loop(self):
+        conn = sqlite3.connect(self.db_path)
+        ###WAL + synchronous=NORMAL: commits append to the WAL, fsync happens at checkpoints
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+
+        stopping = False
+        while not stopping:
+            batch = self.__take_batch()
+            if batch[-1] is None:
+                stopping = True
+                batch.pop()
+
+            if len(batch) != 0:
+                self.__write_batch(conn, batch)
+
+            for _ in range(len(batch) + stopping):
+                self.__queue.task_done()
+
+        conn.close()
+
+    def __write_batch(self, conn, batch):
+        for attempt in range(self.write_retries + 1):
+            try:
+                ids = self.__insert_batch(conn, batch)
+                break
+            except (sqlite3.Error, OSError) as e:
+                ###Never let a failed batch kill the writer. The transaction was rolled back,
+                ###and payload records it appended are never referenced
+                self.errors += 1
+                self.last_error = str(e)
+                if attempt == self.write_retries:
+                    self.dropped += len(batch)
+                    return
+                time.sleep(self.batch_ms / 1000)
+
+        for item, log_id in zip(batch, ids):
+            item[3].id = log_id
+        self.written += len(batch)
+        self.commits += 1
+
+    def __insert_batch(self, conn, batch):
+        ###BEGIN IMMEDIATE takes the write lock before max(id) is read, so ids cannot collide
+        ###with rows committed meanwhile by another controller or process
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            first_id = (conn.execute("SELECT max(id) FROM logs").fetchone()[0] or 0) + 1
+            ids = range(first_id, first_id + len(batch))
+
+            conn.executemany("INSERT INTO logs (id, timestamp, origin, host, method) VALUES (?, ?, ?, ?, ?)",
+                             [(log_id,) + row for log_id, (row, _, _, _) in zip(ids, batch)])
+            conn.executemany("INSERT INTO threats (log_id, threat_type, location) VALUES (?, ?, ?)",
+                             [(log_id, threat, location) for log_id, (_, threats, _, _) in zip(ids, batch)
+                              for threat, location in threats])
+            index_rows = self.store.append_batch([(log_id, payload.encode('utf-8'))
+                                                  for log_id, (_, _, payload, _) in zip(ids, batch)])
+            conn.executemany("INSERT INTO payloads (log_id, segment, offset, length) VALUES (?, ?, ?, ?)",
+                             index_rows)
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+
+        return ids
+
+    def flush(self):
+        ###Wait until every queued save is committed
+        if self.async_writes:
+            self.__queue.join()
+
+    def get_statistics(self):
+        return {
+            'async_writes': self.async_writes,
+            'queued': self.queued,
+            'written': self.written,
+            'commits': self.commits,
+            'rows_per_commit': self.written / self.commits if self.commits > 0 else 0.0,
+            'queue_depth': self.__queue.qsize() if self.async_writes else 0,
+            'max_queue_depth': self.max_queue_depth,
+            'errors': self.errors,
+            'dropped': self.dropped,
+            'last_error': self.last_error
+        }
 
     def __create_entry(self, row):
         entry = dict(row)
@@ -79,6 +304,9 @@ class DBController(object):
 
         return pd.DataFrame(data)
 
+    def read_payload(self, id):
+        return load_payload(self.conn, self.log_dir, id)
+
     def __create_single_entry(self, row):
         return [row['threat_type'], row['location']]
 
@@ -104,4 +332,16 @@ class DBController(object):
         return log, data
 
     def close(self):
+        if self.closed:
+            return
+
+        self.closed = True
+
+        if self.async_writes:
+            ###The sentinel is queued behind every pending save, so all of them are written
+            self.__queue.put(None)
+            self.__writer.join()
+            atexit.unregister(self.close)
+
+        self.store.close()
         self.conn.close()
\ No newline at end of file
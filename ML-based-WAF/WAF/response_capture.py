@@ -0,0 +1,205 @@
+'''Request/response correlation for real reward signals.
+
+The sniffer sees requests going to the application port and responses
+coming back from it (sport=<port>). ResponseCorrelator matches each response
+to its request through a flow table keyed by the TCP 4-tuple:
+
+    (client_ip, client_port, server_ip, server_port) -> [(request_id, time), ...]
+
+A keep-alive connection carries its requests in order and HTTP/1.1 answers
+them in the same order, so a response is matched to the oldest unanswered
+request of its flow. The resulting outcome holds what the application
+actually did: status code, response size, SQL error signatures in the body
+and upstream latency. It is meant for PendingDecisionTable.join().
+
+The table is bounded: flows are kept in order of last activity, flows idle
+for ttl_s are dropped from the front on every call, and the least recently
+active flow is evicted when max_flows is reached. Requests that wait longer
+than ttl_s inside a live flow are dropped when the next response arrives,
+so one missed response cannot shift every later match.
+'''
+
+from collections import OrderedDict, deque
+import re
+import threading
+import time
+
+
+# Database error messages leaking into responses (MySQL, PostgreSQL, SQL
+# Server, Oracle, SQLite and common drivers)
+SQL_ERROR_PATTERN = re.compile(
+    r"you have an error in your sql syntax"
+    r"|warning: mysql_"
+    r"|mysql_fetch_\w+\(\)"
+    r"|sqlstate\[\w+\]"
+    r"|syntax error at or near"
+    r"|unterminated quoted string"
+    r"|pg::syntaxerror|psycopg2\.\w*error"
+    r"|unclosed quotation mark after the character string"
+    r"|microsoft ole db provider for sql server"
+    r"|\bora-\d{5}\b"
+    r"|sqlite3?\.operationalerror|sqlite_error|unrecognized token:"
+    r"|quoted string not properly terminated",
+    re.IGNORECASE
+)
+
+# Only the start of a body is scanned for error signatures
+MAX_SCAN_BYTES = 65536
+
+
+def has_sql_error(body):
+    """Check a response body for database error messages.
+
+    Args:
+        body: Response body (str or bytes)
+
+    Returns:
+        bool: True if a known SQL error signature is present
+    """
+    if not body:
+        return False
+    if isinstance(body, bytes):
+        body = body[:MAX_SCAN_BYTES].decode('latin-1')
+    return SQL_ERROR_PATTERN.search(body, 0, MAX_SCAN_BYTES) is not None
+
+
+def response_key(request_key):
+    """Flow key of the responses to a request (the reversed 4-tuple)."""
+    client_ip, client_port, server_ip, server_port = request_key
+    return server_ip, server_port, client_ip, client_port
+
+
+class ResponseCorrelator:
+    """Bounded flow table joining responses to their requests."""
+
+    def __init__(self, ttl_s=30.0, max_flows=100000):
+        """Initialize the flow table.
+
+        Args:
+            ttl_s: Seconds a request waits for its response
+            max_flows: Maximum number of flows tracked
+        """
+        self.ttl_s = ttl_s
+        self.max_flows = max_flows
+
+        # (client_ip, client_port, server_ip, server_port) ->
+        # deque of (request_id, timestamp), least recently active flow first
+        self._flows = OrderedDict()
+        self._last_seen = {}
+        self._lock = threading.Lock()
+
+        # Statistics for monitoring
+        self.tracked = 0
+        self.matched = 0
+        self.unmatched_responses = 0
+        self.expired = 0
+        self.evicted = 0
+
+    def __len__(self):
+        return len(self._flows)
+
+    def track_request(self, flow_key, request_id, timestamp=None):
+        """Remember a request until its response arrives.
+
+        Args:
+            flow_key: (client_ip, client_port, server_ip, server_port)
+            request_id: Id the outcome will be joined on
+            timestamp: Capture time of the request (default: now)
+        """
+        now = time.time() if timestamp is None else timestamp
+        with self._lock:
+            self._expire(now)
+            requests = self._flows.get(flow_key)
+            if requests is None:
+                while len(self._flows) >= self.max_flows:
+                    evicted_key, evicted = self._flows.popitem(last=False)
+                    del self._last_seen[evicted_key]
+                    self.evicted += len(evicted)
+                requests = self._flows[flow_key] = deque()
+            else:
+                self._flows.move_to_end(flow_key)
+            requests.append((request_id, now))
+            self._last_seen[flow_key] = now
+            self.tracked += 1
+
+    def match_response(self, flow_key, status, body=None, size=None, timestamp=None):
+        """Match a response to its request and build the outcome.
+
+        Args:
+            flow_key: 4-tuple of the response packet (server side first)
+            status: HTTP status code
+            body: Response body captured with the headers (str or bytes)
+            size: Response size in bytes (default: length of body)
+            timestamp: Capture time of the response (default: now)
+
+        Returns:
+            tuple: (request_id, outcome dict), or None if no request is waiting
+        """
+        now = time.time() if timestamp is None else timestamp
+        key = response_key(flow_key)
+        with self._lock:
+            self._expire(now)
+            requests = self._flows.get(key)
+            # Drop requests whose response was never seen
+            deadline = now - self.ttl_s
+            while requests and requests[0][1] <= deadline:
+                requests.popleft()
+                self.expired += 1
+            if not requests:
+                self.unmatched_responses += 1
+                return None
+            request_id, requested_at = requests.popleft()
+            if not requests:
+                del self._flows[key]
+                del self._last_seen[key]
+            self.matched += 1
+
+        return request_id, {
+            'http_status': int(status),
+            'response_bytes': size if size is not None else len(body or b''),
+            'db_error': has_sql_error(body),
+            'latency_ms': max(0.0, (now - requested_at) * 1000)
+        }
+
+    def expire(self, now=None):
+        """Drop flows idle for longer than the TTL.
+
+        Args:
+            now: Current time (default: time.time())
+
+        Returns:
+            int: Number of requests dropped
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            before = self.expired
+            self._expire(now)
+            return self.expired - before
+
+    def _expire(self, now):
+        """Pop idle flows from the front (caller holds the lock)."""
+        deadline = now - self.ttl_s
+        flows = self._flows
+        while flows:
+            key = next(iter(flows))
+            if self._last_seen[key] > deadline:
+                break
+            self.expired += len(flows.pop(key))
+            del self._last_seen[key]
+
+    def get_statistics(self):
+        """Get flow table statistics for monitoring.
+
+        Returns:
+            dict: Counters and current size
+        """
+        return {
+            'flows': len(self._flows),
+            'tracked': self.tracked,
+            'matched': self.matched,
+            'unmatched_responses': self.unmatched_responses,
+            'expired': self.expired,
+            'evicted': self.evicted,
+            'ttl_s': self.ttl_s,
+            'max_flows': self.max_flows
+        }
@@ -10,7 +10,10 @@ Reward Philosophy:
 - Bonus for using less restrictive actions when safe
 '''
 
-from rl_agent import Action
+import numpy as np
+
+from rl_agent import Action, ACTIONS
+from feature_extractor import FeatureExtractor
 
 
 class RewardCalculator:
@@ -212,6 +215,119 @@ class RewardCalculator:
         
         return self.calculate_reward(action, outcome_with_label)
     
+    def _base_reward_table(self):
+        """Base reward of every (is_attack, action index) pair.
+        
+        Returns:
+            np.ndarray: (2, len(ACTIONS)) array, same values as the branches
+                of calculate_reward
+        """
+        table = np.zeros((2, len(ACTIONS)))
+        for i, action in enumerate(ACTIONS):
+            if action in [Action.BLOCK, Action.CHALLENGE]:
+                table[:, i] = [self.false_positive_penalty, self.attack_blocked_reward]
+            elif action in [Action.ALLOW, Action.LOG_ONLY]:
+                table[:, i] = [self.legitimate_allowed_reward, self.false_negative_penalty]
+            elif action == Action.SANITIZE:
+                table[:, i] = [self.legitimate_allowed_reward * 0.8, self.attack_blocked_reward * 0.7]
+            elif action == Action.THROTTLE:
+                table[:, i] = [self.legitimate_allowed_reward * 0.6, self.attack_blocked_reward * 0.5]
+        return table
+    
+    def calculate_rewards(self, actions, is_attack, http_status=200, latency_ms=0,
+                          db_error=False, user_complaint=False):
+        """Vectorized calculate_reward for many requests at once.
+        
+        Terms are added in the same order as in calculate_reward, so every
+        element is bit-for-bit equal to the scalar result.
+        
+        Args:
+            actions: Array of action indices (positions in rl_agent.ACTIONS)
+            is_attack: Array of bools
+            http_status: Array (or scalar) of HTTP status codes
+            latency_ms: Array (or scalar) of latencies
+            db_error: Array (or scalar) of bools
+            user_complaint: Array (or scalar) of bools
+            
+        Returns:
+            np.ndarray: float64 rewards, one per request
+        """
+        actions = np.asarray(actions, dtype=np.int64)
+        is_attack = np.asarray(is_attack, dtype=bool)
+        http_status = np.asarray(http_status)
+        latency_ms = np.asarray(latency_ms, dtype=np.float64)
+        
+        reward = np.zeros(np.broadcast(actions, is_attack).shape)
+        
+        # Base reward: correctness of decision
+        reward += self._base_reward_table()[is_attack.astype(np.int64), actions]
+        
+        # Penalty for high latency
+        threshold = self.latency_penalty_threshold_ms
+        over = latency_ms > threshold
+        latency_penalty = np.minimum(0, self.max_latency_penalty * ((latency_ms - threshold) / threshold))
+        reward += np.where(over, latency_penalty, 0.0)
+        
+        # Penalties for database errors and user complaints
+        reward += np.where(db_error, -0.5, 0.0)
+        reward += np.where(user_complaint, -1.0, 0.0)
+        
+        # Bonus for efficiency: using less restrictive actions when safe
+        efficient = np.isin(actions, [ACTIONS.index(Action.LOG_ONLY), ACTIONS.index(Action.SANITIZE)])
+        reward += np.where(~is_attack & efficient, self.efficiency_bonus, 0.0)
+        
+        # Penalty for HTTP errors
+        reward += np.where(http_status >= 500, -0.3,
+                           np.where((http_status >= 400) & (http_status != 403), -0.1, 0.0))
+        
+        return reward
+    
+    def estimate_attack_probabilities(self, features, feature_names=None):
+        """Vectorized estimate_attack_probability over a feature matrix.
+        
+        Args:
+            features: (n, len(feature_names)) array, e.g. from
+                FeatureExtractor.extract_features_batch
+            feature_names: Column names (default: FeatureExtractor.FEATURE_NAMES);
+                missing columns count as 0 like missing dict keys
+            
+        Returns:
+            np.ndarray: float64 probabilities, one per row
+        """
+        features = np.asarray(features, dtype=np.float64)
+        columns = {name: i for i, name in enumerate(feature_names or FeatureExtractor.FEATURE_NAMES)}
+        zeros = np.zeros(len(features))
+        
+        def column(name):
+            return features[:, columns[name]] if name in columns else zeros
+        
+        # Same indicators, weights and summation order as the scalar version
+        score = np.zeros(len(features))
+        score += np.where(column('sql_keyword_count') > 0, 0.3, 0.0)
+        score += np.where(column('quote_count') > 2, 0.2, 0.0)
+        score += np.where(column('comment_pattern_count') > 0, 0.3, 0.0)
+        score += np.where(column('or_and_count') > 0, 0.2, 0.0)
+        score += np.where(column('entropy') > 5.0, 0.1, 0.0)
+        score += np.where(column('encoding_depth') > 1, 0.2, 0.0)
+        
+        # Cap at 1.0
+        return np.minimum(1.0, score)
+    
+    def calculate_rewards_from_features(self, actions, features, feature_names=None, **outcome):
+        """Vectorized calculate_reward_from_features.
+        
+        Args:
+            actions: Array of action indices (positions in rl_agent.ACTIONS)
+            features: (n, len(feature_names)) feature matrix
+            feature_names: Column names (default: FeatureExtractor.FEATURE_NAMES)
+            **outcome: Outcome arrays accepted by calculate_rewards
+            
+        Returns:
+            np.ndarray: float64 estimated rewards
+        """
+        is_attack = self.estimate_attack_probabilities(features, feature_names) > 0.5
+        return self.calculate_rewards(actions, is_attack, **outcome)
+    
     def get_reward_weights(self):
         """Get current reward weights for monitoring/tuning.
         
@@ -12,9 +12,14 @@ Algorithm: Epsilon-greedy contextual bandit
 
 from enum import Enum
 import random
-from collections import defaultdict
+from collections import defaultdict, OrderedDict
 import pickle
 import os
+import threading
+
+import numpy as np
+
+from checkpointer import atomic_write_bytes, delta_log_path, read_delta_log
 
 
 class Action(Enum):
@@ -27,6 +32,11 @@ class Action(Enum):
     BLOCK = 'block'           # Drop request with 403
 
 
+# Fixed action order used when actions are stored as integer indices
+ACTIONS = list(Action)
+ACTION_INDEX = {action: i for i, action in enumerate(ACTIONS)}
+
+
 class PolicyAgent:
     """RL agent that learns optimal actions for each request state.
     
@@ -40,13 +50,17 @@ class PolicyAgent:
     Each request is treated independently (bandit assumption).
     """
     
-    def __init__(self, epsilon=0.1, learning_rate=0.1, default_q_value=0.0):
+    def __init__(self, epsilon=0.1, learning_rate=0.1, default_q_value=0.0,
+                 max_state_ids=262144):
         """Initialize the policy agent.
         
         Args:
             epsilon: Exploration rate (0.0 = pure exploitation, 1.0 = pure exploration)
             learning_rate: How quickly to update Q-values (0.0 = no learning, 1.0 = immediate)
             default_q_value: Initial Q-value for unseen (state, action) pairs
+            max_state_ids: Most state ids (see state_id) kept at once; beyond
+                that the least recently used id is reassigned. Must be at
+                least the capacity of the replay buffer holding the ids
         """
         # Q-table: maps (state, action) -> expected reward
         # Using defaultdict so unseen states get default_q_value
@@ -61,6 +75,19 @@ class PolicyAgent:
         self.total_updates = 0
         self.exploration_count = 0
         self.exploitation_count = 0
+        
+        # Keys changed since the last incremental checkpoint and the
+        # sequence number of the last delta applied (see checkpointer.py)
+        self._dirty = set()
+        self.checkpoint_seq = 0
+        
+        # Compact integer ids for states (used by replay buffers), in least
+        # recently used order, and a lock so batched updates can run on a
+        # background thread
+        self.max_state_ids = max_state_ids
+        self._state_ids = OrderedDict()
+        self._state_keys = []
+        self._lock = threading.RLock()
     
     def _state_to_key(self, state):
         """Convert state (feature dict) to hashable key for Q-table.
@@ -94,9 +121,13 @@ class PolicyAgent:
         
         # Epsilon-greedy: explore with probability epsilon
         if random.random() < self.epsilon:
-            # EXPLORATION: try a random action to discover better policies
+            # EXPLORATION: try a random action to discover better policies.
+            # Counted as exploration only when it changed the choice
             action = random.choice(list(Action))
-            self.exploration_count += 1
+            if action in self._get_best_actions(state_key):
+                self.exploitation_count += 1
+            else:
+                self.exploration_count += 1
         else:
             # EXPLOITATION: choose action with highest Q-value
             action = self._get_best_action(state_key)
@@ -104,6 +135,96 @@ class PolicyAgent:
         
         return action
     
+    def select_action_with_propensity(self, state):
+        """Select action using epsilon-greedy policy and report its probability.
+        
+        The propensity is the probability that the policy picks the returned
+        action in this state, needed for replay and off-policy evaluation.
+        
+        Args:
+            state: dict of features extracted from request
+            
+        Returns:
+            tuple: (Action, propensity)
+        """
+        state_key = self._state_to_key(state)
+        best_actions = self._get_best_actions(state_key)
+        
+        if random.random() < self.epsilon:
+            action = random.choice(ACTIONS)
+        else:
+            action = random.choice(best_actions)
+        
+        propensity = self.epsilon / len(ACTIONS)
+        if action in best_actions:
+            propensity += (1.0 - self.epsilon) / len(best_actions)
+            self.exploitation_count += 1
+        else:
+            self.exploration_count += 1
+        return action, propensity
+    
+    def get_action_probabilities(self, state):
+        """Get the probability of each action under the epsilon-greedy policy.
+        
+        Args:
+            state: dict of features
+            
+        Returns:
+            dict: Maps Action -> probability
+        """
+        best_actions = self._get_best_actions(self._state_to_key(state))
+        greedy_share = (1.0 - self.epsilon) / len(best_actions)
+        return {
+            action: self.epsilon / len(ACTIONS) + (greedy_share if action in best_actions else 0.0)
+            for action in ACTIONS
+        }
+    
+    def get_action_probabilities_batch(self, features, feature_names):
+        """Action probabilities for many states at once (offline evaluation).
+        
+        Same result as get_action_probabilities(dict(zip(feature_names, row)))
+        for every row. The Q-table is read once into arrays and logged rows
+        are matched against its states with np.unique, so the Python work
+        grows with the table size rather than the number of rows.
+        
+        Args:
+            features: (n, n_features) array
+            feature_names: Column names of features
+            
+        Returns:
+            np.ndarray: (n, n_actions) probabilities in ACTIONS order
+        """
+        features = np.round(np.asarray(features, dtype=np.float64), 4)
+        n_actions = len(ACTIONS)
+        names = tuple(sorted(feature_names))
+        columns = [names.index(name) for name in feature_names]
+        
+        # Q-values of the table's states over exactly these features
+        state_rows = {}
+        with self._lock:
+            for (state_key, action), q in list(self.q_table.items()):
+                if len(state_key) == len(names) and tuple(k for k, _ in state_key) == names:
+                    row = state_rows.get(state_key)
+                    if row is None:
+                        row = state_rows[state_key] = [self.default_q_value] * n_actions
+                    row[ACTION_INDEX[action]] = q
+        
+        q_values = np.full((len(features), n_actions), float(self.default_q_value))
+        if state_rows:
+            known = np.array([[value for _, value in key] for key in state_rows],
+                             dtype=np.float64)[:, columns]
+            _, inverse = np.unique(np.vstack((known, features)), axis=0, return_inverse=True)
+            inverse = inverse.reshape(-1)
+            state_of = np.full(inverse.max() + 1, -1)
+            state_of[inverse[:len(known)]] = np.arange(len(known))
+            matched = state_of[inverse[len(known):]]
+            hit = matched >= 0
+            q_values[hit] = np.array(list(state_rows.values()))[matched[hit]]
+        
+        best = q_values == q_values.max(axis=1, keepdims=True)
+        greedy_share = (1.0 - self.epsilon) / best.sum(axis=1, keepdims=True)
+        return self.epsilon / n_actions + best * greedy_share
+    
     def _get_best_action(self, state_key):
         """Get action with highest Q-value for given state.
         
@@ -113,16 +234,25 @@ class PolicyAgent:
         Returns:
             Action: Action with max Q-value
         """
+        # If multiple actions have same Q-value, random.choice breaks tie
+        return random.choice(self._get_best_actions(state_key))
+    
+    def _get_best_actions(self, state_key):
+        """Get all actions sharing the highest Q-value for given state.
+        
+        Args:
+            state_key: Hashable state representation
+            
+        Returns:
+            list[Action]: Actions with max Q-value
+        """
         # Get Q-values for all actions in this state
         q_values = {}
         for action in Action:
             q_values[action] = self.q_table[(state_key, action)]
         
-        # Return action with highest Q-value
-        # If multiple actions have same Q-value, random.choice breaks tie
         max_q = max(q_values.values())
-        best_actions = [a for a, q in q_values.items() if q == max_q]
-        return random.choice(best_actions)
+        return [a for a, q in q_values.items() if q == max_q]
     
     def update(self, state, action, reward):
         """Update Q-value based on observed reward (online learning).
@@ -141,17 +271,108 @@ class PolicyAgent:
         state_key = self._state_to_key(state)
         key = (state_key, action)
         
-        # Current Q-value estimate
-        old_q = self.q_table[key]
+        with self._lock:
+            # Current Q-value estimate
+            old_q = self.q_table[key]
+            
+            # Incremental update: move Q-value toward observed reward
+            # learning_rate controls how much we trust new vs old information
+            new_q = old_q + self.learning_rate * (reward - old_q)
+            
+            # Update Q-table
+            self.q_table[key] = new_q
+            self._dirty.add(key)
+            
+            self.total_updates += 1
+    
+    def state_id(self, state):
+        """Get a compact integer id for a state (assigned on first use).
+        
+        Ids let replay buffers store states in NumPy arrays. They are only
+        valid within this process and are not saved in checkpoints. At most
+        max_state_ids are kept: a new state then takes over the id of the
+        least recently used one. That state was last seen at least
+        max_state_ids calls ago, so with one buffer row per call its rows
+        have already been overwritten in a buffer of up to that capacity.
+        
+        Args:
+            state: dict of features
+            
+        Returns:
+            int: State id
+        """
+        state_key = self._state_to_key(state)
+        state_ids = self._state_ids
+        sid = state_ids.get(state_key)
+        if sid is not None:
+            state_ids.move_to_end(state_key)
+            return sid
+        with self._lock:
+            if len(self._state_keys) < self.max_state_ids:
+                sid = len(self._state_keys)
+                self._state_keys.append(state_key)
+            else:
+                _, sid = state_ids.popitem(last=False)
+                self._state_keys[sid] = state_key
+            state_ids[state_key] = sid
+        return sid
+    
+    def update_batch(self, state_ids, action_indices, rewards):
+        """Apply many updates at once.
         
-        # Incremental update: move Q-value toward observed reward
-        # learning_rate controls how much we trust new vs old information
-        new_q = old_q + self.learning_rate * (reward - old_q)
+        Equivalent to calling update() for each row in order. Rows that hit
+        the same (state, action) pair are folded with the closed form of the
+        incremental rule, so the Q-table is touched once per distinct pair:
+        Q_k = (1-α)^k * Q_0 + Σ_j α(1-α)^(k-1-j) * r_j
         
-        # Update Q-table
-        self.q_table[key] = new_q
+        Args:
+            state_ids: Array of ids from state_id()
+            action_indices: Array of indices into ACTIONS
+            rewards: Array of observed rewards
+        """
+        state_ids = np.asarray(state_ids, dtype=np.int64)
+        if len(state_ids) == 0:
+            return
+        n_actions = len(ACTIONS)
+        keys = state_ids * n_actions + np.asarray(action_indices, dtype=np.int64)
+        
+        # Group rows by key, keeping arrival order inside each group
+        order = np.argsort(keys, kind='stable')
+        sorted_keys = keys[order]
+        sorted_rewards = np.asarray(rewards, dtype=np.float64)[order]
+        starts = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]])
+        counts = np.diff(np.r_[starts, len(sorted_keys)])
+        
+        # Number of later updates in the same group decides each row's weight
+        later = np.repeat(starts + counts - 1, counts) - np.arange(len(sorted_keys))
+        decay = 1.0 - self.learning_rate
+        weighted = sorted_rewards * (self.learning_rate * decay ** later)
+        contributions = np.add.reduceat(weighted, starts)
+        keep = decay ** counts
         
-        self.total_updates += 1
+        with self._lock:
+            q_table = self.q_table
+            state_keys = self._state_keys
+            for key, kept, added in zip(sorted_keys[starts].tolist(), keep.tolist(),
+                                        contributions.tolist()):
+                table_key = (state_keys[key // n_actions], ACTIONS[key % n_actions])
+                q_table[table_key] = kept * q_table[table_key] + added
+                self._dirty.add(table_key)
+            self.total_updates += len(state_ids)
+    
+    def replay(self, buffer, batch_size=1024):
+        """Re-apply a random sample of past experience from a replay buffer.
+        
+        Args:
+            buffer: ReplayBuffer filled with this agent's state ids
+            batch_size: Number of transitions to sample
+            
+        Returns:
+            int: Number of transitions replayed
+        """
+        batch = buffer.sample(batch_size)
+        self.update_batch(batch['state_id'], batch['action'], batch['reward'])
+        return len(batch)
     
     def get_q_values(self, state):
         """Get Q-values for all actions in given state (for debugging/monitoring).
@@ -191,44 +412,109 @@ class PolicyAgent:
             'learning_rate': self.learning_rate
         }
     
-    def save_checkpoint(self, filepath='policy_checkpoint.pkl'):
-        """Save Q-table and hyperparameters to disk.
+    def get_full_checkpoint(self):
+        """Build a checkpoint dict with the whole Q-table.
         
-        Args:
-            filepath: Path to save checkpoint
+        Returns:
+            dict: Q-table, hyperparameters and statistics
         """
         checkpoint = {
             'q_table': dict(self.q_table),  # Convert defaultdict to dict
             'epsilon': self.epsilon,
             'learning_rate': self.learning_rate,
             'default_q_value': self.default_q_value,
+            'delta_seq': self.checkpoint_seq
+        }
+        checkpoint.update(self.get_checkpoint_stats())
+        return checkpoint
+    
+    def get_checkpoint_stats(self):
+        """Get the counters stored alongside checkpoints.
+        
+        Returns:
+            dict: Update and decision counters
+        """
+        return {
             'total_updates': self.total_updates,
             'exploration_count': self.exploration_count,
             'exploitation_count': self.exploitation_count
         }
+    
+    def pop_dirty_entries(self):
+        """Return Q-table entries changed since the previous call.
+        
+        Used by BackgroundCheckpointer to write incremental deltas. The
+        swap and the copy hold the lock that update() and update_batch()
+        take, so no key is added to a set that has already been handed out.
         
-        with open(filepath, 'wb') as f:
-            pickle.dump(checkpoint, f)
+        Returns:
+            dict: Maps (state_key, action) -> Q-value
+        """
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+            q_table = self.q_table
+            return {key: q_table[key] for key in dirty if key in q_table}
+    
+    def save_checkpoint(self, filepath='policy_checkpoint.pkl'):
+        """Save Q-table and hyperparameters to disk.
+        
+        The file is replaced atomically, and any delta log next to it is
+        removed because the full table supersedes it.
+        
+        Args:
+            filepath: Path to save checkpoint
+        """
+        checkpoint = self.get_full_checkpoint()
+        atomic_write_bytes(
+            filepath, pickle.dumps(checkpoint, protocol=pickle.HIGHEST_PROTOCOL)
+        )
+        
+        delta_path = delta_log_path(filepath)
+        if os.path.exists(delta_path):
+            os.remove(delta_path)
     
     def load_checkpoint(self, filepath='policy_checkpoint.pkl'):
         """Load Q-table and hyperparameters from disk.
         
+        Replays the base checkpoint and then every delta in
+        '<filepath>.delta' that is newer than the base.
+        
         Args:
             filepath: Path to checkpoint file
             
         Returns:
             bool: True if loaded successfully, False if file not found
         """
-        if not os.path.exists(filepath):
+        deltas = read_delta_log(delta_log_path(filepath))
+        if not os.path.exists(filepath) and not deltas:
             return False
         
-        with open(filepath, 'rb') as f:
-            checkpoint = pickle.load(f)
+        if os.path.exists(filepath):
+            with open(filepath, 'rb') as f:
+                checkpoint = pickle.load(f)
+        else:
+            # Base was never published, start from current hyperparameters
+            checkpoint = self.get_full_checkpoint()
+            checkpoint['q_table'] = {}
+            checkpoint['delta_seq'] = 0
+        
+        base_seq = checkpoint.get('delta_seq', 0)
+        q_table = checkpoint['q_table']
+        stats = None
+        seq = base_seq
+        for record in deltas:
+            if record['seq'] <= base_seq:
+                continue
+            q_table.update(record['entries'])
+            stats = record['stats']
+            seq = record['seq']
+        if stats is not None:
+            checkpoint.update(stats)
         
         # Restore Q-table as defaultdict
         self.q_table = defaultdict(
             lambda: checkpoint['default_q_value'],
-            checkpoint['q_table']
+            q_table
         )
         
         # Restore hyperparameters and statistics
@@ -238,6 +524,8 @@ class PolicyAgent:
         self.total_updates = checkpoint['total_updates']
         self.exploration_count = checkpoint['exploration_count']
         self.exploitation_count = checkpoint['exploitation_count']
+        self.checkpoint_seq = seq
+        self._dirty = set()
         
         return True
     
@@ -10,50 +10,90 @@ Purpose: Ensure the RL agent never learns dangerous policies that could:
 '''
 
 from rl_agent import Action
-import re
+from ip_trie import load_ip_rules, ALLOW
+from endpoint_rules import load_endpoint_rules, ACTION_SEVERITY
+from collections import OrderedDict
+import os
+import threading
 
 
 class SafetyLayer:
     """Applies hard constraints to prevent dangerous RL decisions.
     
     Rules enforced:
-    1. Never auto-BLOCK admin endpoints
+    1. Endpoint rules cap the action (admin endpoints are never auto-BLOCKed)
     2. Internal IPs use CHALLENGE instead of BLOCK
     3. Known safe patterns always ALLOW
-    4. Critical endpoints have restricted actions
+    4. Endpoint rules can force an action (health checks always ALLOW)
     """
     
-    # Endpoints that should never be blocked
-    PROTECTED_ENDPOINTS = [
-        r'/admin.*',
-        r'/api/auth.*',
-        r'/health.*',
-        r'/metrics.*'
-    ]
-    
-    # Internal IP ranges (private networks)
-    INTERNAL_IP_PATTERNS = [
-        r'^127\.',           # localhost
-        r'^192\.168\.',      # private class C
-        r'^10\.',            # private class A
-        r'^172\.(1[6-9]|2[0-9]|3[0-1])\.',  # private class B
-        r'^::1$',            # IPv6 localhost
-        r'^fe80:',           # IPv6 link-local
-    ]
-    
-    def __init__(self):
-        """Initialize the safety layer."""
-        # Compile regex patterns for efficiency
-        self.protected_endpoint_patterns = [
-            re.compile(pattern) for pattern in self.PROTECTED_ENDPOINTS
-        ]
-        self.internal_ip_patterns = [
-            re.compile(pattern) for pattern in self.INTERNAL_IP_PATTERNS
-        ]
+    def __init__(self, ip_rules_file=None, endpoint_rules_file=None, memo_size=4096):
+        """Initialize the safety layer.
+        
+        Args:
+            ip_rules_file: Optional JSON file of allow/deny CIDRs (see
+                ip_trie.py). Internal networks (private, loopback,
+                link-local) are allowed by default.
+            endpoint_rules_file: Optional JSON file of per-route rules (see
+                endpoint_rules.py), added to the built-in protected endpoints
+            memo_size: Entries in the apply_constraints memo (0 disables it)
+        """
+        self.ip_rules_file = ip_rules_file
+        self.endpoint_rules_file = endpoint_rules_file
+        self.memo_size = memo_size
+        
+        # (ip rules, endpoint rules, memo) snapshot, replaced as a whole on
+        # reload so a decision never mixes old and new rules
+        self._mtimes = self._rules_mtimes()
+        self._rules = self._load_rules()
+        self._memo_lock = threading.Lock()
+        
+        # Background reload watcher (see start_watcher)
+        self._reload_requested = threading.Event()
+        self._stopping = threading.Event()
+        self._watcher = None
+        
+        # Statistics for monitoring
+        self.memo_hits = 0
+        self.memo_misses = 0
+        self.reloads = 0
+        self.last_reload_error = None
+    
+    @property
+    def ip_rules(self):
+        """CIDRTrie of allow/deny ranges currently in effect."""
+        return self._rules[0]
+    
+    @property
+    def endpoint_rules(self):
+        """EndpointRules currently in effect."""
+        return self._rules[1]
+    
+    def _load_rules(self):
+        # Longest-prefix match over allow/deny CIDR ranges, per-route
+        # max_action / force rules compiled into a path trie, and a fresh memo
+        return (
+            load_ip_rules(self.ip_rules_file),
+            load_endpoint_rules(self.endpoint_rules_file),
+            OrderedDict()
+        )
+    
+    def _rules_mtimes(self):
+        mtimes = []
+        for filepath in (self.ip_rules_file, self.endpoint_rules_file):
+            try:
+                mtimes.append(os.stat(filepath).st_mtime_ns if filepath else None)
+            except OSError:
+                mtimes.append(None)
+        return tuple(mtimes)
     
     def apply_constraints(self, action, endpoint=None, origin=None, context=None):
         """Apply safety constraints to an RL agent's chosen action.
         
+        Results are memoized per (action, route, origin network), where the
+        origin is truncated to the longest CIDR prefix in the IP rules so
+        that every address sharing a key gets the same classification.
+        
         Args:
             action: Action chosen by RL agent
             endpoint: Request endpoint/path (e.g., '/api/user')
@@ -63,15 +103,47 @@ class SafetyLayer:
         Returns:
             Action: Potentially modified action that satisfies constraints
         """
-        original_action = action
+        rules = self._rules
+        if context or not self.memo_size:
+            # Context-dependent decisions are not memoized
+            return self._apply_rules(rules, action, endpoint, origin, context)
         
-        # Rule 1: Never BLOCK protected endpoints
-        if endpoint and self._is_protected_endpoint(endpoint):
-            if action == Action.BLOCK:
-                action = Action.CHALLENGE  # Downgrade to CHALLENGE
+        ip_rules, _, memo = rules
+        key = (
+            action,
+            endpoint.split('?', 1)[0] if endpoint else None,
+            # Exact force rules do not apply with a query string
+            endpoint is not None and '?' in endpoint,
+            ip_rules.prefix_key(origin) if origin else None
+        )
+        with self._memo_lock:
+            result = memo.get(key)
+            if result is not None:
+                memo.move_to_end(key)
+                self.memo_hits += 1
+                return result
+        
+        result = self._apply_rules(rules, action, endpoint, origin, None)
+        with self._memo_lock:
+            memo[key] = result
+            if len(memo) > self.memo_size:
+                memo.popitem(last=False)
+            self.memo_misses += 1
+        return result
+    
+    def _apply_rules(self, rules, action, endpoint, origin, context):
+        """Evaluate the constraints against one rules snapshot (no memo)."""
+        ip_rules, endpoint_rules, _ = rules
+        max_action, force_action = (
+            endpoint_rules.resolve(endpoint) if endpoint else (None, None)
+        )
+        
+        # Rule 1: Cap the action on restricted endpoints
+        if max_action is not None and ACTION_SEVERITY[action] > ACTION_SEVERITY[max_action]:
+            action = max_action  # e.g. BLOCK → CHALLENGE on /admin
         
         # Rule 2: Internal IPs should use CHALLENGE instead of BLOCK
-        if origin and self._is_internal_ip(origin):
+        if origin and ip_rules.lookup(origin) == ALLOW:
             if action == Action.BLOCK:
                 action = Action.CHALLENGE  # Softer action for internal users
         
@@ -79,14 +151,14 @@ class SafetyLayer:
         if context and context.get('is_known_safe', False):
             action = Action.ALLOW
         
-        # Rule 4: Health check endpoints should always ALLOW
-        if endpoint and (endpoint == '/health' or endpoint == '/ping'):
-            action = Action.ALLOW
+        # Rule 4: Forced actions (e.g. health checks always ALLOW)
+        if force_action is not None:
+            action = force_action
         
         return action
     
     def _is_protected_endpoint(self, endpoint):
-        """Check if endpoint matches protected patterns.
+        """Check if endpoint rules forbid BLOCK on a path.
         
         Args:
             endpoint: Request path
@@ -94,24 +166,22 @@ class SafetyLayer:
         Returns:
             bool: True if endpoint is protected
         """
-        for pattern in self.protected_endpoint_patterns:
-            if pattern.match(endpoint):
-                return True
-        return False
+        max_action, _ = self.endpoint_rules.resolve(endpoint)
+        return max_action is not None and max_action != Action.BLOCK
     
     def _is_internal_ip(self, ip):
         """Check if IP is from internal network.
         
+        The most specific allow/deny range containing the address decides,
+        so denied sub-ranges of internal networks are not internal.
+        
         Args:
             ip: IP address string
             
         Returns:
             bool: True if IP is internal
         """
-        for pattern in self.internal_ip_patterns:
-            if pattern.match(ip):
-                return True
-        return False
+        return self.ip_rules.lookup(ip) == ALLOW
     
     def get_allowed_actions(self, endpoint=None, origin=None):
         """Get list of allowed actions for given context.
@@ -127,10 +197,16 @@ class SafetyLayer:
         """
         allowed = list(Action)  # Start with all actions
         
-        # Remove BLOCK for protected endpoints
-        if endpoint and self._is_protected_endpoint(endpoint):
-            if Action.BLOCK in allowed:
-                allowed.remove(Action.BLOCK)
+        if endpoint:
+            max_action, force_action = self.endpoint_rules.resolve(endpoint)
+            if force_action is not None:
+                return [force_action]
+            # Remove actions more severe than the endpoint's cap
+            if max_action is not None:
+                allowed = [
+                    a for a in allowed
+                    if ACTION_SEVERITY[a] <= ACTION_SEVERITY[max_action]
+                ]
         
         # Remove BLOCK for internal IPs
         if origin and self._is_internal_ip(origin):
@@ -138,3 +214,97 @@ class SafetyLayer:
                 allowed.remove(Action.BLOCK)
         
         return allowed
+    
+    def reload(self):
+        """Re-read the rules files and swap them in atomically.
+        
+        The new rules are built aside and replace the old ones in a single
+        assignment, so requests are never paused. The memo is replaced too.
+        If a file is invalid, the previous rules stay in effect.
+        
+        Returns:
+            bool: True if the new rules were loaded
+        """
+        mtimes = self._rules_mtimes()
+        try:
+            rules = self._load_rules()
+        except (OSError, ValueError) as e:
+            # Remember the mtimes so a broken file is not re-parsed until it changes
+            self._mtimes = mtimes
+            self.last_reload_error = str(e)
+            return False
+        self._rules = rules
+        self._mtimes = mtimes
+        self.reloads += 1
+        self.last_reload_error = None
+        return True
+    
+    def check_reload(self):
+        """Reload if a rules file was modified since the last load.
+        
+        Returns:
+            bool: True if new rules were loaded
+        """
+        if self._rules_mtimes() == self._mtimes:
+            return False
+        return self.reload()
+    
+    def request_reload(self):
+        """Ask the watcher thread to reload now (safe to call from a signal handler)."""
+        self._reload_requested.set()
+    
+    def start_watcher(self, interval_s=2.0):
+        """Start a background thread that reloads on request or mtime change.
+        
+        Args:
+            interval_s: Seconds between mtime checks (None or 0: only
+                reload when request_reload() is called, e.g. on SIGHUP)
+        """
+        self._stopping.clear()
+        self._watcher = threading.Thread(
+            target=self._watch, args=(interval_s or None,),
+            name='safety-rules-watcher', daemon=True
+        )
+        self._watcher.start()
+    
+    def stop_watcher(self):
+        """Stop the watcher thread."""
+        self._stopping.set()
+        self._reload_requested.set()
+        if self._watcher is not None:
+            self._watcher.join()
+            self._watcher = None
+    
+    def _watch(self, interval_s):
+        """Background loop: reload on request or when a rules file changes."""
+        while not self._stopping.is_set():
+            requested = self._reload_requested.wait(interval_s)
+            self._reload_requested.clear()
+            if self._stopping.is_set():
+                break
+            if not requested and self._rules_mtimes() == self._mtimes:
+                continue
+            if self.reload():
+                print(f"[INFO] Safety rules reloaded ({len(self.ip_rules)} IP ranges, "
+                      f"{len(self.endpoint_rules)} endpoint rules)")
+            else:
+                print(f"[WARN] Safety rules reload failed, keeping previous rules: "
+                      f"{self.last_reload_error}")
+    
+    def get_statistics(self):
+        """Get memo and reload statistics for monitoring.
+        
+        Returns:
+            dict: Memo hit rate, rule counts and reload status
+        """
+        lookups = self.memo_hits + self.memo_misses
+        return {
+            'memo_hits': self.memo_hits,
+            'memo_misses': self.memo_misses,
+            'memo_hit_rate': self.memo_hits / lookups if lookups > 0 else 0.0,
+            'memo_entries': len(self._rules[2]),
+            'ip_ranges': len(self.ip_rules),
+            'endpoint_rules': len(self.endpoint_rules),
+            'reloads': self.reloads,
+            'last_reload_error': self.last_reload_error
+        }
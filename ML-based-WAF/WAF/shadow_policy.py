@@ -0,0 +1,189 @@
+'''Shadow-policy evaluation on live traffic.
+
+Several candidate agents (different epsilon values, feature discretizers or
+reward weights) can watch the same traffic while only the primary agent
+enforces. The request pipeline extracts features and builds the outcome
+once; ShadowEvaluator fans them out to every shadow policy, which:
+
+1. selects its own action from the shared features
+2. scores that action with its own RewardCalculator (hypothetical reward)
+3. optionally learns from it
+
+Per-policy results go into preallocated NumPy arrays (one row per policy),
+so a shadow costs one select_action, one calculate_reward and one update
+per request, and no per-request records are kept.
+'''
+
+import time
+
+import numpy as np
+
+from rl_agent import PolicyAgent, ACTIONS, ACTION_INDEX
+
+
+class ShadowEvaluator:
+    """Runs shadow policies on the features of enforced requests."""
+
+    def __init__(self, reward_calculator, safety_layer=None, max_policies=16):
+        """Initialize the shadow evaluator.
+
+        Args:
+            reward_calculator: Default RewardCalculator for shadow policies
+            safety_layer: Optional SafetyLayer applied to shadow actions, so
+                shadows are compared on what they would actually execute
+            max_policies: Capacity of the per-policy stats arrays
+        """
+        self.reward_calculator = reward_calculator
+        self.safety_layer = safety_layer
+        self.max_policies = max_policies
+
+        # name, agent, reward calculator, feature transform, learn flag
+        self._policies = []
+
+        n_actions = len(ACTIONS)
+        self.decisions = np.zeros(max_policies, dtype=np.int64)
+        self.action_counts = np.zeros((max_policies, n_actions), dtype=np.int64)
+        self.reward_sum = np.zeros(max_policies, dtype=np.float64)
+        self.reward_sq_sum = np.zeros(max_policies, dtype=np.float64)
+        self.agreements = np.zeros(max_policies, dtype=np.int64)
+        self.latency_ns_sum = np.zeros(max_policies, dtype=np.int64)
+        self.latency_ns_max = np.zeros(max_policies, dtype=np.int64)
+        self.errors = np.zeros(max_policies, dtype=np.int64)
+
+    def __len__(self):
+        return len(self._policies)
+
+    def add_policy(self, name, agent, reward_calculator=None, transform=None, learn=True):
+        """Register a shadow policy.
+
+        Args:
+            name: Label used in reports
+            agent: Agent with select_action(state) (and update() if learning)
+            reward_calculator: RewardCalculator with this policy's reward
+                weights (default: the evaluator's)
+            transform: Optional function mapping the shared feature dict to
+                this policy's state (e.g. a coarser discretization)
+            learn: Update the agent with its hypothetical reward
+
+        Returns:
+            int: Index of the policy in the stats arrays
+        """
+        if len(self._policies) >= self.max_policies:
+            raise ValueError(f"At most {self.max_policies} shadow policies are supported")
+        if any(existing[0] == name for existing in self._policies):
+            raise ValueError(f"Duplicate shadow policy name: {name}")
+
+        self._policies.append((
+            name,
+            agent,
+            reward_calculator or self.reward_calculator,
+            transform,
+            learn and hasattr(agent, 'update')
+        ))
+        return len(self._policies) - 1
+
+    def evaluate(self, features, outcome, primary_action, endpoint=None, origin=None):
+        """Run every shadow policy on one request.
+
+        Errors in a shadow policy are counted and never reach the caller.
+
+        Args:
+            features: Feature dict shared with the enforcing agent
+            outcome: Outcome dict shared with the enforcing agent
+            primary_action: Action of the enforcing agent after the safety
+                layer (used for the agreement rate)
+            endpoint: Request path (for the safety layer)
+            origin: Client address (for the safety layer)
+        """
+        primary_index = ACTION_INDEX[primary_action]
+        for i, (name, agent, calculator, transform, learn) in enumerate(self._policies):
+            start = time.perf_counter_ns()
+            try:
+                state = transform(features) if transform is not None else features
+                action = agent.select_action(state)
+                if self.safety_layer is not None:
+                    action = self.safety_layer.apply_constraints(
+                        action, endpoint=endpoint, origin=origin)
+                reward = calculator.calculate_reward(action, outcome)
+                if learn:
+                    agent.update(state, action, reward)
+            except Exception:
+                self.errors[i] += 1
+                continue
+            elapsed = time.perf_counter_ns() - start
+
+            index = ACTION_INDEX[action]
+            self.decisions[i] += 1
+            self.action_counts[i, index] += 1
+            self.reward_sum[i] += reward
+            self.reward_sq_sum[i] += reward * reward
+            self.agreements[i] += index == primary_index
+            self.latency_ns_sum[i] += elapsed
+            if elapsed > self.latency_ns_max[i]:
+                self.latency_ns_max[i] = elapsed
+
+    def get_statistics(self):
+        """Get per-policy statistics.
+
+        Returns:
+            dict: Maps policy name -> stats dict
+        """
+        results = {}
+        for i, (name, *_) in enumerate(self._policies):
+            n = int(self.decisions[i])
+            mean = self.reward_sum[i] / n if n else 0.0
+            variance = self.reward_sq_sum[i] / n - mean * mean if n else 0.0
+            results[name] = {
+                'decisions': n,
+                'mean_reward': float(mean),
+                'reward_std': float(np.sqrt(max(variance, 0.0))),
+                'total_reward': float(self.reward_sum[i]),
+                'agreement_rate': float(self.agreements[i] / n) if n else 0.0,
+                'action_counts': {
+                    action.value: int(count)
+                    for action, count in zip(ACTIONS, self.action_counts[i])
+                },
+                'mean_latency_us': float(self.latency_ns_sum[i] / n / 1000) if n else 0.0,
+                'max_latency_us': float(self.latency_ns_max[i] / 1000),
+                'errors': int(self.errors[i])
+            }
+        return results
+
+    def print_report(self):
+        """Print a one-line summary per shadow policy."""
+        for name, stats in self.get_statistics().items():
+            print(f"  {name}: {stats['decisions']} decisions | "
+                  f"mean reward {stats['mean_reward']:+.3f} | "
+                  f"agreement {stats['agreement_rate']:.1%} | "
+                  f"latency {stats['mean_latency_us']:.1f}µs avg, "
+                  f"{stats['max_latency_us']:.1f}µs max")
+
+
+def create_shadow_agent(spec, learning_rate=0.05):
+    """Create a shadow agent from a command-line spec.
+
+    Specs:
+        tabular:EPSILON     fresh PolicyAgent with this exploration rate
+        linucb:ALPHA        fresh LinUCB agent
+        thompson:ALPHA      fresh Thompson sampling agent
+        frozen:PATH         exported policy (decides only, never learns)
+
+    Args:
+        spec: Spec string
+        learning_rate: Learning rate for tabular shadows
+
+    Returns:
+        tuple: (name, agent)
+    """
+    kind, _, value = spec.partition(':')
+    if kind == 'tabular':
+        epsilon = float(value) if value else 0.1
+        return f"tabular(eps={epsilon})", PolicyAgent(epsilon=epsilon, learning_rate=learning_rate)
+    if kind in ('linucb', 'thompson'):
+        from linear_agent import LinearBanditAgent
+        alpha = float(value) if value else 1.0
+        return f"{kind}(alpha={alpha})", LinearBanditAgent(algorithm=kind, alpha=alpha)
+    if kind == 'frozen' and value:
+        from frozen_policy import FrozenPolicy
+        return f"frozen({value})", FrozenPolicy(value)
+    raise ValueError(f"Invalid shadow policy spec: {spec!r}")
@@ -0,0 +1,342 @@
+'''Sharded multi-process policy learning for the RL-based WAF.
+
+When request analysis runs on several worker processes, each worker owns a
+ShardedPolicyAgent and learns on its own traffic. A ShardCoordinator
+periodically collects the entries every shard changed, merges them with
+visit-count-weighted averaging and broadcasts the merged values back, so the
+shards converge to a shared policy without locking a common Q-table.
+
+Merge rule for a key k updated by shards i with local estimate q_i after
+n_i visits since the last sync:
+    Q(k) = sum(n_i * q_i) / sum(n_i)
+
+Communication uses multiprocessing queues, so workers can be started with
+either fork or spawn.
+'''
+
+import multiprocessing
+import queue
+import time
+
+from rl_agent import PolicyAgent
+
+
+class ShardChannel:
+    """Queues connecting one shard to the coordinator (picklable)."""
+
+    def __init__(self, shard_id, export_queue, policy_queue):
+        """Initialize the channel.
+
+        Args:
+            shard_id: Identifier of the shard using this channel
+            export_queue: Shared queue shard -> coordinator
+            policy_queue: Per-shard queue coordinator -> shard
+        """
+        self.shard_id = shard_id
+        self.export_queue = export_queue
+        self.policy_queue = policy_queue
+
+
+class ShardedPolicyAgent(PolicyAgent):
+    """PolicyAgent that learns locally and syncs with a ShardCoordinator.
+
+    Between syncs it behaves exactly like PolicyAgent. sync() sends the
+    entries changed since the previous sync together with their visit
+    counts and applies any merged policy the coordinator has published.
+    """
+
+    def __init__(self, shard_id=0, channel=None, **kwargs):
+        """Initialize the shard agent.
+
+        Args:
+            shard_id: Identifier of this shard
+            channel: ShardChannel (optional, can be attached later)
+            **kwargs: Passed to PolicyAgent
+        """
+        super().__init__(**kwargs)
+        self.shard_id = shard_id
+        self.channel = channel
+
+        # Visits per (state_key, action) since the last export
+        self._shard_visits = {}
+
+        # Version of the last merged policy applied
+        self.policy_version = 0
+        self.last_sync_time = time.time()
+
+    def attach(self, channel):
+        """Attach the channel returned by ShardCoordinator.create_channel.
+
+        Args:
+            channel: ShardChannel for this shard
+        """
+        self.channel = channel
+        self.shard_id = channel.shard_id
+
+    def update(self, state, action, reward):
+        """Update Q-value locally and count the visit for the next merge.
+
+        Args:
+            state: dict of features from the request
+            action: Action that was taken
+            reward: Observed reward
+        """
+        super().update(state, action, reward)
+        key = (self._state_to_key(state), action)
+        self._shard_visits[key] = self._shard_visits.get(key, 0) + 1
+
+    def export_shard(self):
+        """Collect entries changed since the previous export.
+
+        Returns:
+            dict: Shard export with 'entries' mapping key -> (q, visits)
+        """
+        visits, self._shard_visits = self._shard_visits, {}
+        q_table = self.q_table
+        return {
+            'shard_id': self.shard_id,
+            'policy_version': self.policy_version,
+            'exported_at': time.time(),
+            'entries': {key: (q_table[key], n) for key, n in visits.items()}
+        }
+
+    def apply_merged_policy(self, merged):
+        """Apply a merged policy published by the coordinator.
+
+        Keys updated locally since the last export keep their local value;
+        they are merged in the next round.
+
+        Args:
+            merged: dict with 'version' and 'entries' mapping key -> q
+        """
+        if merged['version'] <= self.policy_version:
+            return
+
+        pending = self._shard_visits
+        q_table = self.q_table
+        for key, q in merged['entries'].items():
+            if key not in pending:
+                q_table[key] = q
+        self.policy_version = merged['version']
+
+    def sync(self):
+        """Send local changes and apply merged policies (non-blocking)."""
+        if self.channel is None:
+            return
+
+        self.channel.export_queue.put(self.export_shard())
+        while True:
+            try:
+                merged = self.channel.policy_queue.get_nowait()
+            except queue.Empty:
+                break
+            self.apply_merged_policy(merged)
+        self.last_sync_time = time.time()
+
+    def wait_for_policy(self, version, timeout=10.0):
+        """Block until a merged policy with at least this version arrives.
+
+        Args:
+            version: Minimum policy version to wait for
+            timeout: Maximum time to wait in seconds
+
+        Returns:
+            bool: True if the version was reached
+        """
+        deadline = time.time() + timeout
+        while self.policy_version < version:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return False
+            try:
+                merged = self.channel.policy_queue.get(timeout=remaining)
+            except queue.Empty:
+                return False
+            self.apply_merged_policy(merged)
+        return True
+
+    def get_statistics(self):
+        """Get agent statistics including shard sync state.
+
+        Returns:
+            dict: PolicyAgent statistics plus shard information
+        """
+        stats = super().get_statistics()
+        stats['shard_id'] = self.shard_id
+        stats['policy_version'] = self.policy_version
+        stats['pending_merge_entries'] = len(self._shard_visits)
+        return stats
+
+
+class ShardCoordinator:
+    """Merges shard exports and broadcasts the merged policy.
+
+    Keeps the global table as key -> [q, total_visits]. Only keys that
+    changed in a round are broadcast.
+    """
+
+    def __init__(self, context=None):
+        """Initialize the coordinator.
+
+        Args:
+            context: multiprocessing context (default: multiprocessing module)
+        """
+        self._mp = context or multiprocessing
+        self.export_queue = self._mp.Queue()
+        self.policy_queues = {}
+
+        # Global merged table: key -> [q, visits]
+        self.table = {}
+        self.version = 0
+
+        # Metrics
+        self.merge_count = 0
+        self.last_merge_ms = 0.0
+        self.total_merge_ms = 0.0
+        self.last_merged_entries = 0
+        self.last_export_age_s = 0.0
+        self.shard_last_seen = {}
+        self.shard_versions = {}
+
+    def create_channel(self, shard_id):
+        """Create the channel a worker passes to ShardedPolicyAgent.attach.
+
+        Args:
+            shard_id: Identifier of the new shard
+
+        Returns:
+            ShardChannel: Queues for the shard
+        """
+        policy_queue = self._mp.Queue()
+        self.policy_queues[shard_id] = policy_queue
+        return ShardChannel(shard_id, self.export_queue, policy_queue)
+
+    def merge(self, exports):
+        """Merge shard exports into the global table.
+
+        Each key's global q is the visit-count weighted mean of this round's
+        exports only; accumulated visits are kept for metrics.
+
+        Args:
+            exports: list of dicts produced by ShardedPolicyAgent.export_shard
+
+        Returns:
+            dict: Merged policy with 'version' and changed 'entries'
+        """
+        start = time.perf_counter()
+
+        # Accumulate sum(n_i * q_i) and sum(n_i) per key for this round
+        sums = {}
+        now = time.time()
+        oldest = now
+        for export in exports:
+            self.shard_last_seen[export['shard_id']] = export['exported_at']
+            self.shard_versions[export['shard_id']] = export['policy_version']
+            oldest = min(oldest, export['exported_at'])
+            for key, (q, n) in export['entries'].items():
+                acc = sums.get(key)
+                if acc is None:
+                    sums[key] = [q * n, n]
+                else:
+                    acc[0] += q * n
+                    acc[1] += n
+
+        entries = {}
+        table = self.table
+        for key, (weighted_q, n) in sums.items():
+            q = weighted_q / n
+            entry = table.get(key)
+            if entry is None:
+                table[key] = [q, n]
+            else:
+                # Each shard's q started from the previously merged value, so
+                # earlier rounds are already part of this round's estimates
+                entry[0] = q
+                entry[1] += n
+            entries[key] = q
+
+        self.version += 1
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        self.merge_count += 1
+        self.last_merge_ms = elapsed_ms
+        self.total_merge_ms += elapsed_ms
+        self.last_merged_entries = len(entries)
+        self.last_export_age_s = now - oldest
+
+        return {'version': self.version, 'entries': entries}
+
+    def merge_pending(self, timeout=0.0, min_exports=1):
+        """Drain queued exports, merge them and broadcast the result.
+
+        Args:
+            timeout: Time to wait for each of the first min_exports exports
+            min_exports: Number of exports to wait for before merging
+
+        Returns:
+            int: Number of exports merged
+        """
+        exports = []
+        try:
+            while len(exports) < min_exports:
+                exports.append(self.export_queue.get(timeout=timeout) if timeout
+                               else self.export_queue.get_nowait())
+            while True:
+                exports.append(self.export_queue.get_nowait())
+        except queue.Empty:
+            pass
+
+        if not exports:
+            return 0
+
+        merged = self.merge(exports)
+        for policy_queue in self.policy_queues.values():
+            policy_queue.put(merged)
+        return len(exports)
+
+    def run(self, stop_event, interval_s=1.0):
+        """Merge loop for a coordinator thread or process.
+
+        Args:
+            stop_event: threading/multiprocessing Event that ends the loop
+            interval_s: Time between merges
+        """
+        while not stop_event.is_set():
+            self.merge_pending(timeout=interval_s)
+
+    def get_full_policy(self):
+        """Get the merged Q-values for every key seen so far.
+
+        Returns:
+            dict: Maps (state_key, action) -> q
+        """
+        return {key: entry[0] for key, entry in self.table.items()}
+
+    def get_metrics(self):
+        """Get merge cost and staleness metrics.
+
+        Staleness is reported as the seconds since each shard last exported
+        and the number of versions its applied policy lags behind.
+
+        Returns:
+            dict: Coordinator metrics
+        """
+        now = time.time()
+        return {
+            'version': self.version,
+            'merge_count': self.merge_count,
+            'last_merge_ms': self.last_merge_ms,
+            'avg_merge_ms': (
+                self.total_merge_ms / self.merge_count
+                if self.merge_count > 0 else 0.0
+            ),
+            'last_merged_entries': self.last_merged_entries,
+            'global_table_size': len(self.table),
+            'last_export_age_s': self.last_export_age_s,
+            'shard_staleness_s': {
+                shard_id: now - seen for shard_id, seen in self.shard_last_seen.items()
+            },
+            'shard_version_lag': {
+                shard_id: self.version - version
+                for shard_id, version in self.shard_versions.items()
+            }
+        }
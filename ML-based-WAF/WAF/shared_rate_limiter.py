@@ -0,0 +1,246 @@
+'''Shared-memory sliding-window rate limiter for multi-process WAF workers.
+
+Per-process counters disagree once request analysis is spread over several
+worker processes. SharedRateLimiter keeps per-origin request counts in a
+multiprocessing.shared_memory segment that every worker maps, so all of them
+see the same rate for an origin.
+
+Layout: origins are hashed (blake2b, stable across processes) into a fixed
+number of slots. Each slot holds a ring of `buckets` sub-windows, each an
+(epoch, count) pair of int64s; the sliding window count is the sum of the
+sub-windows whose epoch is recent enough. Distinct origins that hash to the
+same slot share a counter, which can only over-count.
+
+Concurrency: writes take one of `stripes` locks chosen by slot, so workers
+only contend when they update origins in the same stripe at the same time.
+Reads do not lock; they may miss an increment that is in flight.
+
+The limiter is created once in the parent process and passed to workers as
+a Process argument (the locks travel with it), e.g.
+
+    limiter = SharedRateLimiter(window_s=10.0)
+    ctx.Process(target=worker, args=(limiter,)).start()
+    ...
+    limiter.close(); limiter.unlink()
+'''
+
+from multiprocessing import shared_memory
+import hashlib
+import math
+import multiprocessing
+import time
+
+import numpy as np
+
+
+# Name of the state key added by add_rate_feature()
+RATE_FEATURE = 'origin_rate_bucket'
+
+
+def origin_slot(origin, slots):
+    """Map an origin to a counter slot (same result in every process).
+
+    Args:
+        origin: Origin string (e.g. client IP)
+        slots: Number of slots
+
+    Returns:
+        int: Slot index
+    """
+    digest = hashlib.blake2b(str(origin).encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'little') % slots
+
+
+class SharedRateLimiter:
+    """Hashed per-origin sliding-window counters in shared memory."""
+
+    def __init__(self, slots=65536, window_s=10.0, buckets=10, stripes=64, context=None):
+        """Create the shared segment and its stripe locks.
+
+        Args:
+            slots: Number of hashed counter slots
+            window_s: Sliding window length in seconds
+            buckets: Sub-windows per window (window resolution)
+            stripes: Number of locks guarding the slots
+            context: multiprocessing context (default: multiprocessing module)
+        """
+        self.slots = slots
+        self.window_s = window_s
+        self.buckets = buckets
+        self.sub_window_s = window_s / buckets
+        self.stripes = stripes
+
+        mp = context or multiprocessing
+        self._locks = [mp.Lock() for _ in range(stripes)]
+        self._shm = shared_memory.SharedMemory(create=True, size=self._nbytes())
+        self._owner = True
+        self._map()
+        self._epochs.fill(-1)
+        self._counts.fill(0)
+
+    def _nbytes(self):
+        return 2 * self.slots * self.buckets * 8
+
+    def _map(self):
+        """Create numpy views onto the shared segment."""
+        shape = (self.slots, self.buckets)
+        self._epochs = np.ndarray(shape, dtype=np.int64, buffer=self._shm.buf)
+        self._counts = np.ndarray(shape, dtype=np.int64, buffer=self._shm.buf,
+                                  offset=self.slots * self.buckets * 8)
+
+        # Per-process contention statistics
+        self.lock_acquisitions = 0
+        self.lock_waits = 0
+
+    def __getstate__(self):
+        # Sent to worker processes: they attach to the same segment by name
+        return {
+            'name': self._shm.name,
+            'slots': self.slots,
+            'window_s': self.window_s,
+            'buckets': self.buckets,
+            'stripes': self.stripes,
+            'locks': self._locks
+        }
+
+    def __setstate__(self, state):
+        self.slots = state['slots']
+        self.window_s = state['window_s']
+        self.buckets = state['buckets']
+        self.sub_window_s = self.window_s / self.buckets
+        self.stripes = state['stripes']
+        self._locks = state['locks']
+        self._shm = shared_memory.SharedMemory(name=state['name'])
+        self._owner = False
+        self._map()
+
+    @property
+    def name(self):
+        """Name of the shared memory segment."""
+        return self._shm.name
+
+    def hit(self, origin, now=None, cost=1):
+        """Record a request from an origin.
+
+        Args:
+            origin: Origin string
+            now: Current time in seconds (default: time.time(), which all
+                processes agree on)
+            cost: Amount added to the counter
+
+        Returns:
+            int: Requests from the origin in the current window, including this one
+        """
+        if now is None:
+            now = time.time()
+        slot = origin_slot(origin, self.slots)
+        epoch = int(now // self.sub_window_s)
+        index = epoch % self.buckets
+        epochs = self._epochs[slot]
+        counts = self._counts[slot]
+
+        lock = self._locks[slot % self.stripes]
+        if not lock.acquire(False):
+            self.lock_waits += 1
+            lock.acquire()
+        try:
+            if epochs[index] != epoch:
+                # Sub-window reused from an older window: restart its count
+                epochs[index] = epoch
+                counts[index] = 0
+            counts[index] += cost
+            total = int(counts[epochs > epoch - self.buckets].sum())
+        finally:
+            lock.release()
+        self.lock_acquisitions += 1
+        return total
+
+    def count(self, origin, now=None):
+        """Requests from an origin in the current window (lock-free read).
+
+        Args:
+            origin: Origin string
+            now: Current time in seconds (default: time.time())
+
+        Returns:
+            int: Request count in the window
+        """
+        if now is None:
+            now = time.time()
+        slot = origin_slot(origin, self.slots)
+        epoch = int(now // self.sub_window_s)
+        counts = self._counts[slot]
+        return int(counts[self._epochs[slot] > epoch - self.buckets].sum())
+
+    def rate(self, origin, now=None):
+        """Requests per second from an origin over the window.
+
+        Args:
+            origin: Origin string
+            now: Current time in seconds (default: time.time())
+
+        Returns:
+            float: Request rate
+        """
+        return self.count(origin, now) / self.window_s
+
+    def is_limited(self, origin, limit, now=None):
+        """Check whether an origin is over a per-window request limit.
+
+        Args:
+            origin: Origin string
+            limit: Maximum requests per window
+            now: Current time in seconds (default: time.time())
+
+        Returns:
+            bool: True if the origin sent more than `limit` requests
+        """
+        return self.count(origin, now) > limit
+
+    def get_statistics(self):
+        """Get this process's contention statistics.
+
+        Returns:
+            dict: Lock acquisitions, waits and contention ratio
+        """
+        return {
+            'lock_acquisitions': self.lock_acquisitions,
+            'lock_waits': self.lock_waits,
+            'contention_ratio': (
+                self.lock_waits / self.lock_acquisitions
+                if self.lock_acquisitions > 0 else 0.0
+            ),
+            'slots': self.slots,
+            'stripes': self.stripes,
+            'window_s': self.window_s
+        }
+
+    def close(self):
+        """Unmap the segment in this process."""
+        self._epochs = self._counts = None
+        self._shm.close()
+
+    def unlink(self):
+        """Destroy the segment (call once, from the creating process)."""
+        if self._owner:
+            self._shm.unlink()
+
+
+def add_rate_feature(features, limiter, origin, now=None):
+    """Record a request and add its origin's request rate to a feature dict.
+
+    The count is bucketed on a log2 scale (0, 1, 2-3, 4-7, ...) so tabular
+    agents see a small number of distinct values.
+
+    Args:
+        features: dict of features from FeatureExtractor (modified in place)
+        limiter: SharedRateLimiter
+        origin: Request origin
+        now: Current time in seconds (default: time.time())
+
+    Returns:
+        dict: The same feature dict
+    """
+    count = limiter.hit(origin, now)
+    features[RATE_FEATURE] = int(math.log2(count)) + 1 if count > 0 else 0
+    return features
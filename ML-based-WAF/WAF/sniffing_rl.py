@@ -18,11 +18,13 @@ Two operational modes:
 
 from scapy.all import sniff, Raw
 import scapy.all as scapy
-from scapy.layers.http import HTTPRequest, HTTP
+from scapy.layers.http import HTTPRequest, HTTPResponse, HTTP
 from scapy.layers.inet import IP, TCP
 from scapy.sessions import TCPSession
 import urllib.parse
 import time
+import itertools
+import signal
 import traceback
 from argparse import ArgumentParser
 
@@ -31,10 +33,23 @@ from request import Request, DBController
 
 # Import RL modules
 from feature_extractor import FeatureExtractor
-from rl_agent import PolicyAgent, Action
+from rl_agent import PolicyAgent, Action, ACTION_INDEX
+from linear_agent import LinearBanditAgent
+from hierarchical_agent import HierarchicalPolicyAgent, add_context
+from shared_rate_limiter import SharedRateLimiter, add_rate_feature
+from challenge_token import ChallengeTokens, load_secret
+from enforcement_backend import NftablesBackend, DryRunBackend
+from frozen_policy import FrozenPolicy
 from safety_layer import SafetyLayer
 from action_executor import ActionExecutor
 from reward_calculator import RewardCalculator
+from checkpointer import BackgroundCheckpointer
+from replay_buffer import ReplayBuffer, BatchUpdater
+from delayed_reward import PendingDecisionTable
+from response_capture import ResponseCorrelator
+from teacher_labeling import TeacherLabeler
+from policy_evaluation import DecisionLogger
+from shadow_policy import ShadowEvaluator, create_shadow_agent
 
 # ============================================================
 # CONFIGURATION
@@ -48,6 +63,43 @@ RL_ENFORCEMENT_ENABLED = False  # Default: PASSIVE mode for safety
 RL_EPSILON = 0.1  # Exploration rate (10% random actions)
 RL_LEARNING_RATE = 0.05  # Conservative learning rate
 RL_CHECKPOINT_FILE = 'rl_policy_checkpoint.pkl'
+RL_CHECKPOINT_INTERVAL_S = 30.0  # Background checkpoint at least this often
+RL_CHECKPOINT_COMPACT_EVERY = 20  # Deltas between full (compacted) snapshots
+
+# Batched learning (--batch-updates): decisions go to a replay buffer and a
+# background thread applies them to the Q-table
+RL_REPLAY_CAPACITY = 65536  # Transitions kept in the ring buffer
+RL_BATCH_INTERVAL_S = 0.5  # Time between batch updates
+RL_REPLAY_BATCH_SIZE = 256  # Past transitions replayed per batch (0 = off)
+
+# Delayed rewards (--delayed-rewards): decisions wait for their real outcome
+RL_REWARD_TTL_S = 30.0  # Seconds a decision waits to be joined
+RL_PENDING_MAX_ENTRIES = 100000  # Bound on pending decisions
+RL_MAX_FLOWS = 100000  # Bound on connections awaiting a response (--capture-responses)
+RL_TEACHER_WORKERS = 2  # Classifier threads (--teacher)
+RL_TEACHER_BATCH_SIZE = 64  # Requests per classifier call
+RL_TEACHER_MAX_QUEUE = 4096  # Requests waiting for the classifier before falling back
+
+# Linear bandit configuration (--agent linucb / thompson)
+RL_LINEAR_ALPHA = 1.0  # Exploration strength (UCB width / posterior scale)
+RL_LINEAR_CHECKPOINT_FILE = 'rl_linear_checkpoint.pkl'
+
+# Hierarchical agent configuration (--agent hierarchical)
+RL_HIERARCHICAL_CHECKPOINT_FILE = 'rl_hierarchical_checkpoint.pkl'
+RL_ROUTE_DEPTH = 2  # Path segments kept in a route cluster
+RL_BACKOFF_STRENGTH = 5.0  # Visits before a host/route outweighs its parent level
+RL_LEVEL_MAX_ENTRIES = {'global': 200000, 'route': 200000, 'host': 200000}  # LRU budgets
+
+# Shared per-origin rate limiter (--rate-limit)
+RL_RATE_WINDOW_S = 10.0  # Sliding window length
+RL_RATE_LIMITER_SLOTS = 65536  # Hashed origin counters in shared memory
+
+# Challenge tokens: clients that pass a CHALLENGE skip the pipeline until expiry
+RL_CHALLENGE_TTL_S = 900
+
+# Kernel-level enforcement of BLOCK (nftables set elements expire by themselves)
+RL_BLOCK_TIMEOUT_S = 600
+RL_BLOCK_DRY_RUN_LOG = "nft_dry_run.nft"
 
 # Reward Configuration
 REWARD_ATTACK_BLOCKED = 1.0
@@ -66,8 +118,85 @@ parser.add_argument('--enforce', action='store_true',
                     help='Enable RL enforcement mode (default: passive/LOG_ONLY)')
 parser.add_argument('--epsilon', type=float, default=RL_EPSILON,
                     help='RL exploration rate (0.0-1.0)')
+parser.add_argument('--agent', choices=['tabular', 'hierarchical', 'linucb', 'thompson'],
+                    default='tabular',
+                    help='RL agent: tabular Q-table, per-host/route Q-tables with '
+                         'backoff, or linear contextual bandit')
+parser.add_argument('--alpha', type=float, default=RL_LINEAR_ALPHA,
+                    help='Exploration strength for linear agents')
+parser.add_argument('--batch-updates', action='store_true',
+                    help='Record decisions in a replay buffer and learn in batches '
+                         '(tabular agent only; not with delayed rewards)')
+parser.add_argument('--delayed-rewards', action='store_true',
+                    help='Hold decisions until their outcome is joined by request id')
+parser.add_argument('--reward-ttl', type=float, default=RL_REWARD_TTL_S,
+                    help='Seconds a pending decision waits for its outcome')
+parser.add_argument('--default-reward', type=float, default=None,
+                    help='Reward for expired decisions (default: score the '
+                         'heuristic outcome recorded with the decision)')
+parser.add_argument('--capture-responses', action='store_true',
+                    help='Learn from real responses (status, size, SQL errors, upstream '
+                         'latency) matched to their requests; implies --delayed-rewards')
+parser.add_argument('--teacher', action='store_true',
+                    help='Label requests with ThreatClassifier on background workers and '
+                         'learn from its verdicts (heuristic when the queue is full); '
+                         'implies --delayed-rewards')
+parser.add_argument('--decision-log', default=None,
+                    help='Append decisions with propensities to this file for '
+                         'offline policy evaluation (policy_evaluation.py). With delayed '
+                         'rewards decisions are logged once their outcome is joined. '
+                         'Without --enforce every decision is logged as log_only with '
+                         'propensity 1, which cannot evaluate other policies. Not with '
+                         '--agent hierarchical or --rate-limit')
+parser.add_argument('--ip-rules', default=None,
+                    help='JSON file of allow/deny CIDRs for the safety layer '
+                         '(see ip_rules.example.json)')
+parser.add_argument('--endpoint-rules', default=None,
+                    help='JSON file of per-route max_action/force rules for the '
+                         'safety layer (see endpoint_rules.example.json)')
+parser.add_argument('--rules-reload-interval', type=float, default=2.0,
+                    help='Seconds between checks for modified rules files '
+                         '(0 disables polling; SIGHUP always reloads)')
+parser.add_argument('--rate-limit', type=int, default=0,
+                    help='Requests per origin per %ds window above which THROTTLE '
+                         'rejects with 429; also adds the origin rate to the RL '
+                         'state (0 disables)' % RL_RATE_WINDOW_S)
+parser.add_argument('--challenge-secret', default=None, metavar='FILE',
+                    help='HMAC key file for challenge tokens, shared by all workers '
+                         '(created if missing; default: random per process)')
+parser.add_argument('--block-backend', choices=['nftables', 'dry-run'], default=None,
+                    help='Also enforce BLOCK in the firewall: push blocked origins in '
+                         'batches to an nftables set, or only log the nft scripts to '
+                         '%s (default: no enforcement). Exploratory BLOCKs only '
+                         'reject the request' % RL_BLOCK_DRY_RUN_LOG)
+parser.add_argument('--block-timeout', type=int, default=RL_BLOCK_TIMEOUT_S,
+                    help='Seconds an origin stays in the block set (default: %d)' % RL_BLOCK_TIMEOUT_S)
+parser.add_argument('--frozen-policy', default=None,
+                    help='Serve a read-only policy exported by frozen_policy.py '
+                         '(no learning, no checkpoints)')
+parser.add_argument('--shadow', action='append', default=[], metavar='SPEC',
+                    help='Run a non-enforcing shadow policy on the same traffic '
+                         '(tabular:EPS, linucb:ALPHA, thompson:ALPHA or frozen:PATH; '
+                         'repeatable)')
 args = parser.parse_args()
 
+if args.batch_updates and args.agent != 'tabular':
+    parser.error('--batch-updates requires --agent tabular')
+if args.capture_responses or args.teacher:
+    # Captured responses and teacher labels are joined to decisions by request id
+    args.delayed_rewards = True
+if args.batch_updates and args.delayed_rewards:
+    # Joined rewards update the agent directly, bypassing the replay buffer
+    parser.error('--batch-updates cannot be combined with --delayed-rewards/'
+                 '--capture-responses/--teacher')
+if args.decision_log and (args.agent == 'hierarchical' or args.rate_limit):
+    # The log stores FeatureExtractor.FEATURE_NAMES only; route/host keys and
+    # the origin rate bucket would be missing from the logged states
+    parser.error('--decision-log cannot be combined with --agent hierarchical/--rate-limit')
+if args.frozen_policy and (args.batch_updates or args.delayed_rewards):
+    parser.error('--frozen-policy does not learn; drop --batch-updates/--delayed-rewards/'
+                 '--capture-responses/--teacher')
+
 # Override enforcement mode from command line
 if args.enforce:
     RL_ENFORCEMENT_ENABLED = True
@@ -83,14 +212,52 @@ else:
 scapy.packet.bind_layers(TCP, HTTP, dport=args.port)
 scapy.packet.bind_layers(TCP, HTTP, sport=args.port)
 
-# Database controller
-db = DBController()
+# Database controller: saves are group-committed by a background writer
+db = DBController(async_writes=True)
 
 # RL Pipeline Components
 feature_extractor = FeatureExtractor()
-rl_agent = PolicyAgent(epsilon=args.epsilon, learning_rate=RL_LEARNING_RATE)
-safety_layer = SafetyLayer()
-action_executor = ActionExecutor(throttle_delay_ms=500)
+if args.frozen_policy:
+    rl_agent = FrozenPolicy(args.frozen_policy)
+elif args.agent == 'tabular':
+    rl_agent = PolicyAgent(epsilon=args.epsilon, learning_rate=RL_LEARNING_RATE)
+elif args.agent == 'hierarchical':
+    rl_agent = HierarchicalPolicyAgent(
+        epsilon=args.epsilon,
+        learning_rate=RL_LEARNING_RATE,
+        backoff_strength=RL_BACKOFF_STRENGTH,
+        max_entries=RL_LEVEL_MAX_ENTRIES
+    )
+    RL_CHECKPOINT_FILE = RL_HIERARCHICAL_CHECKPOINT_FILE
+else:
+    rl_agent = LinearBanditAgent(algorithm=args.agent, alpha=args.alpha)
+    RL_CHECKPOINT_FILE = RL_LINEAR_CHECKPOINT_FILE
+safety_layer = SafetyLayer(ip_rules_file=args.ip_rules,
+                           endpoint_rules_file=args.endpoint_rules)
+# Rules files are reloaded off the packet path and swapped in atomically
+safety_layer.start_watcher(interval_s=args.rules_reload_interval)
+if hasattr(signal, 'SIGHUP'):
+    signal.signal(signal.SIGHUP, lambda signum, frame: safety_layer.request_reload())
+# Request counts in shared memory, so worker processes agree on origin rates
+rate_limiter = None
+if args.rate_limit > 0:
+    rate_limiter = SharedRateLimiter(slots=RL_RATE_LIMITER_SLOTS, window_s=RL_RATE_WINDOW_S)
+challenge_tokens = ChallengeTokens(
+    secret=load_secret(args.challenge_secret) if args.challenge_secret else None,
+    ttl_s=RL_CHALLENGE_TTL_S,
+    route_depth=RL_ROUTE_DEPTH
+)
+block_backend = None
+if args.block_backend == 'nftables':
+    block_backend = NftablesBackend(timeout_s=args.block_timeout)
+elif args.block_backend == 'dry-run':
+    block_backend = DryRunBackend(log_file=RL_BLOCK_DRY_RUN_LOG, timeout_s=args.block_timeout)
+if block_backend is not None:
+    block_backend.setup()
+    block_backend.start()
+action_executor = ActionExecutor(throttle_delay_ms=500, max_throttle_delay_ms=5000,
+                                 rate_limiter=rate_limiter, rate_limit=args.rate_limit or None,
+                                 challenge_tokens=challenge_tokens, block_backend=block_backend)
 reward_calculator = RewardCalculator(
     attack_blocked_reward=REWARD_ATTACK_BLOCKED,
     legitimate_allowed_reward=REWARD_LEGITIMATE_ALLOWED,
@@ -99,14 +266,101 @@ reward_calculator = RewardCalculator(
 )
 
 # Load existing policy if available
-if rl_agent.load_checkpoint(RL_CHECKPOINT_FILE):
+if args.frozen_policy:
+    print(f"[INFO] Serving frozen policy {args.frozen_policy} "
+          f"({rl_agent.size} states, default {rl_agent.default_action.value})")
+elif rl_agent.load_checkpoint(RL_CHECKPOINT_FILE):
     print(f"[INFO] Loaded RL policy from {RL_CHECKPOINT_FILE}")
     stats = rl_agent.get_statistics()
-    print(f"[INFO] Policy stats: {stats['total_updates']} updates, "
-          f"{stats['q_table_size']} states learned")
+    if 'q_table_size' in stats:
+        print(f"[INFO] Policy stats: {stats['total_updates']} updates, "
+              f"{stats['q_table_size']} states learned")
+    else:
+        print(f"[INFO] Policy stats: {stats['total_updates']} updates")
 else:
     print(f"[INFO] Starting with fresh RL policy")
 
+# Checkpoints are written from a background thread, never from the callback
+checkpointer = None
+if not args.frozen_policy:
+    checkpointer = BackgroundCheckpointer(
+        rl_agent,
+        RL_CHECKPOINT_FILE,
+        interval_s=RL_CHECKPOINT_INTERVAL_S,
+        compact_every=RL_CHECKPOINT_COMPACT_EVERY
+    )
+    checkpointer.start()
+
+# Replay buffer + background learner (optional)
+replay_buffer = None
+batch_updater = None
+if args.batch_updates:
+    replay_buffer = ReplayBuffer(capacity=RL_REPLAY_CAPACITY)
+    batch_updater = BatchUpdater(
+        rl_agent,
+        replay_buffer,
+        interval_s=RL_BATCH_INTERVAL_S,
+        replay_batch_size=RL_REPLAY_BATCH_SIZE
+    )
+    batch_updater.start()
+    print(f"[INFO] Batched updates enabled (buffer: {RL_REPLAY_CAPACITY} transitions)")
+
+# Decision log for offline policy evaluation (optional)
+decision_logger = DecisionLogger(args.decision_log) if args.decision_log else None
+if decision_logger is not None and not RL_ENFORCEMENT_ENABLED:
+    print("[WARNING] Passive mode logs every decision as log_only (propensity 1); "
+          "--decision-log data can only evaluate other policies with --enforce")
+
+# Pending decisions waiting for their real outcome (optional). Outcomes are
+# attached with pending_decisions.join(request_id, outcome); resolved
+# decisions are logged with the reward actually learned from
+pending_decisions = None
+if args.delayed_rewards:
+    pending_decisions = PendingDecisionTable(
+        rl_agent,
+        reward_calculator,
+        ttl_s=args.reward_ttl,
+        max_entries=RL_PENDING_MAX_ENTRIES,
+        default_reward=args.default_reward,
+        # One join per outcome source (captured response, teacher label)
+        outcomes_required=max(1, args.capture_responses + args.teacher),
+        decision_logger=decision_logger
+    )
+    print(f"[INFO] Delayed rewards enabled (TTL: {args.reward_ttl}s)")
+request_ids = itertools.count(1)
+
+# Flow table matching captured responses (sport=<port>) to their requests
+response_correlator = None
+if args.capture_responses:
+    response_correlator = ResponseCorrelator(ttl_s=args.reward_ttl, max_flows=RL_MAX_FLOWS)
+    print(f"[INFO] Response capture enabled (rewards from real responses)")
+
+# Background attack labeling by the SVM classifier (optional)
+teacher_labeler = None
+if args.teacher:
+    from classifier import ThreatClassifier
+    teacher_labeler = TeacherLabeler(
+        ThreatClassifier(),
+        pending_decisions,
+        workers=RL_TEACHER_WORKERS,
+        batch_size=RL_TEACHER_BATCH_SIZE,
+        max_queue=RL_TEACHER_MAX_QUEUE
+    )
+    teacher_labeler.start()
+    print(f"[INFO] Teacher labeling enabled ({RL_TEACHER_WORKERS} workers)")
+
+# Shadow policies share the features and outcome of each request (optional)
+shadow_evaluator = None
+if args.shadow:
+    shadow_evaluator = ShadowEvaluator(reward_calculator, safety_layer=safety_layer)
+    for spec in args.shadow:
+        try:
+            name, shadow_agent = create_shadow_agent(spec, learning_rate=RL_LEARNING_RATE)
+        except (ValueError, OSError) as e:
+            parser.error(f"--shadow {spec}: {e}")
+        shadow_evaluator.add_policy(name, shadow_agent)
+        print(f"[INFO] Shadow policy: {name}")
+
 # Statistics
 request_count = 0
 checkpoint_interval = 100  # Save policy every N requests
@@ -138,6 +392,25 @@ def get_header(packet):
             headers[field] = f.decode()
     return headers
 
+def get_logged_propensity(features, final_action, endpoint, origin):
+    """Probability that the decision path (agent → safety → mode) executes final_action.
+    
+    The safety layer maps several agent actions onto the same final action
+    (e.g. BLOCK → CHALLENGE on protected endpoints), so their probabilities
+    are summed. In passive mode the final action is always LOG_ONLY.
+    Agents compute action probabilities without sampling, so this is cheap
+    enough to run per request.
+    """
+    if not RL_ENFORCEMENT_ENABLED:
+        return 1.0
+    
+    propensity = 0.0
+    for action, probability in rl_agent.get_action_probabilities(features).items():
+        if probability > 0 and safety_layer.apply_constraints(
+                action, endpoint=endpoint, origin=origin) == final_action:
+            propensity += probability
+    return propensity
+
 # ============================================================
 # MAIN REQUEST PROCESSING PIPELINE
 # ============================================================
@@ -190,16 +463,34 @@ def process_request_with_rl(packet):
             except:
                 req.body = None
         
+        # Clients holding a valid challenge token already proved themselves:
+        # no features, decision or learning until the token expires
+        if challenge_tokens.verify_request(req.headers, req.origin, req.request):
+            req.threats = {'final_action': Action.ALLOW.value, 'challenge_passed': True}
+            db.save(req)
+            request_count += 1
+            print(f"[REQ {request_count}] {req.method} {req.request[:50]} | challenge token valid → allow")
+            return
+        
         # ========================================================
         # STAGE 2: FEATURE EXTRACTION
         # ========================================================
         features = feature_extractor.extract_features(req)
+        if args.agent == 'hierarchical' and not args.frozen_policy:
+            # State also carries the route cluster and host (tenant)
+            add_context(features, req.request, req.host, depth=RL_ROUTE_DEPTH)
+        if rate_limiter is not None:
+            # Count the request and add the origin's (log-bucketed) request rate
+            add_rate_feature(features, rate_limiter, req.origin)
         
         # ========================================================
         # STAGE 3: RL POLICY DECISION
         # ========================================================
-        # RL agent selects action based on extracted features
+        # RL agent selects action based on extracted features. Agents count
+        # the decisions where exploration changed the choice
+        explorations = getattr(rl_agent, 'exploration_count', 0)
         rl_action = rl_agent.select_action(features)
+        explored = getattr(rl_agent, 'exploration_count', 0) != explorations
         
         # ========================================================
         # STAGE 4: SAFETY LAYER ENFORCEMENT
@@ -230,16 +521,24 @@ def process_request_with_rl(packet):
         request_data = {
             'request': req.request,
             'body': req.body,
-            'headers': req.headers
+            'headers': req.headers,
+            'origin': req.origin
         }
         
-        execution_result = action_executor.execute(final_action, request_data)
+        # Only a BLOCK the policy stands behind reaches the firewall; an
+        # exploratory one rejects this request only (a safety rule that turns
+        # the explored action into BLOCK still counts as deliberate)
+        execution_result = action_executor.execute(
+            final_action, request_data,
+            kernel_block=not explored or safe_action != rl_action
+        )
         
         # ========================================================
         # STAGE 7: RESPONSE CAPTURE (SIMULATED)
         # ========================================================
-        # In production, this would capture actual application response
-        # For demo, we simulate based on features
+        # Without --capture-responses we simulate based on features. With it,
+        # this outcome is only a fallback: the real response is joined later
+        # by process_response()
         latency_ms = (time.time() - start_time) * 1000
         
         # Estimate if request was an attack using heuristic
@@ -268,7 +567,49 @@ def process_request_with_rl(packet):
         # ========================================================
         # Update RL agent's Q-table based on observed reward
         # This is where the agent learns from experience
-        rl_agent.update(features, final_action, reward)
+        propensity = None
+        if replay_buffer is not None or decision_logger is not None:
+            propensity = get_logged_propensity(features, final_action, req.request, req.origin)
+        
+        # Always generated here: a client-supplied X-Request-ID could collide
+        # with (and take the outcome of) another client's pending decision
+        request_id = f"{req.origin}-{next(request_ids)}"
+        if pending_decisions is not None:
+            # Learn when the real outcome is joined; the simulated outcome is
+            # only used if the decision expires unjoined
+            pending_decisions.record(request_id, features, final_action, context=outcome,
+                                     propensity=propensity)
+            if response_correlator is not None and packet.haslayer(TCP) and packet.haslayer(IP):
+                response_correlator.track_request(
+                    (packet[IP].src, packet[TCP].sport, packet[IP].dst, packet[TCP].dport),
+                    request_id,
+                    timestamp=float(packet.time)
+                )
+            if teacher_labeler is not None and not teacher_labeler.submit(
+                    request_id, req, is_likely_attack):
+                # Classifier backlog: label with the heuristic instead
+                pending_decisions.join(request_id, {'is_attack': is_likely_attack,
+                                                    'teacher_label': False})
+        elif replay_buffer is not None:
+            # A state id lookup and one array write (plus the propensity
+            # computed above); the batch updater applies the update off the
+            # hot path
+            replay_buffer.add(
+                rl_agent.state_id(features),
+                ACTION_INDEX[final_action],
+                reward,
+                propensity
+            )
+        elif not args.frozen_policy:
+            rl_agent.update(features, final_action, reward)
+        
+        if decision_logger is not None and pending_decisions is None:
+            decision_logger.log(features, final_action, reward, propensity)
+        
+        # Shadow policies reuse the features and outcome computed above
+        if shadow_evaluator is not None:
+            shadow_evaluator.evaluate(features, outcome, safe_action,
+                                      endpoint=req.request, origin=req.origin)
         
         # ========================================================
         # STAGE 10: LOGGING
@@ -281,22 +622,29 @@ def process_request_with_rl(packet):
             'reward': reward,
             'attack_probability': attack_probability,
             'enforcement_mode': enforcement_note,
-            'allowed': execution_result['allowed']
+            'allowed': execution_result['allowed'],
+            'request_id': request_id
         }
+        if propensity is not None:
+            req.threats['propensity'] = propensity
+        if req.headers.get('X_Request_ID'):
+            # Logged for correlation with upstream logs only
+            req.threats['client_request_id'] = req.headers['X_Request_ID']
         
         # Save to database
         db.save(req)
         
         # Increment counter and checkpoint if needed
         request_count += 1
-        if request_count % checkpoint_interval == 0:
-            rl_agent.save_checkpoint(RL_CHECKPOINT_FILE)
-            print(f"[INFO] Checkpoint saved after {request_count} requests")
+        if checkpointer is not None and request_count % checkpoint_interval == 0:
+            checkpointer.request_checkpoint()
+            print(f"[INFO] Checkpoint requested after {request_count} requests")
         
         # Log summary (for monitoring)
         print(f"[REQ {request_count}] {req.method} {req.request[:50]} | "
               f"RL:{rl_action.value} → Safe:{safe_action.value} → Final:{final_action.value} | "
-              f"Reward:{reward:+.2f} | Attack:{attack_probability:.2f}")
+              f"Reward:{reward:+.2f}{' (pending)' if pending_decisions is not None else ''} | "
+              f"Attack:{attack_probability:.2f}")
     
     except Exception as e:
         # ========================================================
@@ -317,28 +665,82 @@ def process_request_with_rl(packet):
         except:
             pass  # Even logging failed, just continue
 
+def process_response(packet):
+    """Join a captured application response to its pending decision."""
+    if not (packet.haslayer(TCP) and packet.haslayer(IP)) or packet[TCP].sport != args.port:
+        return
+    try:
+        response = packet[HTTPResponse]
+        body = packet[Raw].load if packet.haslayer(Raw) else b''
+        size = int(response.Content_Length) if response.Content_Length else len(body)
+        match = response_correlator.match_response(
+            (packet[IP].src, packet[TCP].sport, packet[IP].dst, packet[TCP].dport),
+            int(response.Status_Code),
+            body=body,
+            size=size,
+            timestamp=float(packet.time)
+        )
+        if match is not None:
+            request_id, outcome = match
+            reward = pending_decisions.join(request_id, outcome)
+            if reward is not None:
+                print(f"[RESP] {request_id} | {outcome['http_status']} "
+                      f"{outcome['response_bytes']}B {outcome['latency_ms']:.1f}ms"
+                      f"{' SQL-ERROR' if outcome['db_error'] else ''} | Reward:{reward:+.2f}")
+    except Exception as e:
+        # Responses only feed learning; never let them stop capture
+        print(f"[ERROR] Response capture failed: {e}")
+
+def process_packet(packet):
+    """Dispatch captured packets: requests to the RL pipeline, responses to the join."""
+    if response_correlator is not None and packet.haslayer(HTTPResponse):
+        process_response(packet)
+    else:
+        process_request_with_rl(packet)
+
 # ============================================================
 # START SNIFFING
 # ============================================================
 
 print(f"[INFO] Starting RL-based WAF on port {args.port}")
 print(f"[INFO] Enforcement: {'ENABLED' if RL_ENFORCEMENT_ENABLED else 'DISABLED (PASSIVE)'}")
-print(f"[INFO] Exploration rate: {args.epsilon}")
+print(f"[INFO] Agent: {'frozen' if args.frozen_policy else args.agent}")
+if args.frozen_policy:
+    print(f"[INFO] Learning disabled (frozen policy)")
+elif args.agent in ('tabular', 'hierarchical'):
+    print(f"[INFO] Exploration rate: {args.epsilon}")
+else:
+    print(f"[INFO] Exploration strength (alpha): {args.alpha}")
 print(f"[INFO] Press Ctrl+C to stop")
 print("=" * 60)
 
 try:
     # Start packet capture
     pkgs = sniff(
-        prn=process_request_with_rl,
+        prn=process_packet,
         iface='lo',
         filter=f'port {args.port} and inbound',
         session=TCPSession
     )
 finally:
-    # Cleanup: save final checkpoint
-    rl_agent.save_checkpoint(RL_CHECKPOINT_FILE)
-    print(f"\n[INFO] Final checkpoint saved to {RL_CHECKPOINT_FILE}")
+    safety_layer.stop_watcher()
+    if block_backend is not None:
+        block_backend.stop()
+    
+    # Cleanup: apply buffered transitions before the final checkpoint
+    if teacher_labeler is not None:
+        teacher_labeler.stop()
+    if pending_decisions is not None:
+        pending_decisions.expire(now=float('inf'))
+    if decision_logger is not None:
+        decision_logger.close()
+    if batch_updater is not None:
+        batch_updater.stop()
+    
+    # Flush pending deltas and write a compacted checkpoint
+    if checkpointer is not None:
+        checkpointer.stop()
+        print(f"\n[INFO] Final checkpoint saved to {RL_CHECKPOINT_FILE}")
     
     # Print final statistics
     stats = rl_agent.get_statistics()
@@ -349,11 +751,43 @@ finally:
     print("=" * 60)
     print(f"Total requests processed: {request_count}")
     print(f"Total Q-table updates: {stats['total_updates']}")
-    print(f"States learned: {stats['q_table_size']}")
+    if 'q_table_size' in stats:
+        print(f"States learned: {stats['q_table_size']}")
     print(f"Exploration ratio: {stats['exploration_ratio']:.2%}")
     print(f"\nAction distribution:")
     for action, count in exec_stats['action_counts'].items():
         print(f"  {action}: {count}")
+    token_stats = challenge_tokens.get_statistics()
+    print(f"Challenge tokens issued: {token_stats['issued']}, "
+          f"accepted: {token_stats['accepted']}, rejected: {token_stats['rejected']}")
+    if 'throttle' in exec_stats:
+        print(f"Throttled requests deferred: {exec_stats['throttle']['deferred']}, "
+              f"rejected: {exec_stats['throttle']['rejected']}")
+    if teacher_labeler is not None:
+        teacher_stats = teacher_labeler.get_statistics()
+        print(f"Teacher labels: {teacher_stats['labeled']} "
+              f"({teacher_stats['attacks']} attacks), heuristic fallbacks: "
+              f"{teacher_stats['fallbacks']}, max queue depth: {teacher_stats['max_queue_depth']}")
+    if response_correlator is not None:
+        flow_stats = response_correlator.get_statistics()
+        print(f"Responses matched: {flow_stats['matched']}, unmatched: "
+              f"{flow_stats['unmatched_responses']}, expired requests: {flow_stats['expired']}")
+    if 'block_backend' in exec_stats:
+        block_stats = exec_stats['block_backend']
+        print(f"Origins pushed to firewall: {block_stats['pushed']} "
+              f"in {block_stats['batches']} batches (errors: {block_stats['errors']})")
+    
+    safety_stats = safety_layer.get_statistics()
+    print(f"\nSafety memo hit rate: {safety_stats['memo_hit_rate']:.2%} "
+          f"(rules reloaded {safety_stats['reloads']} times)")
+    
+    if shadow_evaluator is not None:
+        print(f"\nShadow policies:")
+        shadow_evaluator.print_report()
+    
+    if rate_limiter is not None:
+        rate_limiter.close()
+        rate_limiter.unlink()
     
     # Close database
     db.close()
@@ -0,0 +1,196 @@
+'''Asynchronous teacher labeling of requests for RL rewards.
+
+estimate_attack_probability is a cheap sum of feature thresholds; the SVM in
+ThreatClassifier is far more accurate but too slow for the packet path.
+TeacherLabeler runs the classifier off that path:
+
+1. submit(): the capture loop hands over (request_id, request) and returns
+   immediately; the request waits in a bounded queue
+2. worker threads take up to batch_size queued requests at a time and
+   classify them with one classify_requests() call
+3. each verdict is joined to the pending decision as {'is_attack': ...}, so
+   the agent learns from the teacher's label (see delayed_reward.py)
+
+When the queue is full, submit() refuses the request and the caller falls
+back to the heuristic label; if a batch fails, its requests are joined with
+the heuristic label they were submitted with.
+'''
+
+import queue
+import threading
+import time
+
+from offline_trainer import label_from_threats
+
+
+class TeacherLabeler:
+    """Labels requests with a classifier on a pool of worker threads.
+
+    Usage:
+        labeler = TeacherLabeler(ThreatClassifier(), pending_decisions)
+        labeler.start()
+        if not labeler.submit(request_id, req, heuristic_is_attack):
+            pending_decisions.join(request_id, {'is_attack': heuristic_is_attack})
+        labeler.stop()                  # label what is still queued
+    """
+
+    def __init__(self, classifier, pending_decisions, workers=2, batch_size=64,
+                 max_queue=4096, max_wait_s=0.05):
+        """Initialize the labeler.
+
+        Args:
+            classifier: Object with classify_requests(reqs) returning one
+                threats dict per request (ThreatClassifier)
+            pending_decisions: PendingDecisionTable the verdicts are joined to
+            workers: Number of worker threads
+            batch_size: Maximum requests per classifier call
+            max_queue: Maximum requests waiting for a worker
+            max_wait_s: Time a worker waits to fill a batch
+        """
+        self.classifier = classifier
+        self.pending_decisions = pending_decisions
+        self.workers = workers
+        self.batch_size = batch_size
+        self.max_queue = max_queue
+        self.max_wait_s = max_wait_s
+
+        # (request_id, request, heuristic label, submit time)
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._stopping = threading.Event()
+        self._threads = []
+        self._stats_lock = threading.Lock()
+
+        # Statistics for monitoring
+        self.submitted = 0
+        self.fallbacks = 0
+        self.labeled = 0
+        self.attacks = 0
+        self.batches = 0
+        self.errors = 0
+        self.max_depth = 0
+        self.total_delay_s = 0.0
+        self.last_error = None
+
+    def start(self):
+        """Start the worker threads."""
+        self._stopping.clear()
+        self._threads = [
+            threading.Thread(target=self._run, name=f'teacher-{i}', daemon=True)
+            for i in range(self.workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self):
+        """Stop the workers after the queued requests are labeled."""
+        self._stopping.set()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+        # Anything submitted after the workers left
+        while self._label_batch(self._take_batch(block=False)):
+            pass
+
+    def submit(self, request_id, req, heuristic_is_attack=False):
+        """Queue a request for labeling (non-blocking).
+
+        Args:
+            request_id: Id of the pending decision
+            req: Request object (must not be modified afterwards)
+            heuristic_is_attack: Label used if the classifier fails
+
+        Returns:
+            bool: False if the queue is full; the caller should then use the
+                heuristic label itself
+        """
+        try:
+            self._queue.put_nowait((request_id, req, heuristic_is_attack, time.monotonic()))
+        except queue.Full:
+            with self._stats_lock:
+                self.fallbacks += 1
+            return False
+        with self._stats_lock:
+            self.submitted += 1
+            depth = self._queue.qsize()
+            if depth > self.max_depth:
+                self.max_depth = depth
+        return True
+
+    def _run(self):
+        """Worker loop: classify batches until stopped and drained."""
+        while not (self._stopping.is_set() and self._queue.empty()):
+            self._label_batch(self._take_batch(block=True))
+
+    def _take_batch(self, block):
+        """Collect up to batch_size queued items."""
+        batch = []
+        try:
+            if block:
+                batch.append(self._queue.get(timeout=self.max_wait_s))
+            deadline = time.monotonic() + self.max_wait_s
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if not block or remaining <= 0:
+                    batch.append(self._queue.get_nowait())
+                else:
+                    batch.append(self._queue.get(timeout=remaining))
+        except queue.Empty:
+            pass
+        return batch
+
+    def _label_batch(self, batch):
+        """Classify a batch and join the verdicts to the pending decisions.
+
+        Returns:
+            int: Number of requests handled
+        """
+        if not batch:
+            return 0
+        try:
+            threats = self.classifier.classify_requests([item[1] for item in batch])
+            labels = [label_from_threats(t) for t in threats]
+        except Exception as e:
+            # Never let classifier failures kill a worker
+            labels = [None] * len(batch)
+            with self._stats_lock:
+                self.errors += 1
+                self.last_error = str(e)
+
+        now = time.monotonic()
+        attacks = 0
+        for (request_id, _, heuristic_is_attack, submitted_at), label in zip(batch, labels):
+            is_attack = heuristic_is_attack if label is None else label
+            attacks += is_attack
+            self.pending_decisions.join(request_id, {
+                'is_attack': is_attack,
+                'teacher_label': label is not None
+            })
+        with self._stats_lock:
+            self.labeled += len(batch)
+            self.attacks += attacks
+            self.batches += 1
+            self.total_delay_s += sum(now - item[3] for item in batch)
+        return len(batch)
+
+    def get_statistics(self):
+        """Get labeling statistics for monitoring.
+
+        Returns:
+            dict: Queue depth, throughput and fallback counters
+        """
+        return {
+            'queue_depth': self._queue.qsize(),
+            'max_queue_depth': self.max_depth,
+            'max_queue': self.max_queue,
+            'submitted': self.submitted,
+            'labeled': self.labeled,
+            'attacks': self.attacks,
+            'fallbacks': self.fallbacks,
+            'batches': self.batches,
+            'avg_batch_size': self.labeled / self.batches if self.batches > 0 else 0.0,
+            'avg_label_delay_ms': (
+                self.total_delay_s / self.labeled * 1000 if self.labeled > 0 else 0.0
+            ),
+            'errors': self.errors,
+            'last_error': self.last_error
+        }
@@ -0,0 +1,126 @@
+"""Test script for background incremental checkpointing."""
+
+from rl_agent import PolicyAgent, Action
+from checkpointer import BackgroundCheckpointer, delta_log_path, read_delta_log
+import os
+import threading
+
+checkpoint_file = 'test_incremental_checkpoint.pkl'
+delta_file = delta_log_path(checkpoint_file)
+
+
+def cleanup():
+    for path in [checkpoint_file, delta_file, checkpoint_file + '.tmp', delta_file + '.tmp']:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+cleanup()
+
+states = [{'sql_keyword_count': i, 'quote_count': i % 3} for i in range(50)]
+
+print("=" * 60)
+print("TEST 1: Initial Base Checkpoint")
+print("=" * 60)
+
+agent = PolicyAgent(epsilon=0.0, learning_rate=0.5)
+checkpointer = BackgroundCheckpointer(agent, checkpoint_file, interval_s=60.0, compact_every=10)
+checkpointer.start()
+print(f"\nBase exists: {os.path.exists(checkpoint_file)}")
+assert os.path.exists(checkpoint_file)
+
+print("\n" + "=" * 60)
+print("TEST 2: Deltas Contain Only Changed Entries")
+print("=" * 60)
+
+for state in states:
+    agent.update(state, Action.ALLOW, reward=1.0)
+checkpointer.checkpoint()
+
+agent.update(states[0], Action.BLOCK, reward=-1.0)
+agent.update(states[1], Action.BLOCK, reward=-1.0)
+checkpointer.checkpoint()
+
+records = read_delta_log(delta_file)
+print(f"\nDelta records: {len(records)}")
+print(f"Entries per delta: {[len(r['entries']) for r in records]}")
+assert [len(r['entries']) for r in records] == [50, 2]
+print("✓ Second delta only holds the two changed entries")
+
+print("\n" + "=" * 60)
+print("TEST 3: Replay Base + Deltas")
+print("=" * 60)
+
+restored = PolicyAgent()
+restored.load_checkpoint(checkpoint_file)
+match = all(
+    restored.get_q_values(s) == agent.get_q_values(s) for s in states
+)
+print(f"\nQ-values match after replay: {match}")
+print(f"Total updates restored: {restored.total_updates}")
+assert match and restored.total_updates == agent.total_updates
+
+print("\n" + "=" * 60)
+print("TEST 4: Torn Tail Record Is Ignored")
+print("=" * 60)
+
+agent.update(states[2], Action.BLOCK, reward=-1.0)
+checkpointer.checkpoint()
+size = os.path.getsize(delta_file)
+with open(delta_file, 'r+b') as f:
+    f.truncate(size - 5)  # Simulate a crash in the middle of an append
+
+restored = PolicyAgent()
+restored.load_checkpoint(checkpoint_file)
+print(f"\nIntact records after truncation: {len(read_delta_log(delta_file))}")
+print(f"Q(state 2, BLOCK) restored: {restored.get_q_values(states[2])[Action.BLOCK]:+.2f}")
+assert restored.get_q_values(states[1])[Action.BLOCK] == -0.5
+assert restored.get_q_values(states[2])[Action.BLOCK] == 0.0
+print("✓ Loader stops at the torn record and keeps earlier deltas")
+
+print("\n" + "=" * 60)
+print("TEST 5: Compaction and Background Thread")
+print("=" * 60)
+
+checkpointer.compact()
+print(f"\nDelta log size after compaction: {os.path.getsize(delta_file)} bytes")
+assert os.path.getsize(delta_file) == 0
+
+agent.update(states[3], Action.CHALLENGE, reward=0.5)
+checkpointer.request_checkpoint()
+checkpointer.stop()
+
+restored = PolicyAgent()
+restored.load_checkpoint(checkpoint_file)
+print(f"Q(state 3, CHALLENGE) after stop: {restored.get_q_values(states[3])[Action.CHALLENGE]:+.2f}")
+assert restored.get_q_values(states[3]) == agent.get_q_values(states[3])
+print(f"Checkpointer stats: {checkpointer.get_statistics()}")
+
+cleanup()
+
+# Updates from other threads while deltas are taken: every key lands in
+# exactly one delta
+agent = PolicyAgent()
+writers = [threading.Thread(target=lambda w=w: [agent.update({'writer': w, 'i': i}, Action.BLOCK, 1.0)
+                                                for i in range(5000)])
+           for w in range(4)]
+for writer in writers:
+    writer.start()
+popped = []
+while any(writer.is_alive() for writer in writers):
+    popped.append(agent.pop_dirty_entries())
+popped.append(agent.pop_dirty_entries())
+keys = [key for delta in popped for key in delta]
+print(f"\n20000 concurrent updates → {len(popped)} deltas, {len(keys)} entries")
+assert len(keys) == len(set(keys)) == 20000
+print("✓ No update lost between deltas")
+
+print("\n" + "=" * 60)
+print("SUMMARY")
+print("=" * 60)
+print("✓ Base checkpoint published with atomic rename")
+print("✓ Deltas record only changed entries")
+print("✓ load_checkpoint replays base + deltas")
+print("✓ Torn writes are detected and skipped")
+print("✓ Compaction and final flush work")
+print("\n✓ Incremental checkpointing is ready!")
@@ -0,0 +1,138 @@
+"""Test script for config-driven endpoint rules."""
+
+from endpoint_rules import EndpointRules, load_endpoint_rules, ACTION_SEVERITY
+from safety_layer import SafetyLayer
+from rl_agent import Action
+import json
+import os
+import random
+import re
+import time
+
+random.seed(5)
+
+print("=" * 60)
+print("TEST 1: Built-in Rules Match the Former Hard-Coded Patterns")
+print("=" * 60)
+
+old_patterns = [re.compile(p) for p in (r'/admin.*', r'/api/auth.*', r'/health.*', r'/metrics.*')]
+
+
+def old_constraints(action, endpoint):
+    if any(p.match(endpoint) for p in old_patterns) and action == Action.BLOCK:
+        action = Action.CHALLENGE
+    if endpoint == '/health' or endpoint == '/ping':
+        action = Action.ALLOW
+    return action
+
+
+safety = SafetyLayer()
+paths = ['/admin', '/admin/users', '/administrator', '/api/auth/login', '/api/authorize',
+         '/health', '/healthz', '/metrics/cpu', '/ping', '/ping/x', '/api/data', '/', '/static/a.js',
+         '/health?x=1', "/ping?id=1' OR 1=1--", '/ping/', '//ping']
+print()
+for path in paths:
+    for action in Action:
+        assert safety.apply_constraints(action, endpoint=path) == old_constraints(action, path), (path, action)
+    print(f"{path:20s} BLOCK → {safety.apply_constraints(Action.BLOCK, endpoint=path).value}")
+print("✓ Same decisions as the regex list for every action")
+
+# Normalisation closes bypasses the anchored regexes missed
+assert safety.apply_constraints(Action.BLOCK, endpoint='//admin/users') == Action.CHALLENGE
+# ... but never widens a forced ALLOW: only the exact '/health' and '/ping'
+# are forced, variants with a query string or extra slashes are not
+assert safety.apply_constraints(Action.BLOCK, endpoint='/health?check=1') == Action.CHALLENGE
+assert safety.apply_constraints(Action.BLOCK, endpoint="/ping?id=1' OR 1=1--") == Action.BLOCK
+for path in ('/ping/', '//ping', '/ping#x', '/health/'):
+    assert safety.apply_constraints(Action.BLOCK, endpoint=path) != Action.ALLOW, path
+assert safety.apply_constraints(Action.BLOCK, endpoint='/ping') == Action.ALLOW
+print("✓ Forced ALLOW only on the exact /health and /ping")
+
+print("\n" + "=" * 60)
+print("TEST 2: Rules File (max action, force allow, force challenge)")
+print("=" * 60)
+
+safety = SafetyLayer(endpoint_rules_file='endpoint_rules.example.json')
+checks = [
+    ('/api/payments/charge', Action.BLOCK, Action.THROTTLE),
+    ('/api/payments/charge', Action.SANITIZE, Action.SANITIZE),
+    ('/api/payments/webhook', Action.BLOCK, Action.ALLOW),
+    ('/api/payments/webhook/retry', Action.BLOCK, Action.THROTTLE),
+    ('/wp-login.php', Action.ALLOW, Action.CHALLENGE),
+    ('/admin/public/logo', Action.BLOCK, Action.BLOCK),    # child relaxes /admin*
+    ('/admin/users', Action.BLOCK, Action.CHALLENGE),
+    ('/static/app.js', Action.CHALLENGE, Action.LOG_ONLY),
+]
+print()
+for path, action, expected in checks:
+    result = safety.apply_constraints(action, endpoint=path)
+    print(f"{path:30s} {action.value:9s} → {result.value}")
+    assert result == expected, path
+
+allowed = safety.get_allowed_actions(endpoint='/api/search?q=1')
+print(f"Allowed on /api/search: {[a.value for a in allowed]}")
+assert max(ACTION_SEVERITY[a] for a in allowed) == ACTION_SEVERITY[Action.SANITIZE]
+assert safety.get_allowed_actions(endpoint='/wp-login.php') == [Action.CHALLENGE]
+
+for bad in ({'path': '/x'}, {'path': '/x', 'force': 'nuke'},
+            {'path': '/a*/b', 'force': 'allow'}, {'path': '/x', 'max': 'allow'}):
+    try:
+        EndpointRules([bad])
+        raise AssertionError(f"accepted {bad}")
+    except ValueError as e:
+        print(f"✓ Rejected: {e}")
+
+print("\n" + "=" * 60)
+print("TEST 3: Benchmark with a Realistic Rule Set")
+print("=" * 60)
+
+services = [f"svc{i}" for i in range(40)]
+resources = ['users', 'orders', 'invoices', 'reports', 'search', 'export', 'upload', 'settings']
+severities = ['log_only', 'sanitize', 'throttle', 'challenge']
+rules = []
+for service in services:
+    rules.append({'path': f'/api/{service}', 'max_action': random.choice(severities)})
+    for resource in random.sample(resources, 5):
+        rules.append({'path': f'/api/{service}/{resource}', 'max_action': random.choice(severities)})
+    rules.append({'path': f'/api/{service}/health', 'match': 'exact', 'force': 'allow'})
+    rules.append({'path': f'/internal/{service}*', 'force': 'challenge'})
+
+rules_file = 'test_endpoint_rules.json'
+with open(rules_file, 'w') as f:
+    json.dump({'rules': rules}, f)
+compiled = load_endpoint_rules(rules_file)
+os.remove(rules_file)
+print(f"\nRules: {len(compiled)} ({len(rules)} from file + built-ins)")
+
+# The pre-trie approach: one regex per rule, tested one by one
+regex_rules = [re.compile(re.escape(r['path'].rstrip('*')) + ('$' if r.get('match') == 'exact' else ''))
+               for r in rules]
+
+paths = [f"/api/{random.choice(services)}/{random.choice(resources)}/{random.randint(1, 9999)}?page=2"
+         for _ in range(20000)]
+paths += [f"/internal/{random.choice(services)}-v2/status" for _ in range(2000)]
+paths += [f"/static/img/{i}.png" for i in range(2000)]
+
+start = time.perf_counter()
+for path in paths:
+    compiled.resolve(path)
+trie_us = (time.perf_counter() - start) / len(paths) * 1e6
+
+start = time.perf_counter()
+for path in paths[:2000]:
+    [rule for rule, pattern in zip(rules, regex_rules) if pattern.match(path)]
+scan_us = (time.perf_counter() - start) / 2000 * 1e6
+
+print(f"Trie resolve:        {trie_us:7.2f} µs/request")
+print(f"Per-rule regex scan: {scan_us:7.2f} µs/request")
+print(f"Speedup: {scan_us / trie_us:.0f}x")
+assert compiled.resolve('/internal/svc3-v2/status')[1] == Action.CHALLENGE
+assert trie_us * 10 < scan_us
+
+print("\n" + "=" * 60)
+print("SUMMARY")
+print("=" * 60)
+print("✓ Per-route max_action / force rules loaded from JSON")
+print("✓ Most specific rule wins (children can relax or tighten parents)")
+print("✓ Resolution cost grows with path length, not rule count")
+print("\n✓ Endpoint rules are ready!")
@@ -0,0 +1,171 @@
+"""Test script for the batched nftables enforcement backend.
+
+TESTS 1-4 need nothing but Python. TEST 5 runs the real backend inside a
+throwaway network namespace and checks that a blocked source address can no
+longer reach the namespace's loopback; it needs root, `ip` and `nft` and is
+skipped otherwise.
+"""
+
+from enforcement_backend import NftablesBackend, DryRunBackend, nft_elements_script
+from action_executor import ActionExecutor
+from rl_agent import Action
+from contextlib import contextmanager
+import os
+import shutil
+import subprocess
+import threading
+import time
+
+print("=" * 60)
+print("TEST 1: Script Rendering")
+print("=" * 60)
+
+script = nft_elements_script([(4, '203.0.113.7', 600), (6, '2001:db8::1', 60), (4, '198.51.100.1', 600)])
+print(f"\n{script}")
+assert script == ("add element inet waf blocked_v4 { 203.0.113.7 timeout 600s, 198.51.100.1 timeout 600s }\n"
+                  "add element inet waf blocked_v6 { 2001:db8::1 timeout 60s }\n")
+assert nft_elements_script([]) == ''
+
+print("=" * 60)
+print("TEST 2: Batching and Deduplication")
+print("=" * 60)
+
+backend = DryRunBackend(timeout_s=300, batch_size=100)
+backend.setup()
+for i in range(250):
+    assert backend.block(f"198.51.100.{i}", now=0.0)
+assert backend.block('198.51.100.1', now=0.0)           # already pending
+assert backend.block('::ffff:198.51.100.2', now=0.0)    # IPv4-mapped duplicate
+assert not backend.block('not-an-ip', now=0.0)
+assert backend.flush(now=0.0) == 250
+assert backend.block('198.51.100.3', now=100.0)         # still in the kernel set
+assert backend.flush(now=100.0) == 0
+assert backend.block('198.51.100.3', now=301.0)         # element expired: push again
+assert backend.flush(now=301.0) == 1
+
+stats = backend.get_statistics()
+print(f"\nStatistics: {stats}")
+print(f"Scripts rendered: {len(backend.scripts)} (1 ruleset + {stats['batches']} batches)")
+assert stats['batches'] == 4 and stats['pushed'] == 251
+assert stats['duplicates'] == 3 and stats['invalid'] == 1
+assert 'flags timeout' in backend.scripts[0]
+assert backend.scripts[1].count('timeout 300s') == 100
+
+bounded = DryRunBackend(max_pending=10)
+accepted = sum(bounded.block(f"192.0.2.{i}") for i in range(20))
+assert accepted == 10 and bounded.get_statistics()['dropped'] == 10
+print("✓ Pending blocks bounded by max_pending")
+
+print("\n" + "=" * 60)
+print("TEST 3: BLOCK Through the Executor")
+print("=" * 60)
+
+backend = DryRunBackend()
+executor = ActionExecutor(block_backend=backend)
+result = executor.execute(Action.BLOCK, {'request': '/login', 'origin': '203.0.113.50'})
+print(f"\nMetadata: {result['metadata']}")
+assert not result['allowed'] and result['metadata']['kernel_block']
+backend.flush()
+assert '203.0.113.50 timeout 600s' in backend.scripts[-1]
+assert executor.get_statistics()['block_backend']['pushed'] == 1
+assert 'kernel_block' not in ActionExecutor().execute(Action.BLOCK, {'origin': '203.0.113.50'})['metadata']
+print("✓ Blocked origin reaches the backend")
+
+# An exploratory BLOCK rejects the request but leaves the origin alone
+result = executor.execute(Action.BLOCK, {'request': '/login', 'origin': '203.0.113.51'},
+                          kernel_block=False)
+print(f"Exploratory BLOCK metadata: {result['metadata']}")
+assert not result['allowed'] and 'kernel_block' not in result['metadata']
+assert backend.flush() == 0 and executor.get_statistics()['block_backend']['pushed'] == 1
+print("✓ Exploratory BLOCK is not pushed to the firewall")
+
+print("\n" + "=" * 60)
+print("TEST 4: Throughput With a Real Process per Batch")
+print("=" * 60)
+
+# A stand-in for nft that reads the script and exits, so every batch pays
+# for a real fork/exec just like `nft -f -`
+backend = NftablesBackend(batch_size=1024, flush_interval_s=0.05,
+                          command=['sh', '-c', 'cat > /dev/null', 'nft'])
+backend.start()
+updates_per_thread = 25000
+
+
+def block_many(offset):
+    for i in range(updates_per_thread):
+        n = offset + i
+        backend.block(f"10.{n >> 16 & 255}.{n >> 8 & 255}.{n & 255}")
+
+
+threads = [threading.Thread(target=block_many, args=(t * updates_per_thread,)) for t in range(4)]
+start = time.perf_counter()
+for thread in threads:
+    thread.start()
+for thread in threads:
+    thread.join()
+queued = time.perf_counter() - start
+backend.stop()
+elapsed = time.perf_counter() - start
+
+stats = backend.get_statistics()
+total = 4 * updates_per_thread
+print(f"\n{total} block updates from 4 threads")
+print(f"block() rate: {total / queued:,.0f} updates/s")
+print(f"End-to-end (all pushed): {total / elapsed:,.0f} updates/s")
+print(f"Processes started: {stats['batches']} ({total / stats['batches']:.0f} updates per process)")
+assert stats['pushed'] == total and stats['errors'] == 0
+assert total / elapsed > 5000
+assert stats['batches'] < total / 100
+
+print("\n" + "=" * 60)
+print("TEST 5: Network Namespace Harness")
+print("=" * 60)
+
+
+@contextmanager
+def network_namespace(name):
+    """Create a network namespace with loopback up, delete it afterwards."""
+    subprocess.run(['ip', 'netns', 'add', name], check=True)
+    try:
+        subprocess.run(['ip', 'netns', 'exec', name, 'ip', 'link', 'set', 'lo', 'up'], check=True)
+        yield ['ip', 'netns', 'exec', name]
+    finally:
+        subprocess.run(['ip', 'netns', 'delete', name])
+
+
+def reachable(prefix, source):
+    """Ping the namespace's 127.0.0.1 from a loopback source address."""
+    return subprocess.run(prefix + ['ping', '-c', '1', '-W', '1', '-I', source, '127.0.0.1'],
+                          capture_output=True).returncode == 0
+
+
+if os.geteuid() != 0 or not all(shutil.which(tool) for tool in ('ip', 'nft', 'ping')):
+    print("\nSkipped: needs root, ip, nft and ping")
+else:
+    with network_namespace(f"waf-test-{os.getpid()}") as prefix:
+        backend = NftablesBackend(timeout_s=30, command=prefix + ['nft'])
+        backend.setup()
+        backend.start()
+        assert reachable(prefix, '127.0.0.5')
+        backend.block('127.0.0.5')
+        for i in range(2000):
+            backend.block(f"198.18.{i >> 8}.{i & 255}")
+        backend.stop()
+
+        listing = subprocess.run(prefix + ['nft', 'list', 'set', 'inet', 'waf', 'blocked_v4'],
+                                 capture_output=True, text=True, check=True).stdout
+        print(f"\nElements in kernel set: {listing.count('expires')}")
+        print(f"127.0.0.5 reachable: {reachable(prefix, '127.0.0.5')}")
+        print(f"127.0.0.6 reachable: {reachable(prefix, '127.0.0.6')}")
+        assert listing.count('expires') == 2001
+        assert not reachable(prefix, '127.0.0.5') and reachable(prefix, '127.0.0.6')
+        backend.teardown()
+        print("✓ Blocked source dropped by the kernel, others unaffected")
+
+print("\n" + "=" * 60)
+print("SUMMARY")
+print("=" * 60)
+print("✓ BLOCK decisions queued without blocking the packet path")
+print("✓ One nft transaction per batch, with per-element timeouts")
+print("✓ Origins already in the set are not pushed again")
+print("\n✓ Enforcement backend is ready!")
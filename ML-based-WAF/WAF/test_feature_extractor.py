@@ -2,6 +2,7 @@
 
 from feature_extractor import FeatureExtractor
 from request import Request
+import math
 
 # Test 1: Benign request
 print("=" * 60)
@@ -54,6 +55,31 @@ print("\nFeatures:")
 for k, v in features4.items():
     print(f"  {k}: {v}")
 
+# Test 5: Single-pass statistics against per-feature reference implementations
+print("\n" + "=" * 60)
+print("TEST 5: Character Statistics")
+print("=" * 60)
+
+
+def reference_statistics(text):
+    """One pass over the text per statistic."""
+    length = len(text)
+    return {
+        'entropy': -sum(text.count(c) / length * math.log2(text.count(c) / length) for c in set(text)),
+        'special_char_ratio': sum(1 for c in text if not c.isalnum() and not c.isspace()) / length,
+        'digit_ratio': sum(1 for c in text if c.isdigit()) / length,
+        'uppercase_ratio': sum(1 for c in text if c.isupper()) / length
+    }
+
+
+texts = ["/api/user?id=1", "admin' OR '1'='1' --", "<SCRIPT>alert(document.cookie)</SCRIPT>",
+         "ÄÖÜ ß ２３ 𝟘 café=1;", "x"]
+for text in texts:
+    computed = fe._text_features(text)
+    for name, expected in reference_statistics(text).items():
+        assert abs(computed[name] - expected) < 1e-12, (text, name)
+print(f"\n{len(texts)} texts: entropy and character ratios match the reference")
+
 print("\n" + "=" * 60)
 print("SUMMARY")
 print("=" * 60)
@@ -0,0 +1,107 @@
+"""Test script for the hierarchical per-route/per-host agent."""
+
+from hierarchical_agent import HierarchicalPolicyAgent, route_cluster, add_context
+from rl_agent import Action
+import os
+import random
+
+attack = {'sql_keyword_count': 3, 'quote_count': 2}
+
+
+def state(route, host):
+    return add_context(dict(attack), route, host)
+
+
+print("=" * 60)
+print("TEST 1: Route Clusters")
+print("=" * 60)
+
+examples = {
+    '/api/user/42/orders?x=1': '/api/user',
+    '/api/auth/token': '/api/auth',
+    '/static/app.js': '/static/app.js',
+    '/files/3f2a9c0d4e5b6a7c/download': '/files/:id',
+    '/': '/',
+}
+print()
+for path, expected in examples.items():
+    print(f"{path:35s} → {route_cluster(path)}")
+    assert route_cluster(path) == expected
+
+print("\n" + "=" * 60)
+print("TEST 2: New Hosts Back Off to the Route Policy")
+print("=" * 60)
+
+agent = HierarchicalPolicyAgent(epsilon=0.0, learning_rate=0.5)
+for _ in range(50):
+    agent.update(state('/api/user/1', 'shop.example'), Action.BLOCK, 1.0)
+    agent.update(state('/api/user/1', 'shop.example'), Action.ALLOW, -1.5)
+
+new_host = state('/api/user/7', 'blog.example')
+print(f"\nKnown host decision: {agent.select_action(state('/api/user/1', 'shop.example')).value}")
+print(f"Unseen host, same route: {agent.select_action(new_host).value}")
+print(f"Unseen host and route: {agent.select_action(state('/search', 'blog.example')).value}")
+assert agent.select_action(new_host) == Action.BLOCK
+assert agent.select_action(state('/search', 'blog.example')) == Action.BLOCK
+print("✓ Coarser levels share statistics with sparse states")
+
+print("\n" + "=" * 60)
+print("TEST 3: Routes Learn Their Own Policy")
+print("=" * 60)
+
+agent = HierarchicalPolicyAgent(epsilon=0.0, learning_rate=0.5, backoff_strength=2.0)
+for _ in range(200):
+    # Blocking on the auth API locks users out; challenges work better there
+    agent.update(state('/api/auth/login', 'shop.example'), Action.BLOCK, -1.0)
+    agent.update(state('/api/auth/login', 'shop.example'), Action.CHALLENGE, 1.0)
+    agent.update(state('/products', 'shop.example'), Action.BLOCK, 1.0)
+    agent.update(state('/products', 'shop.example'), Action.CHALLENGE, 0.2)
+
+auth = agent.select_action(state('/api/auth/login', 'other.example'))
+products = agent.select_action(state('/products', 'other.example'))
+print(f"\n/api/auth → {auth.value}, /products → {products.value}")
+assert auth == Action.CHALLENGE and products == Action.BLOCK
+
+random.seed(5)
+agent.set_epsilon(1.0)
+drawn = [agent.select_action(state('/products', 'other.example')) for _ in range(1000)]
+changed = sum(action != Action.BLOCK for action in drawn)
+print(f"epsilon=1.0: {changed} of 1000 draws differ from BLOCK, "
+      f"exploration_count {agent.exploration_count}")
+assert agent.exploration_count == changed
+print("✓ Only draws that changed the greedy choice count as exploration")
+
+print("\n" + "=" * 60)
+print("TEST 4: Per-Level LRU Budget")
+print("=" * 60)
+
+agent = HierarchicalPolicyAgent(max_entries={'route': 50, 'host': 100})
+for i in range(5000):
+    agent.update(state(f'/tenant{i % 200}/page', f'host{i}.example'), Action.ALLOW, 0.5)
+stats = agent.get_statistics()
+print(f"\nLevel sizes: {stats['level_sizes']}")
+print(f"Evictions: {stats['evictions']}")
+assert stats['level_sizes'] == {'global': 1, 'route': 50, 'host': 100}
+assert stats['evictions']['host'] == 4900
+
+print("\n" + "=" * 60)
+print("TEST 5: Checkpoint Round Trip")
+print("=" * 60)
+
+checkpoint_file = 'test_hierarchical_checkpoint.pkl'
+agent.save_checkpoint(checkpoint_file)
+restored = HierarchicalPolicyAgent()
+assert restored.load_checkpoint(checkpoint_file)
+probe = state('/tenant199/page', 'host4999.example')
+print(f"\nQ-values match after reload: {restored.get_q_values(probe) == agent.get_q_values(probe)}")
+assert restored.get_q_values(probe) == agent.get_q_values(probe)
+assert restored.get_statistics()['level_sizes'] == stats['level_sizes']
+os.remove(checkpoint_file)
+
+print("\n" + "=" * 60)
+print("SUMMARY")
+print("=" * 60)
+print("✓ State includes route cluster and host")
+print("✓ Sparse host/route states back off to coarser levels")
+print("✓ Memory bounded by per-level LRU budgets")
+print("\n✓ Hierarchical agent is ready!")
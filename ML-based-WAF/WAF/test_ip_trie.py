@@ -0,0 +1,156 @@
+"""Test script for CIDR prefix-trie IP classification."""
+
+from ip_trie import CIDRTrie, load_ip_rules, parse_ip, ALLOW, DENY
+from safety_layer import SafetyLayer
+from rl_agent import Action
+import ipaddress
+import json
+import os
+import random
+import time
+
+random.seed(11)
+
+print("=" * 60)
+print("TEST 1: Default Internal Networks")
+print("=" * 60)
+
+safety = SafetyLayer()
+cases = {
+    '10.1.2.3': True,
+    '172.16.0.1': True,
+    '172.31.255.255': True,
+    '172.32.0.1': False,
+    '192.168.1.1': True,
+    '127.0.0.1': True,
+    '8.8.8.8': False,
+    '::1': True,
+    '0:0:0:0:0:0:0:1': True,      # long form of ::1
+    'FE80::1': True,              # upper case
+    'fe90::1': True,              # still inside fe80::/10
+    'fe80::1%eth0': True,         # zone index
+    '::ffff:10.0.0.1': True,      # IPv4-mapped
+    '2001:4860::8888': False,
+    'not-an-ip': False,
+    '10.0.0.256': False,
+}
+print()
+for ip, expected in cases.items():
+    result = safety._is_internal_ip(ip)
+    print(f"{ip:20s} internal={result}")
+    assert result == expected, ip
+print("✓ Regex edge cases (IPv6 forms, mapped addresses) handled")
+
+print("\n" + "=" * 60)
+print("TEST 2: Allow/Deny Rules File with Longest-Prefix Match")
+print("=" * 60)
+
+rules_file = 'test_ip_rules.json'
+with open(rules_file, 'w') as f:
+    json.dump({
+        'allow': ['100.64.0.0/10', '10.66.6.0/24'],
+        'deny': ['10.66.0.0/16']
+    }, f)
+
+safety = SafetyLayer(ip_rules_file=rules_file)
+print()
+for ip in ('100.64.1.1', '10.1.1.1', '10.66.1.1', '10.66.6.6'):
+    print(f"{ip:12s} → {safety.ip_rules.lookup(ip)}")
+assert safety.ip_rules.lookup('10.66.1.1') == DENY
+assert safety.ip_rules.lookup('10.66.6.6') == ALLOW
+
+blocked = safety.apply_constraints(Action.BLOCK, endpoint='/api/data', origin='10.66.1.1')
+softened = safety.apply_constraints(Action.BLOCK, endpoint='/api/data', origin='10.1.1.1')
+print(f"BLOCK from denied 10.66.1.1 → {blocked.value}")
+print(f"BLOCK from internal 10.1.1.1 → {softened.value}")
+assert blocked == Action.BLOCK and softened == Action.CHALLENGE
+os.remove(rules_file)
+
+trie = load_ip_rules('ip_rules.example.json')
+print(f"Example rules file: {len(trie)} ranges")
+
+print("\n" + "=" * 60)
+print("TEST 3: Agreement with Brute-Force Matching")
+print("=" * 60)
+
+
+def random_cidr():
+    if random.random() < 0.7:
+        prefix = random.randint(8, 32)
+        address = ipaddress.IPv4Address(random.getrandbits(32))
+    else:
+        prefix = random.randint(16, 64)
+        address = ipaddress.IPv6Address(random.getrandbits(128))
+    return str(ipaddress.ip_network(f"{address}/{prefix}", strict=False))
+
+
+def random_ip(networks):
+    """Mostly addresses inside known ranges, some random ones."""
+    if random.random() < 0.8:
+        network = ipaddress.ip_network(random.choice(networks))
+        offset = random.getrandbits(network.max_prefixlen - network.prefixlen)
+        return str(network.network_address + offset)
+    return str(ipaddress.IPv4Address(random.getrandbits(32)))
+
+
+cidrs = [random_cidr() for _ in range(10000)]
+rules = {cidr: random.choice([ALLOW, DENY]) for cidr in cidrs}
+trie = CIDRTrie()
+start = time.perf_counter()
+for cidr, value in rules.items():
+    trie.insert(cidr, value)
+build_time = time.perf_counter() - start
+
+networks = [(ipaddress.ip_network(c), v) for c, v in rules.items()]
+
+
+def brute_force(ip):
+    address = ipaddress.ip_address(ip)
+    best, best_len = None, -1
+    for network, value in networks:
+        if address.version == network.version and address in network and network.prefixlen > best_len:
+            best, best_len = value, network.prefixlen
+    return best
+
+
+probes = [random_ip(cidrs) for _ in range(300)]
+mismatches = sum(trie.lookup(ip) != brute_force(ip) for ip in probes)
+print(f"\nRanges loaded: {len(trie)} in {build_time * 1000:.1f} ms")
+print(f"Mismatches vs brute force on {len(probes)} addresses: {mismatches}")
+assert mismatches == 0
+
+print("\n" + "=" * 60)
+print("TEST 4: Benchmark at 10k Ranges")
+print("=" * 60)
+
+queries = [random_ip(cidrs) for _ in range(50000)]
+start = time.perf_counter()
+for ip in queries:
+    trie.lookup(ip)
+trie_us = (time.perf_counter() - start) / len(queries) * 1e6
+
+start = time.perf_counter()
+for ip in queries[:200]:
+    brute_force(ip)
+scan_us = (time.perf_counter() - start) / 200 * 1e6
+
+v6_queries = [q for q in queries if ':' in q]
+start = time.perf_counter()
+for ip in v6_queries:
+    trie.lookup(ip)
+v6_us = (time.perf_counter() - start) / max(len(v6_queries), 1) * 1e6
+
+print(f"\nTrie lookup:        {trie_us:8.2f} µs/address (IPv6 only: {v6_us:.2f} µs)")
+print(f"Linear range scan:  {scan_us:8.2f} µs/address")
+print(f"Speedup: {scan_us / trie_us:,.0f}x")
+assert trie_us * 50 < scan_us
+
+print(f"\nparse_ip('::ffff:192.0.2.1') = {parse_ip('::ffff:192.0.2.1')}")
+
+print("\n" + "=" * 60)
+print("SUMMARY")
+print("=" * 60)
+print("✓ IPv4 and IPv6 CIDRs in one longest-prefix trie")
+print("✓ Allow/deny ranges loaded from a JSON rules file")
+print("✓ Lookup cost bounded by prefix length, not range count")
+print("\n✓ CIDR classification is ready!")
@@ -0,0 +1,174 @@
+"""Test script for linear contextual bandit agent."""
+
+from linear_agent import LinearBanditAgent
+from rl_agent import Action
+import numpy as np
+import os
+import threading
+
+print("=" * 60)
+print("TEST 1: Basic Action Selection")
+print("=" * 60)
+
+agent = LinearBanditAgent(algorithm='linucb', alpha=1.0)
+
+benign_state = {
+    'sql_keyword_count': 0,
+    'quote_count': 0,
+    'length': 20,
+    'entropy': 3.5
+}
+
+attack_state = {
+    'sql_keyword_count': 3,
+    'quote_count': 4,
+    'comment_pattern_count': 1,
+    'length': 50,
+    'entropy': 4.2
+}
+
+# Similar to attack_state but never seen during training
+similar_attack_state = {
+    'sql_keyword_count': 4,
+    'quote_count': 6,
+    'comment_pattern_count': 1,
+    'length': 64,
+    'entropy': 4.4
+}
+
+print(f"\nContext dimension: {agent.dimension}")
+action = agent.select_action(benign_state)
+print(f"Selected action for benign request: {action.value}")
+
+print("\n" + "=" * 60)
+print("TEST 2: Online Learning")
+print("=" * 60)
+
+for i in range(30):
+    agent.update(attack_state, Action.BLOCK, reward=1.0)
+    agent.update(attack_state, Action.ALLOW, reward=-1.5)
+    agent.update(benign_state, Action.ALLOW, reward=0.5)
+    agent.update(benign_state, Action.BLOCK, reward=-2.0)
+
+print("\nPredicted rewards for BENIGN request:")
+for action, value in agent.get_q_values(benign_state).items():
+    print(f"  {action.value:12s}: {value:+.4f}")
+
+print("\nPredicted rewards for ATTACK request:")
+for action, value in agent.get_q_values(attack_state).items():
+    print(f"  {action.value:12s}: {value:+.4f}")
+
+print("\n" + "=" * 60)
+print("TEST 3: Generalization to Unseen Similar Requests")
+print("=" * 60)
+
+agent.set_epsilon(0.0)  # No exploration bonus
+benign_action = agent.select_action(benign_state)
+attack_action = agent.select_action(similar_attack_state)
+print(f"\nBenign request → {benign_action.value}")
+print(f"Unseen attack-like request → {attack_action.value}")
+assert benign_action == Action.ALLOW
+assert attack_action == Action.BLOCK
+print("✓ Learned behaviour transfers to unseen feature combinations")
+
+print("\n" + "=" * 60)
+print("TEST 4: Rank-one Update Matches Direct Inverse")
+print("=" * 60)
+
+i = agent.action_index[Action.BLOCK]
+x_attack = agent._state_to_context(attack_state)
+x_benign = agent._state_to_context(benign_state)
+direct = np.linalg.inv(
+    np.eye(agent.dimension) * agent.regularization
+    + 30 * np.outer(x_attack, x_attack)
+    + 30 * np.outer(x_benign, x_benign)
+)
+error = np.max(np.abs(direct - agent.a_inv[i]))
+print(f"\nMax abs difference vs np.linalg.inv: {error:.2e}")
+assert error < 1e-8
+print("✓ Sherman-Morrison updates are exact")
+
+# Concurrent updates (teacher workers, response joins) while selecting actions
+threaded = LinearBanditAgent(algorithm='linucb')
+contexts = [{'sql_keyword_count': w, 'length': 10 * w + 5} for w in range(4)]
+workers = [threading.Thread(target=lambda s=s: [threaded.update(s, Action.BLOCK, 1.0) for _ in range(500)])
+           for s in contexts]
+for worker in workers:
+    worker.start()
+while any(worker.is_alive() for worker in workers):
+    threaded.select_action(attack_state)
+direct = np.linalg.inv(
+    np.eye(threaded.dimension) * threaded.regularization
+    + sum(500 * np.outer(x, x) for x in map(threaded._state_to_context, contexts))
+)
+i = threaded.action_index[Action.BLOCK]
+error = np.max(np.abs(direct - threaded.a_inv[i]) / np.abs(direct).max())
+print(f"4 threads x 500 updates: relative difference vs np.linalg.inv {error:.2e}, "
+      f"updates {threaded.total_updates}")
+assert error < 1e-6 and threaded.total_updates == 2000
+print("✓ Updates from several threads are serialized")
+
+print("\n" + "=" * 60)
+print("TEST 5: Thompson Sampling")
+print("=" * 60)
+
+ts_agent = LinearBanditAgent(algorithm='thompson', alpha=0.5, seed=7)
+for i in range(30):
+    ts_agent.update(attack_state, Action.BLOCK, reward=1.0)
+    ts_agent.update(attack_state, Action.ALLOW, reward=-1.5)
+
+actions = [ts_agent.select_action(attack_state).value for _ in range(20)]
+print(f"\nActions on attack request: {actions}")
+print(f"Most common: {max(set(actions), key=actions.count)}")
+
+# Propensities are computed without sampling; compare with sampling the policy
+ts_agent.update(benign_state, Action.ALLOW, reward=0.2)
+ts_agent.update(benign_state, Action.LOG_ONLY, reward=0.1)
+sampler = np.random.default_rng(3)
+for state in (attack_state, benign_state, similar_attack_state):
+    means, widths = ts_agent._estimate(ts_agent._state_to_context(state))
+    draws = means + ts_agent.alpha * widths * sampler.standard_normal((200000, len(ts_agent.actions)))
+    sampled = np.bincount(np.argmax(draws, axis=1), minlength=len(ts_agent.actions)) / len(draws)
+    exact = ts_agent.get_action_probabilities(state)
+    error = max(abs(exact[a] - sampled[i]) for i, a in enumerate(ts_agent.actions))
+    print(f"P(block) computed {exact[Action.BLOCK]:.4f}, "
+          f"sampled {sampled[ts_agent.actions.index(Action.BLOCK)]:.4f}, max error {error:.4f}")
+    assert error < 0.005
+
+names = ['sql_keyword_count', 'quote_count', 'comment_pattern_count', 'length', 'entropy']
+states = [attack_state, benign_state, similar_attack_state]
+batch = ts_agent.get_action_probabilities_batch(
+    np.array([[state.get(name, 0) for name in names] for state in states]), names)
+for row, state in zip(batch, states):
+    single = ts_agent.get_action_probabilities(state)
+    assert np.allclose(row, [single[a] for a in ts_agent.actions])
+print("✓ Computed propensities match sampling; batch matches single calls")
+
+print("\n" + "=" * 60)
+print("TEST 6: Checkpoint Save/Load")
+print("=" * 60)
+
+checkpoint_file = 'test_linear_checkpoint.pkl'
+agent.save_checkpoint(checkpoint_file)
+new_agent = LinearBanditAgent()
+loaded = new_agent.load_checkpoint(checkpoint_file)
+print(f"\n✓ Loaded checkpoint: {loaded}")
+
+old_q = agent.get_q_values(attack_state)
+new_q = new_agent.get_q_values(attack_state)
+match = all(abs(old_q[a] - new_q[a]) < 1e-9 for a in Action)
+print(f"Predictions match: {match}")
+assert match
+
+os.remove(checkpoint_file)
+print("✓ Cleaned up test checkpoint")
+
+print("\n" + "=" * 60)
+print("SUMMARY")
+print("=" * 60)
+print("✓ LinUCB and linear Thompson sampling select actions")
+print("✓ Thompson propensities computed without sampling")
+print("✓ Rank-one updates keep A^-1 exact with O(d^2) cost")
+print("✓ Learning generalizes across similar requests")
+print("✓ Checkpoint save/load works")
+print("\n✓ Linear bandit agent is ready for integration!")
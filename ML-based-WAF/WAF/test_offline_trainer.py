@@ -0,0 +1,114 @@
+"""Test script for the offline trainer."""
+
+from offline_trainer import (
+    OfflineTrainer, iter_log_requests, iter_dataset_requests, label_from_threats
+)
+from feature_extractor import FeatureExtractor
+from rl_agent import PolicyAgent, Action
+from request import Request
+import numpy as np
+import json
+import os
+import shutil
+import sqlite3
+import time
+
+db_file = 'test_offline.db'
+log_dir = 'test_offline_log'
+checkpoint_file = 'test_offline_checkpoint.pkl'
+dataset_file = '../Dataset/HTTPParams_clean.json'
+
+print("=" * 60)
+print("TEST 1: Batch Features Match extract_features")
+print("=" * 60)
+
+extractor = FeatureExtractor()
+with open(dataset_file) as f:
+    patterns = [r['pattern'] for r in json.load(f)[::50]]
+reqs = [Request(request=p, method='POST' if i % 2 else 'GET', body=p if i % 3 == 0 else None,
+                headers={'Cookie': 'session=1'} if i % 5 == 0 else {})
+        for i, p in enumerate(patterns)]
+matrix = extractor.extract_features_batch(reqs)
+expected = np.array([extractor.to_vector(extractor.extract_features(r)) for r in reqs])
+print(f"\nRequests compared: {len(reqs)}")
+print(f"Identical values: {np.array_equal(matrix, expected)}")
+assert np.array_equal(matrix, expected)
+
+print("\n" + "=" * 60)
+print("TEST 2: Training from the Log Database")
+print("=" * 60)
+
+for path in (db_file, checkpoint_file):
+    if os.path.exists(path):
+        os.remove(path)
+shutil.rmtree(log_dir, ignore_errors=True)
+os.makedirs(log_dir)
+
+conn = sqlite3.connect(db_file)
+conn.execute("CREATE TABLE logs (id INTEGER PRIMARY KEY, timestamp, origin, host, method)")
+conn.execute("CREATE TABLE threats (log_id, threat_type, location)")
+logged = [
+    ("/api/user?id=1' UNION SELECT password FROM users--", 'sqli'),
+    ("/api/user?id=2", 'valid'),
+    ("/api/user?id=3", None),  # RL-only row, no classifier verdict
+] * 100
+for i, (path, verdict) in enumerate(logged, start=1):
+    conn.execute("INSERT INTO logs VALUES (?, '', '127.0.0.1', 'localhost', 'GET')", (i,))
+    conn.execute("INSERT INTO threats VALUES (?, ?, ?)",
+                 (i, verdict or 'rl_action', 'Request' if verdict else 'allow'))
+    with open(os.path.join(log_dir, f'{i}.json'), 'w') as f:
+        json.dump({'request': path, 'User_Agent': 'python-requests'}, f)
+conn.commit()
+conn.close()
+
+print(f"\nLabel for ['sqli', 'valid']: {label_from_threats(['sqli', 'valid'])}")
+print(f"Label for ['rl_action']: {label_from_threats(['rl_action'])}")
+
+agent = PolicyAgent(epsilon=0.0, learning_rate=0.1)
+trainer = OfflineTrainer(agent)
+stats = trainer.train(iter_log_requests(db_file, log_dir, chunk_size=64))
+print(f"Requests trained: {stats['requests_trained']} (unlabelled rows skipped)")
+assert stats['requests_trained'] == 200
+
+attack = extractor.extract_features(Request(
+    request=logged[0][0], method='GET', headers={'User_Agent': 'python-requests'}))
+benign = extractor.extract_features(Request(
+    request=logged[1][0], method='GET', headers={'User_Agent': 'python-requests'}))
+print(f"Attack state → {agent.select_action(attack).value}")
+print(f"Benign state → {agent.select_action(benign).value}")
+assert agent.select_action(attack) in (Action.BLOCK, Action.CHALLENGE)
+assert agent.select_action(benign) in (Action.ALLOW, Action.LOG_ONLY)
+
+agent.save_checkpoint(checkpoint_file)
+restored = PolicyAgent(epsilon=0.0)
+assert restored.load_checkpoint(checkpoint_file)
+assert restored.get_q_values(attack) == agent.get_q_values(attack)
+print("✓ Checkpoint loads in a fresh PolicyAgent (as in sniffing_rl.py)")
+
+os.remove(db_file)
+os.remove(checkpoint_file)
+shutil.rmtree(log_dir)
+
+print("\n" + "=" * 60)
+print("TEST 3: Throughput on a Labelled Dataset")
+print("=" * 60)
+
+agent = PolicyAgent(epsilon=0.0, learning_rate=0.05)
+trainer = OfflineTrainer(agent)
+start = time.perf_counter()
+stats = trainer.train(iter_dataset_requests(dataset_file, chunk_size=10000))
+elapsed = time.perf_counter() - start
+print(f"\nRequests: {stats['requests_trained']} in {elapsed:.2f}s")
+print(f"Feature extraction: {stats['extract_time_s']:.2f}s")
+print(f"Updates: {stats['updates_applied']} in {stats['update_time_s']:.2f}s "
+      f"({stats['updates_per_second']:,.0f} updates/s)")
+assert stats['updates_per_second'] > 100000
+
+print("\n" + "=" * 60)
+print("SUMMARY")
+print("=" * 60)
+print("✓ Requests streamed in chunks from log.db and datasets")
+print("✓ Batch feature extraction identical to the live path")
+print("✓ Labels turned into rewards for every action")
+print("✓ Output checkpoint loads in sniffing_rl.py")
+print("\n✓ Offline trainer is ready!")
@@ -0,0 +1,164 @@
+"""Test script for offline policy evaluation."""
+
+from policy_evaluation import (
+    DecisionLogger, load_decisions, OfflinePolicyEvaluator,
+    policy_action_probabilities, fit_reward_model, FEATURE_NAMES, DECISION_DTYPE
+)
+from rl_agent import PolicyAgent, Action, ACTIONS
+from linear_agent import LinearBanditAgent
+import numpy as np
+import os
+import time
+
+rng = np.random.default_rng(42)
+n_actions = len(ACTIONS)
+BLOCK = ACTIONS.index(Action.BLOCK)
+ALLOW = ACTIONS.index(Action.ALLOW)
+
+
+def simulate(n):
+    """Logged traffic from a uniform-random logging policy."""
+    features = np.zeros((n, len(FEATURE_NAMES)))
+    is_attack = rng.random(n) < 0.3
+    features[:, 0] = np.where(is_attack, rng.integers(1, 5, n), 0)  # sql_keyword_count
+    features[:, 6] = rng.integers(5, 200, n)                        # length
+    actions = rng.integers(0, n_actions, n)
+    # Expected reward: +1 for BLOCK on attacks / ALLOW on benign, -1 otherwise
+    correct = np.where(is_attack, actions == BLOCK, actions == ALLOW)
+    rewards = np.where(correct, 1.0, -1.0) + rng.normal(0, 0.1, n)
+    propensities = np.full(n, 1.0 / n_actions)
+    return features, is_attack, actions, rewards, propensities
+
+
+def oracle_probabilities(features):
+    """Candidate: BLOCK when SQL keywords are present, otherwise ALLOW."""
+    probabilities = np.zeros((len(features), n_actions))
+    attack = features[:, 0] > 0
+    probabilities[attack, BLOCK] = 1.0
+    probabilities[~attack, ALLOW] = 1.0
+    return probabilities
+
+
+print("=" * 60)
+print("TEST 1: Estimates Recover the True Policy Value")
+print("=" * 60)
+
+features, is_attack, actions, rewards, propensities = simulate(200000)
+evaluator = OfflinePolicyEvaluator(confidence=0.95)
+predictions = fit_reward_model(features, actions, rewards)
+results = evaluator.evaluate(actions, rewards, propensities,
+                             oracle_probabilities(features), predictions)
+
+print(f"\nTrue value of candidate: +1.0000")
+print(f"Logged (random) policy value: {results['logged_policy_value']:+.4f}")
+for name in ('ips', 'snips', 'dr'):
+    r = results[name]
+    print(f"{name.upper():6s} {r['estimate']:+.4f}  95% CI [{r['ci_low']:+.4f}, {r['ci_high']:+.4f}]")
+    assert r['ci_low'] - 0.02 < 1.0 < r['ci_high'] + 0.02
+assert results['dr']['std_error'] < results['ips']['std_error']
+print("✓ All estimators cover the true value; DR has the tightest interval")
+
+print("\n" + "=" * 60)
+print("TEST 2: Decision Log Round Trip")
+print("=" * 60)
+
+log_file = 'test_decisions.log'
+if os.path.exists(log_file):
+    os.remove(log_file)
+
+logger = DecisionLogger(log_file, flush_every=64)
+for i in range(100):
+    state = {'sql_keyword_count': i % 2, 'length': 10 + i}
+    logger.log(state, Action.BLOCK if i % 2 else Action.ALLOW, 1.0, 0.5, timestamp=float(i))
+logger.close()
+
+# Simulate a torn final record
+with open(log_file, 'ab') as f:
+    f.write(b'\x00' * 7)
+
+decisions = load_decisions(log_file)
+print(f"\nRecords loaded: {len(decisions)}")
+print(f"First record: action={ACTIONS[decisions[0]['action']].value}, "
+      f"length={decisions[0]['features'][FEATURE_NAMES.index('length')]:.0f}, "
+      f"propensity={decisions[0]['propensity']}")
+assert len(decisions) == 100
+os.remove(log_file)
+
+print("\n" + "=" * 60)
+print("TEST 3: Evaluating a Tabular Agent")
+print("=" * 60)
+
+agent = PolicyAgent(epsilon=0.0)
+attack_state = dict(zip(FEATURE_NAMES, [1] + [0] * (len(FEATURE_NAMES) - 1)))
+agent.update(attack_state, Action.BLOCK, 1.0)
+
+decisions = np.zeros(4, dtype=DECISION_DTYPE)
+decisions['features'][:2, 0] = 1
+decisions['action'] = [BLOCK, ALLOW, BLOCK, ALLOW]
+decisions['reward'] = [1.0, -1.0, -1.0, 1.0]
+decisions['propensity'] = 0.5
+
+probabilities = policy_action_probabilities(agent, decisions['features'])
+print(f"\nP(BLOCK | attack state) = {probabilities[0, BLOCK]:.2f}")
+results = evaluator.evaluate_log(decisions, agent, reward_model=False)
+print(f"IPS estimate: {results['ips']['estimate']:+.4f}")
+assert probabilities[0, BLOCK] == 1.0
+
+
+def per_row_probabilities(policy, features):
+    """Reference: one get_action_probabilities call per row."""
+    return np.array([[p[a] for a in ACTIONS] for p in
+                     (policy.get_action_probabilities(dict(zip(FEATURE_NAMES, row)))
+                      for row in features.tolist())])
+
+
+# Trained candidates: a tabular agent that has seen some of the logged states,
+# and a linear Thompson sampling agent
+features, is_attack, actions, rewards, propensities = simulate(20000)
+tabular = PolicyAgent(epsilon=0.1)
+linear = LinearBanditAgent(algorithm='thompson', alpha=0.5, seed=1)
+for row, a, r in zip(features[:3000].tolist(), actions[:3000], rewards[:3000]):
+    state = dict(zip(FEATURE_NAMES, row))
+    tabular.update(state, ACTIONS[a], r)
+    linear.update(state, ACTIONS[a], r)
+for candidate in (tabular, linear):
+    sample = features[::40]
+    assert np.allclose(policy_action_probabilities(candidate, sample),
+                       per_row_probabilities(candidate, sample))
+print("✓ Batched probabilities match per-state calls (tabular and linear)")
+
+print("\n" + "=" * 60)
+print("TEST 4: One Day of Logs in Seconds")
+print("=" * 60)
+
+n = 2000000
+features, is_attack, actions, rewards, propensities = simulate(n)
+start = time.perf_counter()
+target = oracle_probabilities(features)
+predictions = fit_reward_model(features, actions, rewards)
+results = evaluator.evaluate(actions, rewards, propensities, target, predictions)
+elapsed = time.perf_counter() - start
+print(f"\nEvaluated {n:,} decisions in {elapsed:.2f}s (fixed candidate)")
+print(f"DR estimate: {results['dr']['estimate']:+.4f}")
+
+# The candidate's probabilities for every logged row, through the real function
+n = 200000
+features = features[:n]
+for name, candidate in (('tabular', tabular), ('thompson', linear)):
+    start = time.perf_counter()
+    policy_action_probabilities(candidate, features)
+    elapsed = time.perf_counter() - start
+    start = time.perf_counter()
+    per_row_probabilities(candidate, features[:2000])
+    per_row = (time.perf_counter() - start) * n / 2000
+    print(f"{name:9s} agent on {n:,} decisions: {elapsed:.2f}s (one call per row: ~{per_row:.1f}s)")
+    assert elapsed * 3 < per_row
+
+print("\n" + "=" * 60)
+print("SUMMARY")
+print("=" * 60)
+print("✓ IPS, SNIPS and DR estimates with confidence intervals")
+print("✓ Decision log loads straight into NumPy arrays")
+print("✓ Tabular and linear candidates evaluated with array operations")
+print("✓ Millions of decisions evaluated in seconds")
+print("\n✓ Offline policy evaluation is ready!")
@@ -1,7 +1,10 @@
 """Test script for reward calculator."""
 
 from reward_calculator import RewardCalculator
-from rl_agent import Action
+from rl_agent import Action, ACTIONS
+from feature_extractor import FeatureExtractor
+import numpy as np
+import time
 
 print("=" * 60)
 print("TEST 1: Attack Blocked (Positive Reward)")
@@ -205,6 +208,79 @@ weights = calc.get_reward_weights()
 print(f"  False positive penalty: {weights['false_positive_penalty']}")
 print(f"✓ Reward weights can be tuned dynamically")
 
+print("\n" + "=" * 60)
+print("TEST 11: Vectorized Rewards Match Scalar Rewards")
+print("=" * 60)
+
+rng = np.random.default_rng(11)
+n = 20000
+actions = rng.integers(0, len(ACTIONS), n)
+is_attack = rng.random(n) < 0.4
+http_status = rng.choice([0, 200, 301, 399, 400, 403, 404, 499, 500, 503], n)
+# Include latencies right at the threshold and integer latencies
+latency_ms = np.where(rng.random(n) < 0.2, 1000.0, rng.exponential(800.0, n))
+latency_ms[::7] = np.round(latency_ms[::7])
+db_error = rng.random(n) < 0.1
+user_complaint = rng.random(n) < 0.1
+
+for calculator in (calc, RewardCalculator(), RewardCalculator(max_latency_penalty=0.3, efficiency_bonus=0.0)):
+    vectorized = calculator.calculate_rewards(actions, is_attack, http_status, latency_ms,
+                                              db_error, user_complaint)
+    scalar = np.array([
+        calculator.calculate_reward(ACTIONS[a], {
+            'is_attack': bool(attack), 'http_status': int(status), 'latency_ms': float(latency),
+            'db_error': bool(error), 'user_complaint': bool(complaint)
+        })
+        for a, attack, status, latency, error, complaint
+        in zip(actions, is_attack, http_status, latency_ms, db_error, user_complaint)
+    ])
+    assert np.array_equal(vectorized, scalar)
+
+# Optional outcome fields default like missing dict keys
+defaults = calc.calculate_rewards(actions[:100], is_attack[:100])
+assert np.array_equal(defaults, [calc.calculate_reward(ACTIONS[a], {'is_attack': bool(attack)})
+                                 for a, attack in zip(actions[:100], is_attack[:100])])
+print(f"\n{n} requests x 3 weight settings: vectorized == scalar (bit for bit)")
+
+print("\n" + "=" * 60)
+print("TEST 12: Vectorized Attack Probabilities Match Scalar Estimates")
+print("=" * 60)
+
+names = FeatureExtractor.FEATURE_NAMES
+features = np.column_stack([rng.integers(0, 4, n).astype(float) for _ in names])
+# Values right at the thresholds (quote_count 2, entropy 5.0, encoding_depth 1)
+features[:, names.index('entropy')] = rng.choice([0.0, 4.99, 5.0, 5.01, 7.5], n)
+probabilities = calc.estimate_attack_probabilities(features)
+expected = np.array([calc.estimate_attack_probability(dict(zip(names, row))) for row in features.tolist()])
+assert np.array_equal(probabilities, expected)
+
+# Matrices with fewer columns behave like dicts with missing keys
+subset = ['quote_count', 'entropy']
+partial = calc.estimate_attack_probabilities(features[:, [names.index(c) for c in subset]], subset)
+assert np.array_equal(partial, [calc.estimate_attack_probability(dict(zip(subset, row)))
+                                for row in features[:, [names.index(c) for c in subset]].tolist()])
+
+from_features = calc.calculate_rewards_from_features(actions, features, http_status=http_status)
+assert np.array_equal(from_features, [
+    calc.calculate_reward_from_features(ACTIONS[a], dict(zip(names, row)), {'http_status': int(status)})
+    for a, row, status in zip(actions, features.tolist(), http_status)
+])
+print(f"\n{n} feature rows: vectorized == scalar (bit for bit)")
+
+start = time.perf_counter()
+for a, row, attack in zip(actions.tolist(), features.tolist(), is_attack.tolist()):
+    calc.estimate_attack_probability(dict(zip(names, row)))
+    calc.calculate_reward(ACTIONS[a], {'is_attack': attack})
+scalar_time = time.perf_counter() - start
+start = time.perf_counter()
+calc.estimate_attack_probabilities(features)
+calc.calculate_rewards(actions, is_attack)
+vector_time = time.perf_counter() - start
+print(f"Scalar loop: {scalar_time * 1000:.1f} ms, vectorized: {vector_time * 1000:.2f} ms "
+      f"({scalar_time / vector_time:.0f}x)")
+assert vector_time < scalar_time
+print(f"✓ Array versions ready for offline training and evaluation")
+
 print("\n" + "=" * 60)
 print("SUMMARY: Reward Scenarios")
 print("=" * 60)
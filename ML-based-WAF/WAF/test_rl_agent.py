@@ -1,6 +1,7 @@
 """Test script for RL agent."""
 
 from rl_agent import PolicyAgent, Action
+import random
 
 print("=" * 60)
 print("TEST 1: Basic Action Selection")
@@ -89,6 +90,19 @@ for i in range(10):
 print(f"Actions: {attack_actions}")
 print(f"Most common: {max(set(attack_actions), key=attack_actions.count)}")
 
+# Random draws that land on the greedy action are not counted as exploration
+# (sniffing_rl only lets explored decisions skip the kernel block set)
+random.seed(5)
+explorer = PolicyAgent(epsilon=1.0)
+explorer.update(attack_state, Action.BLOCK, 1.0)
+drawn = [explorer.select_action(attack_state) for _ in range(1000)]
+drawn += [explorer.select_action_with_propensity(attack_state)[0] for _ in range(1000)]
+changed = sum(action != Action.BLOCK for action in drawn)
+print(f"\nepsilon=1.0: {changed} of 2000 draws differ from BLOCK, "
+      f"exploration_count {explorer.exploration_count}")
+assert explorer.exploration_count == changed and explorer.exploitation_count == 2000 - changed
+print("✓ Only draws that changed the greedy choice count as exploration")
+
 print("\n" + "=" * 60)
 print("TEST 5: Statistics")
 print("=" * 60)
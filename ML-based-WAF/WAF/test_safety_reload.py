@@ -0,0 +1,145 @@
+"""Test script for hot-reloaded safety rules and the constraint memo."""
+
+from safety_layer import SafetyLayer
+from rl_agent import Action
+import json
+import os
+import random
+import signal
+import threading
+import time
+
+random.seed(9)
+
+ip_file = 'test_reload_ip_rules.json'
+endpoint_file = 'test_reload_endpoint_rules.json'
+
+
+def write_rules(filepath, rules):
+    with open(filepath, 'w') as f:
+        json.dump(rules, f)
+    # Make sure the change is visible even on coarse mtime filesystems
+    stat = os.stat(filepath)
+    os.utime(filepath, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+write_rules(ip_file, {'allow': ['203.0.113.0/24'], 'deny': ['203.0.113.7/32']})
+write_rules(endpoint_file, {'rules': [{'path': '/api/payments', 'max_action': 'throttle'}]})
+
+endpoints = ['/api/payments/charge?id=1', '/api/user?id=2', '/admin/users', '/health', '/search?q=x']
+origins = ['203.0.113.5', '203.0.113.7', '198.51.100.1', '10.0.0.3', '::1', None]
+
+print("=" * 60)
+print("TEST 1: Memoized Decisions Match Direct Evaluation")
+print("=" * 60)
+
+safety = SafetyLayer(ip_rules_file=ip_file, endpoint_rules_file=endpoint_file)
+direct = SafetyLayer(ip_rules_file=ip_file, endpoint_rules_file=endpoint_file, memo_size=0)
+for _ in range(5000):
+    action, endpoint, origin = random.choice(list(Action)), random.choice(endpoints), random.choice(origins)
+    assert safety.apply_constraints(action, endpoint, origin) == direct.apply_constraints(action, endpoint, origin)
+
+stats = safety.get_statistics()
+print(f"\nMemo hit rate: {stats['memo_hit_rate']:.1%} ({stats['memo_entries']} entries)")
+# The /32 deny rule means 203.0.113.5 and .7 must not share a memo entry
+print(f"BLOCK from 203.0.113.5: {safety.apply_constraints(Action.BLOCK, '/api/user', '203.0.113.5').value}")
+print(f"BLOCK from 203.0.113.7: {safety.apply_constraints(Action.BLOCK, '/api/user', '203.0.113.7').value}")
+assert safety.apply_constraints(Action.BLOCK, '/api/user', '203.0.113.7') == Action.BLOCK
+assert stats['memo_hit_rate'] > 0.9
+
+small = SafetyLayer(memo_size=10)
+for i in range(100):
+    small.apply_constraints(Action.BLOCK, f'/page/{i}', '198.51.100.1')
+assert small.get_statistics()['memo_entries'] == 10
+print("✓ Memo bounded by memo_size")
+
+print("\n" + "=" * 60)
+print("TEST 2: Reload on mtime Change")
+print("=" * 60)
+
+print(f"\nBefore: /api/payments BLOCK → "
+      f"{safety.apply_constraints(Action.BLOCK, '/api/payments/charge').value}")
+write_rules(endpoint_file, {'rules': [{'path': '/api/payments', 'force': 'challenge'}]})
+assert safety.check_reload()
+print(f"After:  /api/payments BLOCK → "
+      f"{safety.apply_constraints(Action.BLOCK, '/api/payments/charge').value}")
+assert safety.apply_constraints(Action.ALLOW, '/api/payments/charge') == Action.CHALLENGE
+assert safety.get_statistics()['memo_entries'] == 2
+assert not safety.check_reload()
+
+with open(endpoint_file, 'w') as f:
+    f.write('{"rules": [ broken')
+os.utime(endpoint_file, ns=(0, time.time_ns() + 2_000_000_000))
+assert not safety.check_reload()
+print(f"Broken file rejected: {safety.get_statistics()['last_reload_error']}")
+assert safety.apply_constraints(Action.ALLOW, '/api/payments/charge') == Action.CHALLENGE
+print("✓ Previous rules kept")
+
+print("\n" + "=" * 60)
+print("TEST 3: SIGHUP Reload Under Concurrent Traffic")
+print("=" * 60)
+
+write_rules(endpoint_file, {'rules': []})
+safety = SafetyLayer(ip_rules_file=ip_file, endpoint_rules_file=endpoint_file)
+safety.start_watcher(interval_s=0)
+signal.signal(signal.SIGHUP, lambda signum, frame: safety.request_reload())
+
+errors = []
+seen = set()
+stop = threading.Event()
+
+
+def traffic():
+    try:
+        while not stop.is_set():
+            seen.add(safety.apply_constraints(Action.BLOCK, '/api/payments/charge', '198.51.100.1'))
+    except Exception as e:
+        errors.append(e)
+
+
+thread = threading.Thread(target=traffic)
+thread.start()
+for i in range(20):
+    force = 'challenge' if i % 2 == 0 else 'sanitize'
+    write_rules(endpoint_file, {'rules': [{'path': '/api/payments', 'force': force}]})
+    os.kill(os.getpid(), signal.SIGHUP)
+    time.sleep(0.02)
+time.sleep(0.2)
+stop.set()
+thread.join()
+safety.stop_watcher()
+signal.signal(signal.SIGHUP, signal.SIG_DFL)
+
+print(f"\nReloads: {safety.reloads}, errors in traffic thread: {len(errors)}")
+print(f"Decisions observed: {sorted(a.value for a in seen)}")
+assert not errors and safety.reloads >= 10
+assert seen <= {Action.BLOCK, Action.CHALLENGE, Action.SANITIZE}
+assert safety.apply_constraints(Action.BLOCK, '/api/payments/charge', '198.51.100.1') == Action.SANITIZE
+
+print("\n" + "=" * 60)
+print("TEST 4: Memo Benchmark")
+print("=" * 60)
+
+traffic_mix = [(random.choice(list(Action)), random.choice(endpoints), random.choice(origins[:-1]))
+               for _ in range(50000)]
+timings = {}
+print()
+for name, layer in (('memo', SafetyLayer(ip_file, endpoint_file)),
+                    ('no memo', SafetyLayer(ip_file, endpoint_file, memo_size=0))):
+    start = time.perf_counter()
+    for action, endpoint, origin in traffic_mix:
+        layer.apply_constraints(action, endpoint, origin)
+    timings[name] = (time.perf_counter() - start) / len(traffic_mix) * 1e6
+    print(f"{name:8s}: {timings[name]:.2f} µs/decision")
+assert timings['memo'] < timings['no memo']
+
+os.remove(ip_file)
+os.remove(endpoint_file)
+
+print("\n" + "=" * 60)
+print("SUMMARY")
+print("=" * 60)
+print("✓ Rules reloaded on SIGHUP or mtime change, swapped atomically")
+print("✓ Invalid rules files never replace working rules")
+print("✓ Repeated (action, route, origin network) decisions served from the memo")
+print("\n✓ Hot reload is ready!")
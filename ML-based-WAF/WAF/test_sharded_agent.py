@@ -0,0 +1,127 @@
+"""Test script for sharded multi-process policy learning."""
+
+from sharded_agent import ShardedPolicyAgent, ShardCoordinator
+from rl_agent import Action
+import multiprocessing
+
+N_SHARDS = 3
+N_ROUNDS = 4
+
+
+def attack_state(i):
+    return {'sql_keyword_count': 2 + i, 'quote_count': 4}
+
+
+def benign_state(i):
+    return {'sql_keyword_count': 0, 'length': 10 + i}
+
+
+def run_worker(channel, barrier, results):
+    """Each shard only sees its own slice of states."""
+    agent = ShardedPolicyAgent(epsilon=0.0, learning_rate=0.3)
+    agent.attach(channel)
+    shard_id = channel.shard_id
+
+    for round_number in range(N_ROUNDS):
+        for _ in range(5):
+            agent.update(attack_state(shard_id), Action.BLOCK, reward=1.0)
+            agent.update(attack_state(shard_id), Action.ALLOW, reward=-1.5)
+            agent.update(benign_state(shard_id), Action.ALLOW, reward=0.5)
+            agent.update(benign_state(shard_id), Action.BLOCK, reward=-2.0)
+            # Every shard also sees a shared state with noisy rewards
+            agent.update(attack_state(99), Action.BLOCK, reward=0.5 + shard_id * 0.25)
+        agent.sync()
+        barrier.wait()
+        agent.wait_for_policy(round_number + 1)
+
+    choices = {}
+    for i in range(N_SHARDS):
+        choices[f'attack_{i}'] = agent._get_best_action(agent._state_to_key(attack_state(i))).value
+        choices[f'benign_{i}'] = agent._get_best_action(agent._state_to_key(benign_state(i))).value
+    shared_q = agent.get_q_values(attack_state(99))[Action.BLOCK]
+    results.put((shard_id, choices, shared_q, agent.policy_version))
+
+
+if __name__ == '__main__':
+    print("=" * 60)
+    print("TEST 1: Visit-count Weighted Merge")
+    print("=" * 60)
+
+    coordinator = ShardCoordinator()
+    key = ('state', Action.BLOCK)
+    merged = coordinator.merge([
+        {'shard_id': 0, 'policy_version': 0, 'exported_at': 0.0, 'entries': {key: (1.0, 3)}},
+        {'shard_id': 1, 'policy_version': 0, 'exported_at': 0.0, 'entries': {key: (0.0, 1)}},
+    ])
+    print(f"\nShard 0: q=1.0 after 3 visits, shard 1: q=0.0 after 1 visit")
+    print(f"Merged q: {merged['entries'][key]:.2f}")
+    assert merged['entries'][key] == 0.75
+
+    # A second round is merged on its own: shard estimates already started
+    # from the merged value, so a changed reward moves the policy right away
+    merged = coordinator.merge([
+        {'shard_id': 0, 'policy_version': 1, 'exported_at': 0.0, 'entries': {key: (-1.0, 2)}},
+        {'shard_id': 1, 'policy_version': 1, 'exported_at': 0.0, 'entries': {key: (0.5, 2)}},
+    ])
+    print(f"Round 2: shard 0: q=-1.0 after 2 visits, shard 1: q=0.5 after 2 visits")
+    print(f"Merged q for round 2: {merged['entries'][key]:.3f}")
+    assert merged['entries'][key] == (-1.0 * 2 + 0.5 * 2) / 4
+    assert coordinator.table[key] == [merged['entries'][key], 8]   # visits kept for metrics
+    print("✓ Merge weights shards by visit count within each round")
+
+    print("\n" + "=" * 60)
+    print(f"TEST 2: {N_SHARDS} Worker Processes Converge")
+    print("=" * 60)
+
+    ctx = multiprocessing.get_context('spawn')
+    coordinator = ShardCoordinator(context=ctx)
+    barrier = ctx.Barrier(N_SHARDS + 1)
+    results = ctx.Queue()
+
+    workers = []
+    for shard_id in range(N_SHARDS):
+        channel = coordinator.create_channel(shard_id)
+        worker = ctx.Process(target=run_worker, args=(channel, barrier, results))
+        worker.start()
+        workers.append(worker)
+
+    for round_number in range(N_ROUNDS):
+        barrier.wait()
+        coordinator.merge_pending(timeout=10.0, min_exports=N_SHARDS)
+
+    outputs = sorted(results.get(timeout=30) for _ in range(N_SHARDS))
+    for worker in workers:
+        worker.join()
+
+    for shard_id, choices, shared_q, version in outputs:
+        print(f"\nShard {shard_id} (policy v{version}):")
+        print(f"  {choices}")
+        print(f"  Shared state Q(BLOCK) = {shared_q:+.4f}")
+        for i in range(N_SHARDS):
+            assert choices[f'attack_{i}'] == 'block'
+            assert choices[f'benign_{i}'] == 'allow'
+
+    shared_values = [round(shared_q, 9) for _, _, shared_q, _ in outputs]
+    assert len(set(shared_values)) == 1
+    print("\n✓ Every shard learned states it never saw locally")
+    print("✓ Shards agree on the shared state's merged value")
+
+    print("\n" + "=" * 60)
+    print("TEST 3: Merge Metrics")
+    print("=" * 60)
+
+    metrics = coordinator.get_metrics()
+    print(f"\nMerges: {metrics['merge_count']}")
+    print(f"Last merge: {metrics['last_merge_ms']:.3f} ms ({metrics['last_merged_entries']} entries)")
+    print(f"Global table size: {metrics['global_table_size']}")
+    print(f"Version lag per shard: {metrics['shard_version_lag']}")
+    print(f"Staleness per shard (s): "
+          f"{ {k: round(v, 3) for k, v in metrics['shard_staleness_s'].items()} }")
+
+    print("\n" + "=" * 60)
+    print("SUMMARY")
+    print("=" * 60)
+    print("✓ Shards learn locally and sync through the coordinator")
+    print("✓ Visit-count weighted averaging merges estimates")
+    print("✓ Merge cost and staleness are exposed as metrics")
+    print("\n✓ Sharded policy agent is ready!")
@@ -0,0 +1,130 @@
+"""Test script for the shared-memory sliding-window rate limiter."""
+
+from shared_rate_limiter import SharedRateLimiter, add_rate_feature, RATE_FEATURE
+from action_executor import ActionExecutor
+from rl_agent import Action
+import multiprocessing
+import random
+import time
+
+HITS_PER_WORKER = 20000
+
+
+def hammer_one_origin(limiter, barrier, results):
+    """Every worker counts requests from the same origin."""
+    barrier.wait()
+    for _ in range(2000):
+        limiter.hit('203.0.113.50', now=1000.0)
+    results.put(limiter.get_statistics())
+    limiter.close()
+
+
+def bench_worker(limiter, barrier, results, seed):
+    """Hits on a skewed origin mix (a few hot origins, a long tail)."""
+    rng = random.Random(seed)
+    origins = [f"198.51.{rng.randint(0, 255)}.{rng.randint(0, 255)}" for _ in range(5000)]
+    hot = origins[:20]
+    picks = [rng.choice(hot) if rng.random() < 0.5 else rng.choice(origins)
+             for _ in range(HITS_PER_WORKER)]
+    barrier.wait()
+    start = time.perf_counter()
+    for origin in picks:
+        limiter.hit(origin)
+    elapsed = time.perf_counter() - start
+    stats = limiter.get_statistics()
+    stats['elapsed'] = elapsed
+    results.put(stats)
+    limiter.close()
+
+
+def run_workers(ctx, target, limiter, n, extra_args=lambda i: ()):
+    barrier = ctx.Barrier(n)
+    results = ctx.Queue()
+    workers = [ctx.Process(target=target, args=(limiter, barrier, results) + extra_args(i))
+               for i in range(n)]
+    for worker in workers:
+        worker.start()
+    stats = [results.get(timeout=120) for _ in workers]
+    for worker in workers:
+        worker.join()
+    return stats
+
+
+if __name__ == '__main__':
+    ctx = multiprocessing.get_context('spawn')
+
+    print("=" * 60)
+    print("TEST 1: Sliding Window")
+    print("=" * 60)
+
+    limiter = SharedRateLimiter(slots=4096, window_s=10.0, buckets=10, context=ctx)
+    for second in range(10):
+        for _ in range(3):
+            limiter.hit('192.0.2.1', now=100.0 + second)
+    print(f"\n3 req/s for 10 s → window count {limiter.count('192.0.2.1', now=109.5)}")
+    print(f"5 s later: {limiter.count('192.0.2.1', now=114.5)}, "
+          f"rate {limiter.rate('192.0.2.1', now=114.5):.1f} req/s")
+    print(f"Other origin: {limiter.count('192.0.2.2', now=109.5)}")
+    assert limiter.count('192.0.2.1', now=109.5) == 30
+    assert limiter.count('192.0.2.1', now=114.5) == 15
+    assert limiter.count('192.0.2.1', now=130.0) == 0
+    assert limiter.count('192.0.2.2', now=109.5) == 0
+
+    print("\n" + "=" * 60)
+    print("TEST 2: Worker Processes Agree (No Lost Updates)")
+    print("=" * 60)
+
+    run_workers(ctx, hammer_one_origin, limiter, 8)
+    total = limiter.count('203.0.113.50', now=1000.0)
+    print(f"\n8 processes x 2000 hits on one origin → shared count {total}")
+    assert total == 16000
+
+    print("\n" + "=" * 60)
+    print("TEST 3: Executor and RL Feature Query the Same Counters")
+    print("=" * 60)
+
+    executor = ActionExecutor(throttle_delay_ms=500, rate_limiter=limiter, rate_limit=100)
+    features = {}
+    for _ in range(150):
+        add_rate_feature(features, limiter, '198.18.0.9')
+    result = executor.execute(Action.THROTTLE, {'request': '/', 'origin': '198.18.0.9'})
+    quiet = executor.execute(Action.THROTTLE, {'request': '/', 'origin': '198.18.0.10'})
+    print(f"\nRate feature after 150 requests: {features[RATE_FEATURE]} (log2 bucket)")
+    print(f"THROTTLE for busy origin: allowed={result['allowed']} "
+          f"status={result['metadata'].get('http_status')}")
+    print(f"THROTTLE for quiet origin: allowed={quiet['allowed']}")
+    assert features[RATE_FEATURE] == 8
+    assert result['metadata']['http_status'] == 429 and quiet['allowed']
+    limiter.close()
+    limiter.unlink()
+
+    print("\n" + "=" * 60)
+    print("TEST 4: Contention Benchmark")
+    print("=" * 60)
+
+    print(f"\n{'processes':>9s} {'stripes':>7s} {'hits/s':>12s} {'contention':>11s}")
+    contention = {}
+    for stripes in (1, 64):
+        for n in (1, 2, 4, 8, 12):
+            limiter = SharedRateLimiter(slots=65536, stripes=stripes, context=ctx)
+            stats = run_workers(ctx, bench_worker, limiter, n, lambda i: (i,))
+            waits = sum(s['lock_waits'] for s in stats)
+            acquisitions = sum(s['lock_acquisitions'] for s in stats)
+            throughput = acquisitions / max(s['elapsed'] for s in stats)
+            contention[stripes, n] = waits / acquisitions
+            print(f"{n:9d} {stripes:7d} {throughput:12,.0f} {contention[stripes, n]:10.3%}")
+            limiter.close()
+            limiter.unlink()
+
+    print(f"\nCPU cores available: {multiprocessing.cpu_count()}")
+    # With fewer cores than processes, waits mostly come from a worker being
+    # preempted while it holds a lock, so striping matters most on many cores
+    assert contention[64, 8] < 0.02 and contention[64, 12] < 0.02
+
+    print("\n" + "=" * 60)
+    print("SUMMARY")
+    print("=" * 60)
+    print("✓ Per-origin sliding-window counts shared by all worker processes")
+    print("✓ Striped locks: no lost updates, low contention at 8+ processes")
+    print("✓ ActionExecutor and RL features query the same counters")
+    print("\n✓ Shared rate limiter is ready!")
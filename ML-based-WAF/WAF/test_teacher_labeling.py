@@ -0,0 +1,189 @@
+"""Test script for asynchronous teacher labeling."""
+
+from teacher_labeling import TeacherLabeler
+from delayed_reward import PendingDecisionTable
+from reward_calculator import RewardCalculator
+from rl_agent import PolicyAgent, Action
+from request import Request
+import time
+
+
+class SlowTeacher:
+    """Stand-in with ThreatClassifier's classify_requests interface.
+
+    Labels requests containing "union" or "' or" as sqli and pays a fixed
+    cost per call plus a cost per request, like an SVM predict().
+    """
+
+    def __init__(self, call_cost_s=0.005, item_cost_s=0.0002, fail=False):
+        self.call_cost_s = call_cost_s
+        self.item_cost_s = item_cost_s
+        self.fail = fail
+        self.calls = 0
+
+    def classify_requests(self, reqs):
+        self.calls += 1
+        time.sleep(self.call_cost_s + self.item_cost_s * len(reqs))
+        if self.fail:
+            raise RuntimeError("model file missing")
+        return [{'sqli': 'Request'} if ('union' in req.request or "' or" in req.request)
+                else {'valid': ''} for req in reqs]
+
+
+features = {'sql_keyword_count': 1, 'quote_count': 0}
+calc = RewardCalculator()
+
+print("=" * 60)
+print("TEST 1: Teacher Verdict Replaces the Heuristic Label")
+print("=" * 60)
+
+agent = PolicyAgent(learning_rate=1.0)
+pending = PendingDecisionTable(agent, calc, ttl_s=30.0)
+labeler = TeacherLabeler(SlowTeacher(), pending, workers=2)
+labeler.start()
+
+# The heuristic missed this one (probability below 0.5)
+pending.record('r1', features, Action.ALLOW, context={'is_attack': False})
+assert labeler.submit('r1', Request(request="/item?id=1 union select password from users"), False)
+labeler.stop()
+
+q_allow = agent.get_q_values(features)[Action.ALLOW]
+print(f"\nQ(ALLOW) after the teacher's verdict: {q_allow:+.2f}")
+assert q_allow == calc.calculate_reward(Action.ALLOW, {'is_attack': True})
+print("✓ Agent learned from the classifier label, not the heuristic")
+
+print("\n" + "=" * 60)
+print("TEST 2: Batching and Queue Metrics")
+print("=" * 60)
+
+agent = PolicyAgent(learning_rate=0.5)
+pending = PendingDecisionTable(agent, calc, ttl_s=30.0)
+teacher = SlowTeacher()
+labeler = TeacherLabeler(teacher, pending, workers=2, batch_size=64, max_queue=4096)
+labeler.start()
+n = 2000
+for i in range(n):
+    path = f"/search?q=a' or 1=1 --{i}" if i % 10 == 0 else f"/search?q=shoes{i}"
+    pending.record(i, features, Action.LOG_ONLY)
+    assert labeler.submit(i, Request(request=path), False)
+labeler.stop()
+
+stats = labeler.get_statistics()
+print(f"\n{stats}")
+print(f"Classifier calls: {teacher.calls} for {n} requests")
+assert stats['labeled'] == n and stats['attacks'] == n // 10
+assert stats['queue_depth'] == 0 and stats['max_queue_depth'] > 0
+assert teacher.calls < n / 10 and stats['avg_batch_size'] > 10
+assert len(pending) == 0 and pending.joined == n
+
+print("\n" + "=" * 60)
+print("TEST 3: Heuristic Fallback When the Queue Is Full")
+print("=" * 60)
+
+agent = PolicyAgent(learning_rate=1.0)
+pending = PendingDecisionTable(agent, calc, ttl_s=30.0)
+labeler = TeacherLabeler(SlowTeacher(), pending, max_queue=10)  # workers not started
+fallbacks = 0
+for i in range(25):
+    pending.record(i, {'quote_count': i}, Action.BLOCK)
+    if not labeler.submit(i, Request(request='/'), True):
+        pending.join(i, {'is_attack': True, 'teacher_label': False})
+        fallbacks += 1
+stats = labeler.get_statistics()
+print(f"\nQueued: {stats['queue_depth']}, fallbacks: {stats['fallbacks']}")
+assert fallbacks == 15 and stats['fallbacks'] == 15 and stats['queue_depth'] == 10
+labeler.start()
+labeler.stop()
+assert len(pending) == 0 and labeler.labeled == 10
+print("✓ Full queue never blocks; refused requests use the heuristic label")
+
+print("\n" + "=" * 60)
+print("TEST 4: Classifier Failure")
+print("=" * 60)
+
+agent = PolicyAgent(learning_rate=1.0)
+pending = PendingDecisionTable(agent, calc, ttl_s=30.0)
+labeler = TeacherLabeler(SlowTeacher(fail=True), pending)
+labeler.start()
+for i in range(50):
+    pending.record(i, {'quote_count': i}, Action.BLOCK)
+    labeler.submit(i, Request(request='/'), i % 2 == 0)
+labeler.stop()
+stats = labeler.get_statistics()
+print(f"\nErrors: {stats['errors']} ({stats['last_error']}), labeled: {stats['labeled']}")
+assert stats['labeled'] == 50 and stats['errors'] > 0 and len(pending) == 0
+assert agent.get_q_values({'quote_count': 2})[Action.BLOCK] == calc.calculate_reward(Action.BLOCK, {'is_attack': True})
+assert agent.get_q_values({'quote_count': 3})[Action.BLOCK] == calc.calculate_reward(Action.BLOCK, {'is_attack': False})
+print("✓ Failed batches fall back to the heuristic labels")
+
+print("\n" + "=" * 60)
+print("TEST 5: Teacher Label and Captured Response Combined")
+print("=" * 60)
+
+agent = PolicyAgent(learning_rate=1.0)
+pending = PendingDecisionTable(agent, calc, ttl_s=30.0, outcomes_required=2)
+labeler = TeacherLabeler(SlowTeacher(), pending)
+labeler.start()
+pending.record('r2', features, Action.LOG_ONLY, context={'is_attack': False})
+first = pending.join('r2', {'http_status': 500, 'db_error': True})  # response first
+labeler.submit('r2', Request(request="/login?user=admin' or '1'='1"), False)
+labeler.stop()
+expected = calc.calculate_reward(Action.LOG_ONLY, {'is_attack': True, 'http_status': 500, 'db_error': True})
+q_value = agent.get_q_values(features)[Action.LOG_ONLY]
+print(f"\nAfter response only: {first}; after teacher label: {q_value:+.2f}")
+assert first is None and q_value == expected and pending.partial_joins == 1
+
+print("\n" + "=" * 60)
+print("TEST 6: Packet-Path Cost")
+print("=" * 60)
+
+teacher = SlowTeacher(call_cost_s=0.002, item_cost_s=0.0002)
+reqs = [Request(request=f"/page?id={i}") for i in range(200)]
+start = time.perf_counter()
+for req in reqs:
+    teacher.classify_requests([req])
+inline = (time.perf_counter() - start) / len(reqs)
+
+pending = PendingDecisionTable(PolicyAgent(), calc, ttl_s=30.0)
+labeler = TeacherLabeler(teacher, pending, max_queue=10000)
+labeler.start()
+start = time.perf_counter()
+for i, req in enumerate(reqs):
+    pending.record(i, features, Action.ALLOW)
+    labeler.submit(i, req)
+submit = (time.perf_counter() - start) / len(reqs)
+labeler.stop()
+print(f"\nInline classification: {inline * 1e6:,.0f} µs/request")
+print(f"record + submit:       {submit * 1e6:,.1f} µs/request")
+print(f"Average label delay:   {labeler.get_statistics()['avg_label_delay_ms']:.1f} ms")
+assert submit < inline / 10
+
+print("\n" + "=" * 60)
+print("TEST 7: ThreatClassifier Batch Matches Single Classification")
+print("=" * 60)
+
+try:
+    from classifier import ThreatClassifier
+    classifier = ThreatClassifier()
+except Exception as e:
+    print(f"\nSkipped: ThreatClassifier unavailable ({e})")
+else:
+    samples = [
+        Request(request="/index.html", headers={}),
+        Request(request="/item?id=1 union select 1,2", body="a=<script>alert(1)</script>", headers={}),
+        Request(request="/login", body='{"user": "bob"}', headers={'Cookie': 'sid=1'}),
+        Request(request="/?x=" + "A" * 300, headers={'User_Agent': 'curl/8.0'}),
+    ]
+    batch = classifier.classify_requests(samples)
+    for req, threats in zip(samples, batch):
+        classifier.classify_request(req)
+        assert req.threats == threats
+    print(f"\n{len(samples)} requests: batch verdicts == single verdicts")
+
+print("\n" + "=" * 60)
+print("SUMMARY")
+print("=" * 60)
+print("✓ Classifier verdicts reach the agent as delayed rewards")
+print("✓ Requests batched to a worker pool, off the packet path")
+print("✓ Queue depth reported; heuristic used when the queue is full")
+print("\n✓ Teacher labeling is ready!")
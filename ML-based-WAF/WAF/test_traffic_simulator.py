@@ -0,0 +1,108 @@
+"""Test script for the traffic simulator."""
+
+from traffic_simulator import TrafficSampler, TrafficSimulator, STAGES
+from rl_agent import PolicyAgent, Action
+from reward_calculator import RewardCalculator
+from ip_trie import ALLOW
+import random
+
+random.seed(3)
+
+print("=" * 60)
+print("TEST 1: Configurable Attack Mix")
+print("=" * 60)
+
+sampler = TrafficSampler(attack_ratio=0.25, attack_mix={'sqli': 3, 'xss': 1}, seed=1)
+print(f"\nBenign pool: {len(sampler.benign)} requests")
+print(f"Attack pools: { {t: len(sampler.attacks[t]) for t in sampler.attack_types} }")
+
+counts = {}
+for step in range(20000):
+    _, attack_type, _ = sampler.sample(step)
+    counts[attack_type] = counts.get(attack_type, 0) + 1
+attack_share = 1 - counts[None] / 20000
+print(f"Attack share: {attack_share:.1%} (configured 25%)")
+print(f"sqli / xss: {counts['sqli']} / {counts['xss']}")
+assert abs(attack_share - 0.25) < 0.02
+assert set(counts) == {None, 'sqli', 'xss'}
+assert 2.5 < counts['sqli'] / counts['xss'] < 3.5
+
+try:
+    TrafficSampler(attack_mix={'ddos': 1.0})
+    raise AssertionError("unknown attack type accepted")
+except ValueError as e:
+    print(f"✓ Invalid mix rejected: {e}")
+
+print("\n" + "=" * 60)
+print("TEST 2: Drift")
+print("=" * 60)
+
+sampler = TrafficSampler(attack_ratio=0.1, drift={'steps': 1000, 'attack_ratio': 0.9,
+                                                  'attack_mix': {'parameter-tampering': 1}})
+print()
+for step in (0, 500, 1000, 5000):
+    ratio, mix = sampler.mix_at(step)
+    print(f"Step {step:5d}: attack ratio {ratio:.2f}, "
+          f"parameter-tampering weight {mix[sampler.attack_types.index('parameter-tampering')]:.2f}")
+assert sampler.mix_at(500)[0] == 0.5 and sampler.mix_at(5000)[0] == 0.9
+
+print("\n" + "=" * 60)
+print("TEST 3: Learning Curve, Regret and Stage Timing")
+print("=" * 60)
+
+sampler = TrafficSampler(attack_ratio=0.3, seed=2)
+agent = PolicyAgent(epsilon=0.1, learning_rate=0.1)
+simulator = TrafficSimulator(agent, sampler)
+report = simulator.run(20000, window=5000)
+curve = report['learning_curve']
+
+print(f"\nSimulated {report['steps']} requests at {report['requests_per_second']:,.0f} req/s")
+for step, reward, regret in zip(curve['step'], curve['mean_reward'], curve['cumulative_regret']):
+    print(f"  step {step:6d}: mean reward {reward:+.3f}, cumulative regret {regret:8.1f}")
+print(f"Stage timing (µs): "
+      f"{ {k: round(v, 1) for k, v in report['stage_us_per_request'].items()} }")
+
+assert curve['step'] == [5000, 10000, 15000, 20000]
+assert list(report['stage_us_per_request']) == STAGES
+assert sum(report['action_counts'].values()) == 20000
+assert all(b >= a for a, b in zip(curve['cumulative_regret'], curve['cumulative_regret'][1:]))
+assert curve['mean_reward'][-1] > curve['mean_reward'][0]
+print("✓ Agent improves as it sees more traffic")
+
+print("\n" + "=" * 60)
+print("TEST 4: Regret of a Fixed Policy")
+print("=" * 60)
+
+
+class AlwaysAllow:
+    def select_action(self, state):
+        return Action.ALLOW
+
+
+sampler = TrafficSampler(attack_ratio=0.0, seed=4)
+report = TrafficSimulator(AlwaysAllow(), sampler).run(2000, window=1000)
+print(f"\nAll-benign traffic, ALLOW everything: regret {report['total_regret']:.1f}, "
+      f"FP rate {report['learning_curve']['false_positive_rate']}")
+# LOG_ONLY earns the efficiency bonus on benign traffic
+assert abs(report['total_regret'] - 2000 * 0.2) < 1e-6
+
+# Every request over the latency threshold: the penalty applies to the best
+# action as well, so regret is unchanged
+slow = RewardCalculator(latency_penalty_threshold_ms=0.001)
+sampler = TrafficSampler(attack_ratio=0.0, seed=4)
+simulator = TrafficSimulator(AlwaysAllow(), sampler, reward_calculator=slow)
+report = simulator.run(2000, window=1000)
+print(f"With a latency penalty on every request: mean reward "
+      f"{report['learning_curve']['mean_reward'][0]:+.2f}, regret {report['total_regret']:.1f}")
+assert abs(report['total_regret'] - 2000 * 0.2) < 1e-6
+# The oracle is cached per IP rule (internal or not), not per address
+assert {key[2] for key in simulator._oracle_cache} <= {ALLOW, None}
+print("✓ Oracle scored with the simulated outcome's status and latency")
+
+print("\n" + "=" * 60)
+print("SUMMARY")
+print("=" * 60)
+print("✓ Requests sampled from the labelled datasets with configurable mix and drift")
+print("✓ Full feature → agent → safety → executor → reward loop in-process")
+print("✓ Learning curves, regret and per-stage timing reported")
+print("\n✓ Traffic simulator is ready!")
@@ -0,0 +1,122 @@
+'''Per-origin token buckets for non-blocking throttling.
+
+Each origin gets a bucket that refills at `rate` tokens per second up to
+`burst` tokens. A throttled request takes one token; when the bucket is
+empty the request is not slept on but scheduled: the bucket goes into debt
+and the caller is told how long to defer the request (the time until its
+token is refilled). Only the offending origin accumulates delay, and other
+clients are never held up.
+
+Buckets live in an LRU table bounded by `max_origins`. Buckets that have
+been idle for `idle_ttl_s` and have refilled completely (so that dropping
+them changes nothing) are removed lazily from the cold end of the table on
+every access.
+'''
+
+from collections import OrderedDict
+import threading
+import time
+
+
+class TokenBucketTable:
+    """Bounded, expiring table of per-origin token buckets."""
+
+    def __init__(self, rate, burst=1.0, max_origins=100000, idle_ttl_s=None, max_delay_s=None):
+        """Initialize the table.
+
+        Args:
+            rate: Tokens added per second to each bucket
+            burst: Bucket capacity (requests allowed back to back)
+            max_origins: Maximum number of buckets kept
+            idle_ttl_s: Drop buckets idle for at least this long once they
+                are full again (default: time to refill an empty bucket)
+            max_delay_s: Reject instead of deferring when a request would wait
+                longer than this (None: always defer)
+        """
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.burst = burst
+        self.max_origins = max_origins
+        self.idle_ttl_s = idle_ttl_s if idle_ttl_s is not None else burst / rate
+        self.max_delay_s = max_delay_s
+
+        # origin -> [tokens, last refill time], least recently used first
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+        # Statistics for monitoring
+        self.deferred = 0
+        self.rejected = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def acquire(self, origin, now=None):
+        """Take a token for one request from an origin.
+
+        Args:
+            origin: Bucket key (e.g. client IP)
+            now: Current monotonic time (default: time.monotonic())
+
+        Returns:
+            float: Seconds to defer the request (0.0 if a token was available),
+                or None if the request should be rejected (see max_delay_s)
+        """
+        if now is None:
+            now = time.monotonic()
+
+        with self._lock:
+            self._expire(now)
+            bucket = self._buckets.get(origin)
+            if bucket is None:
+                bucket = self._buckets[origin] = [self.burst, now]
+                if len(self._buckets) > self.max_origins:
+                    self._buckets.popitem(last=False)
+                    self.evictions += 1
+            else:
+                self._buckets.move_to_end(origin)
+                bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+                bucket[1] = now
+
+            if bucket[0] >= 1.0:
+                bucket[0] -= 1.0
+                return 0.0
+
+            delay = (1.0 - bucket[0]) / self.rate
+            if self.max_delay_s is not None and delay > self.max_delay_s:
+                self.rejected += 1
+                return None
+            # Reserve the next token: later requests queue behind this one
+            bucket[0] -= 1.0
+            self.deferred += 1
+            return delay
+
+    def _expire(self, now):
+        """Drop idle buckets from the cold end of the table (caller holds the lock)."""
+        buckets = self._buckets
+        while buckets:
+            origin, (tokens, last) = next(iter(buckets.items()))
+            idle = now - last
+            # A bucket in debt must first pay it back, or its queued requests
+            # would be forgotten
+            if idle < self.idle_ttl_s or idle < (self.burst - tokens) / self.rate:
+                break
+            del buckets[origin]
+            self.expirations += 1
+
+    def __len__(self):
+        return len(self._buckets)
+
+    def get_statistics(self):
+        """Get table statistics for monitoring.
+
+        Returns:
+            dict: Bucket count and deferral/rejection/eviction counters
+        """
+        return {
+            'origins': len(self._buckets),
+            'deferred': self.deferred,
+            'rejected': self.rejected,
+            'evictions': self.evictions,
+            'expirations': self.expirations
+        }
@@ -0,0 +1,399 @@
+'''Traffic simulator for fast RL experimentation.
+
+Drives the full RL loop in-process, without a network:
+
+    sample request → feature extraction → agent → safety layer
+    → action executor → reward → agent update
+
+Requests are sampled from the labelled datasets:
+- Dataset/HTTPParams_clean.json: benign values and sqli / xss / cmdi /
+  path-traversal payloads
+- Dataset/xss_clean.json: benign HTML and xss payloads
+- Dataset/pt_dataset.json: parameter lengths labelled valid or
+  parameter-tampering (values of that length are generated)
+
+The attack ratio and the mix of attack types are configurable and can drift
+linearly over the run. Because the true label of every request is known, the
+simulator reports learning curves (reward, detection and false positive
+rates per window), regret against the best safe action, and the time spent
+in each pipeline stage.
+
+Usage:
+    python traffic_simulator.py --steps 100000 --attack-ratio 0.2 --drift-ratio 0.6
+'''
+
+from argparse import ArgumentParser
+import json
+import os
+import random
+import time
+
+import numpy as np
+
+from request import Request
+from feature_extractor import FeatureExtractor
+from rl_agent import PolicyAgent, Action, ACTIONS
+from safety_layer import SafetyLayer
+from action_executor import ActionExecutor
+from reward_calculator import RewardCalculator
+
+
+ATTACK_TYPES = ['sqli', 'xss', 'cmdi', 'path-traversal', 'parameter-tampering']
+STAGES = ['sample', 'features', 'decision', 'safety', 'execute', 'reward', 'update']
+
+# Actions that stop an attack from reaching the application unchanged
+RESTRICTIVE_ACTIONS = (Action.BLOCK, Action.CHALLENGE)
+
+ENDPOINTS = ['/api/search', '/api/user', '/api/products', '/login', '/admin/panel', '/api/auth/token']
+
+
+class TrafficSampler:
+    """Samples labelled requests with a configurable, drifting attack mix."""
+
+    def __init__(self, dataset_dir='../Dataset', attack_ratio=0.2, attack_mix=None,
+                 drift=None, internal_ratio=0.1, post_ratio=0.3, seed=None):
+        """Load the datasets and configure the traffic mix.
+
+        Args:
+            dataset_dir: Directory with the dataset JSON files
+            attack_ratio: Fraction of attack requests
+            attack_mix: dict attack type -> weight (default: uniform over the
+                available types)
+            drift: Optional dict with 'steps' and a target 'attack_ratio'
+                and/or 'attack_mix'; the mix moves linearly to the target
+                over that many steps and stays there
+            internal_ratio: Fraction of requests from private addresses
+            post_ratio: Fraction of requests sent as POST bodies
+            seed: Random seed
+        """
+        self.rng = random.Random(seed)
+        self.internal_ratio = internal_ratio
+        self.post_ratio = post_ratio
+
+        self.benign = []
+        self.attacks = {attack_type: [] for attack_type in ATTACK_TYPES}
+        for name in ('HTTPParams_clean.json', 'xss_clean.json'):
+            with open(os.path.join(dataset_dir, name)) as f:
+                for record in json.load(f):
+                    pool = self.benign if record['type'] == 'valid' else self.attacks.get(record['type'])
+                    if pool is not None:
+                        pool.append(record['pattern'])
+
+        # Parameter tampering is defined by value length only
+        alphabet = 'abcdefghijklmnopqrstuvwxyz0123456789'
+        with open(os.path.join(dataset_dir, 'pt_dataset.json')) as f:
+            for record in json.load(f):
+                value = ''.join(self.rng.choices(alphabet, k=record['length']))
+                pool = self.benign if record['label'] == 'valid' else self.attacks['parameter-tampering']
+                pool.append(value)
+
+        self.attack_types = [t for t in ATTACK_TYPES if self.attacks[t]]
+        self.start_ratio = attack_ratio
+        self.start_mix = self._mix_vector(attack_mix)
+        self.drift = drift
+        if drift:
+            self.end_ratio = drift.get('attack_ratio', attack_ratio)
+            self.end_mix = self._mix_vector(drift.get('attack_mix', attack_mix))
+
+    def _mix_vector(self, attack_mix):
+        """Normalized attack-type weights in self.attack_types order."""
+        if attack_mix is None:
+            weights = np.ones(len(self.attack_types))
+        else:
+            unknown = set(attack_mix) - set(self.attack_types)
+            if unknown:
+                raise ValueError(f"Unknown attack types: {sorted(unknown)}")
+            weights = np.array([attack_mix.get(t, 0.0) for t in self.attack_types], dtype=float)
+        if weights.sum() <= 0:
+            raise ValueError("Attack mix weights must sum to a positive value")
+        return (weights / weights.sum()).tolist()
+
+    def mix_at(self, step):
+        """Get the attack ratio and attack-type weights at a step.
+
+        Args:
+            step: Request number
+
+        Returns:
+            tuple: (attack_ratio, list of weights over self.attack_types)
+        """
+        if not self.drift:
+            return self.start_ratio, self.start_mix
+        progress = min(step / max(self.drift['steps'], 1), 1.0)
+        ratio = self.start_ratio + (self.end_ratio - self.start_ratio) * progress
+        mix = [a + (b - a) * progress for a, b in zip(self.start_mix, self.end_mix)]
+        return ratio, mix
+
+    def sample(self, step):
+        """Sample one request.
+
+        Args:
+            step: Request number (drives drift)
+
+        Returns:
+            tuple: (Request, attack type or None, cache key of the request text)
+        """
+        rng = self.rng
+        ratio, mix = self.mix_at(step)
+        if rng.random() < ratio:
+            attack_type = rng.choices(self.attack_types, weights=mix)[0]
+            pool = self.attacks[attack_type]
+        else:
+            attack_type = None
+            pool = self.benign
+        index = rng.randrange(len(pool))
+        value = pool[index]
+
+        endpoint = rng.choice(ENDPOINTS)
+        prefix = '10.0' if rng.random() < self.internal_ratio else '203.0'
+        origin = f"{prefix}.{rng.randrange(256)}.{rng.randrange(1, 255)}"
+
+        if rng.random() < self.post_ratio:
+            req = Request(request=endpoint, body=f"q={value}", method='POST', origin=origin,
+                          host='localhost', headers={'User_Agent': 'simulator'})
+        else:
+            req = Request(request=f"{endpoint}?q={value}", method='GET', origin=origin,
+                          host='localhost', headers={'User_Agent': 'simulator'})
+        return req, attack_type, (attack_type, index, endpoint, req.method)
+
+
+class TrafficSimulator:
+    """Runs the RL pipeline on simulated traffic and measures it."""
+
+    def __init__(self, agent, sampler, feature_extractor=None, safety_layer=None,
+                 action_executor=None, reward_calculator=None, cache_features=True,
+                 cache_size=65536):
+        """Initialize the simulator.
+
+        Args:
+            agent: Agent with select_action(state) and optionally update()
+            sampler: TrafficSampler
+            feature_extractor: FeatureExtractor (default: a new one)
+            safety_layer: SafetyLayer (default: a new one)
+            action_executor: ActionExecutor (default: no throttle delay, so
+                THROTTLE does not sleep)
+            reward_calculator: RewardCalculator (default: a new one)
+            cache_features: Reuse features of identical sampled requests
+                (datasets are finite, so requests repeat)
+            cache_size: Maximum cached feature dicts
+        """
+        self.agent = agent
+        self.sampler = sampler
+        self.feature_extractor = feature_extractor or FeatureExtractor()
+        self.safety_layer = safety_layer or SafetyLayer()
+        self.action_executor = action_executor or ActionExecutor(throttle_delay_ms=0)
+        self.reward_calculator = reward_calculator or RewardCalculator()
+        self.learn = hasattr(agent, 'update')
+
+        self.cache_features = cache_features
+        self.cache_size = cache_size
+        self._feature_cache = {}
+        self._oracle_cache = {}
+
+        self.stage_ns = np.zeros(len(STAGES), dtype=np.int64)
+        self.steps = 0
+
+    def _outcome(self, is_attack, allowed, latency_ms):
+        """Outcome of a request as the reward calculator sees it."""
+        return {
+            'is_attack': is_attack,
+            'http_status': 200 if allowed else 403,
+            'latency_ms': latency_ms
+        }
+
+    def _oracle_reward(self, is_attack, endpoint, origin, latency_ms):
+        """Best reward any action could have earned after the safety layer.
+
+        The outcome has the same fields as the simulated one, so regret only
+        measures the choice of action. The safety layer treats origins by
+        their IP rule, so the best action is cached per rule (not per address).
+        """
+        key = (is_attack, endpoint, self.safety_layer.ip_rules.lookup(origin))
+        best = self._oracle_cache.get(key)
+        if best is None:
+            # The latency penalty is the same for every action
+            best = max(
+                {self.safety_layer.apply_constraints(action, endpoint=endpoint, origin=origin)
+                 for action in ACTIONS},
+                key=lambda action: self.reward_calculator.calculate_reward(
+                    action, self._outcome(is_attack, action not in RESTRICTIVE_ACTIONS, 0.0))
+            )
+            self._oracle_cache[key] = best
+        return self.reward_calculator.calculate_reward(
+            best, self._outcome(is_attack, best not in RESTRICTIVE_ACTIONS, latency_ms))
+
+    def run(self, steps, window=1000):
+        """Simulate a number of requests.
+
+        Args:
+            steps: Number of requests
+            window: Requests per learning-curve point
+
+        Returns:
+            dict: Report with learning curve, regret and stage timing
+        """
+        clock = time.perf_counter_ns
+        stage_ns = self.stage_ns
+        n_windows = (steps + window - 1) // window
+
+        rewards = np.zeros(steps)
+        regrets = np.zeros(steps)
+        attacks = np.zeros(steps, dtype=bool)
+        restrictive = np.zeros(steps, dtype=bool)
+        action_counts = np.zeros(len(ACTIONS), dtype=np.int64)
+
+        start = clock()
+        for i in range(steps):
+            t0 = clock()
+            req, attack_type, cache_key = self.sampler.sample(self.steps + i)
+            is_attack = attack_type is not None
+
+            t1 = clock()
+            features = self._feature_cache.get(cache_key) if self.cache_features else None
+            if features is None:
+                features = self.feature_extractor.extract_features(req)
+                if self.cache_features:
+                    if len(self._feature_cache) >= self.cache_size:
+                        self._feature_cache.clear()
+                    self._feature_cache[cache_key] = features
+
+            t2 = clock()
+            rl_action = self.agent.select_action(features)
+
+            t3 = clock()
+            endpoint = req.request.partition('?')[0]
+            final_action = self.safety_layer.apply_constraints(
+                rl_action, endpoint=endpoint, origin=req.origin)
+
+            t4 = clock()
+            result = self.action_executor.execute(final_action, {
+                'request': req.request,
+                'body': req.body,
+                'headers': req.headers,
+                'origin': req.origin
+            })
+
+            t5 = clock()
+            latency_ms = (t5 - t0) / 1e6
+            outcome = self._outcome(is_attack, result['allowed'], latency_ms)
+            reward = self.reward_calculator.calculate_reward(final_action, outcome)
+
+            t6 = clock()
+            if self.learn:
+                self.agent.update(features, final_action, reward)
+            t7 = clock()
+
+            stage_ns += (t1 - t0, t2 - t1, t3 - t2, t4 - t3, t5 - t4, t6 - t5, t7 - t6)
+            rewards[i] = reward
+            regrets[i] = self._oracle_reward(is_attack, endpoint, req.origin, latency_ms) - reward
+            attacks[i] = is_attack
+            restrictive[i] = final_action in RESTRICTIVE_ACTIONS
+            action_counts[ACTIONS.index(final_action)] += 1
+
+        elapsed_s = (clock() - start) / 1e9
+        self.steps += steps
+
+        # Learning curve: one point per window
+        bounds = np.arange(0, steps, window)
+        counts = np.diff(np.r_[bounds, steps])
+        n_attacks = np.add.reduceat(attacks.astype(np.int64), bounds)
+        n_benign = counts - n_attacks
+        detected = np.add.reduceat((attacks & restrictive).astype(np.int64), bounds)
+        false_positives = np.add.reduceat((~attacks & restrictive).astype(np.int64), bounds)
+        cumulative_regret = np.cumsum(regrets)
+
+        curve = {
+            'step': (bounds + counts).tolist(),
+            'mean_reward': (np.add.reduceat(rewards, bounds) / counts).tolist(),
+            'detection_rate': np.divide(detected, n_attacks, out=np.zeros(n_windows),
+                                        where=n_attacks > 0).tolist(),
+            'false_positive_rate': np.divide(false_positives, n_benign, out=np.zeros(n_windows),
+                                             where=n_benign > 0).tolist(),
+            'cumulative_regret': cumulative_regret[bounds + counts - 1].tolist()
+        }
+
+        return {
+            'steps': steps,
+            'elapsed_s': elapsed_s,
+            'requests_per_second': steps / elapsed_s if elapsed_s else 0.0,
+            'mean_reward': float(rewards.mean()) if steps else 0.0,
+            'total_regret': float(cumulative_regret[-1]) if steps else 0.0,
+            'action_counts': {a.value: int(c) for a, c in zip(ACTIONS, action_counts)},
+            'learning_curve': curve,
+            'stage_us_per_request': {
+                stage: float(ns / steps / 1000) if steps else 0.0
+                for stage, ns in zip(STAGES, self.stage_ns)
+            }
+        }
+
+
+def print_report(report, max_points=10):
+    """Print a simulation report."""
+    print(f"Requests: {report['steps']} in {report['elapsed_s']:.2f}s "
+          f"({report['requests_per_second']:,.0f} req/s)")
+    print(f"Mean reward: {report['mean_reward']:+.3f} | total regret: {report['total_regret']:.1f}")
+
+    curve = report['learning_curve']
+    stride = max(1, len(curve['step']) // max_points)
+    print("\nLearning curve:")
+    print(f"  {'step':>8} {'reward':>8} {'detect':>8} {'FP':>8} {'regret':>10}")
+    for i in range(0, len(curve['step']), stride):
+        print(f"  {curve['step'][i]:>8} {curve['mean_reward'][i]:>+8.3f} "
+              f"{curve['detection_rate'][i]:>8.1%} {curve['false_positive_rate'][i]:>8.1%} "
+              f"{curve['cumulative_regret'][i]:>10.1f}")
+
+    print("\nTime per stage (µs/request):")
+    for stage, us in report['stage_us_per_request'].items():
+        print(f"  {stage:10s} {us:8.2f}")
+
+
+def _parse_mix(text):
+    """Parse 'sqli=0.7,xss=0.3' into a dict."""
+    if not text:
+        return None
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        mix[name.strip()] = float(weight)
+    return mix
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Simulate traffic through the RL pipeline')
+    parser.add_argument('--steps', type=int, default=100000, help='Requests to simulate')
+    parser.add_argument('--window', type=int, default=5000, help='Requests per learning-curve point')
+    parser.add_argument('--agent', choices=['tabular', 'linucb', 'thompson'], default='tabular',
+                        help='Agent to train')
+    parser.add_argument('--epsilon', type=float, default=0.1, help='Tabular exploration rate')
+    parser.add_argument('--learning-rate', type=float, default=0.05, help='Tabular learning rate')
+    parser.add_argument('--alpha', type=float, default=1.0, help='Linear agent exploration strength')
+    parser.add_argument('--attack-ratio', type=float, default=0.2, help='Fraction of attacks')
+    parser.add_argument('--attack-mix', default=None,
+                        help='Attack weights, e.g. sqli=0.7,xss=0.3')
+    parser.add_argument('--drift-ratio', type=float, default=None,
+                        help='Attack ratio reached at the end of the run')
+    parser.add_argument('--drift-mix', default=None, help='Attack mix reached at the end of the run')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Extract features for every request')
+    parser.add_argument('--dataset-dir', default='../Dataset', help='Dataset directory')
+    parser.add_argument('--seed', type=int, default=None, help='Random seed')
+    args = parser.parse_args()
+
+    drift = None
+    if args.drift_ratio is not None or args.drift_mix:
+        drift = {'steps': args.steps}
+        if args.drift_ratio is not None:
+            drift['attack_ratio'] = args.drift_ratio
+        if args.drift_mix:
+            drift['attack_mix'] = _parse_mix(args.drift_mix)
+
+    sampler = TrafficSampler(args.dataset_dir, attack_ratio=args.attack_ratio,
+                             attack_mix=_parse_mix(args.attack_mix), drift=drift, seed=args.seed)
+    if args.agent == 'tabular':
+        agent = PolicyAgent(epsilon=args.epsilon, learning_rate=args.learning_rate)
+    else:
+        from linear_agent import LinearBanditAgent
+        agent = LinearBanditAgent(algorithm=args.agent, alpha=args.alpha, seed=args.seed)
+
+    simulator = TrafficSimulator(agent, sampler, cache_features=not args.no_cache)
+    print_report(simulator.run(args.steps, window=args.window))